@@ -11,6 +11,8 @@
 
 
 import random
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate
 
 
 # ## Part 1 & 2: Data Preparation
@@ -107,14 +109,67 @@ def build_bigram_model(processed_melodies):
 # 
 # 1.  Start with the `^` (start) token.
 # 2.  Look up all possible next notes from `^` and their weights (counts) in the model.
-# 3.  Use `random.choices()` to make a **weighted random selection**.
+# 3.  Make a **weighted random selection**.
 # 4.  Set this new note as the "current note" and repeat the process.
 # 5.  If the `$` (end) token is chosen, or we hit the max length, the melody is complete.
+# 
+# Rebuilding the lists of next notes and weights at every step is wasted work, so we first "compile" the model once: for every note we store its possible next notes together with their **cumulative** weights. A weighted choice is then a single `bisect` into that table.
+# 
+# The "no three repeats" rule is compiled too: for every note we also keep a second table without the note itself, which is used whenever that note has just been played twice.
 
 # In[ ]:
 
 
-def generate_melody(model, max_length=20, forbid_three_repeats=True):
+def make_table(transitions):
+    """
+    Builds one cumulative-weight table from a note's transitions.
+
+    Args:
+        transitions (dict): Next notes and their counts.
+
+    Returns:
+        tuple: (next_notes, cumulative_weights, total), or None if empty.
+    """
+    if not transitions:
+        return None
+    next_notes = list(transitions.keys())
+    cumulative = list(accumulate(transitions.values()))
+    return (next_notes, cumulative, cumulative[-1])
+
+
+def compile_model(model):
+    """
+    Precomputes cumulative-weight tables for fast weighted sampling.
+
+    Args:
+        model (dict): The model generated by build_bigram_model.
+
+    Returns:
+        dict: For each note, a pair (table, no_repeat_table) of tables from
+            make_table; no_repeat_table leaves out the note itself.
+    """
+    compiled = {}
+    for current_note, transitions in model.items():
+        others = {note: count for note, count in transitions.items() if note != current_note}
+        compiled[current_note] = (make_table(transitions), make_table(others))
+    return compiled
+
+
+def pick_next_note(table):
+    """
+    Draws a next note from one compiled table.
+
+    Args:
+        table (tuple): (next_notes, cumulative_weights, total) from make_table.
+
+    Returns:
+        str: The chosen note.
+    """
+    next_notes, cumulative, total = table
+    return next_notes[bisect_right(cumulative, random.random() * total)]
+
+
+def generate_melody(model, max_length=20, forbid_three_repeats=True, compiled=None):
     """
     Generates a new melody using the bigram model.
 
@@ -123,33 +178,28 @@ def generate_melody(model, max_length=20, forbid_three_repeats=True):
         max_length (int): Max length to prevent infinite loops.
         forbid_three_repeats (bool): If True, avoid repeating the same note
             three times in a row (optional Part 5 constraint).
+        compiled (dict): Tables from compile_model(model); built here if omitted.
 
     Returns:
         str: A space-separated string of notes.
     """
+    if compiled is None:
+        compiled = compile_model(model)
+    
     melody = []
     current_note = '^'
     
     for _ in range(max_length):
-        if current_note not in model:
+        if current_note not in compiled:
             break
         
-        transitions = model[current_note]
-        next_notes = list(transitions.keys())
-        weights = list(transitions.values())
+        table, no_repeat_table = compiled[current_note]
         
-        # Optional constraint: filter out a third repeated note when possible
-        if forbid_three_repeats and len(melody) >= 2:
-            filtered = [
-                (note, weight)
-                for note, weight in transitions.items()
-                if not (melody[-1] == melody[-2] == note)
-            ]
-            if filtered:
-                next_notes, weights = zip(*filtered)
-                next_notes, weights = list(next_notes), list(weights)
+        # Optional constraint: avoid a third repeated note when possible
+        if forbid_three_repeats and no_repeat_table and len(melody) >= 2 and melody[-1] == melody[-2]:
+            table = no_repeat_table
         
-        next_note = random.choices(next_notes, weights, k=1)[0]
+        next_note = pick_next_note(table)
         
         if next_note == '$':
             break
@@ -162,10 +212,13 @@ def generate_melody(model, max_length=20, forbid_three_repeats=True):
 
 # ## Part 4 & 5: Show Results and Analysis
 # 
-# Finally, we'll write two helper functions:
+# Finally, we'll write some helper functions:
 # 
 # 1.  `print_model_readable`: To print the model clearly, as requested in the `README.md`.
-# 2.  `find_most_common_transition`: To iterate through the model and find the most-learned note transition.
+# 2.  `build_transition_index`: To rank every transition, and every note's next notes, by count.
+# 3.  `find_most_common_transition`, `top_transitions` and `top_next_notes`: To answer "what is most common?" questions from the index.
+# 
+# Scanning the whole model for every question gets slow once there are many notes. Instead, the index keeps one **bucket per count**, holding the keys with that count in the order a scan of the model would meet them, plus the list of counts that have a bucket. The top `n` answers are read off the highest buckets, and when a count goes up by one that key just moves up one bucket, so `record_transition` keeps the model and the index up to date together without re-sorting. A single `find_most_common_transition` without an index still scans the model once, which is quicker than building the index for one question.
 
 # In[ ]:
 
@@ -181,14 +234,198 @@ def print_model_readable(model):
         print(f"{current_note} → {{{transition_str}}}")
     print("-" * 20)
 
-def find_most_common_transition(model):
+class RankedCounts:
+    """
+    Counts grouped by value, so the most common keys are read off the top.
+    """
+
+    def __init__(self, counts=(), order=None):
+        """
+        Args:
+            counts (dict or iterable): Initial (key, count) pairs.
+            order (function): Sort key that breaks ties between equal counts,
+                smallest first; by default, the order keys were first counted in.
+        """
+        counts = dict(counts)
+        self.sequence = {key: i for i, key in enumerate(counts)}
+        self.order = order or self.sequence.__getitem__
+        self.count = {}
+        # For each count, its keys as sorted (order, key) entries
+        self.buckets = {}
+        for key, count in counts.items():
+            self.count[key] = count
+            self.buckets.setdefault(count, []).append((self.order(key), key))
+        for bucket in self.buckets.values():
+            bucket.sort()
+        # The counts that have a bucket, smallest first
+        self.levels = sorted(self.buckets)
+
+    def add_entry(self, count, entry):
+        """
+        Puts an (order, key) entry into the bucket of a count.
+
+        Args:
+            count (int): The key's count.
+            entry (tuple): (order, key) of the key.
+        """
+        bucket = self.buckets.get(count)
+        if bucket is None:
+            self.buckets[count] = [entry]
+            insort(self.levels, count)
+        else:
+            insort(bucket, entry)
+
+    def remove_entry(self, count, entry):
+        """
+        Takes an (order, key) entry out of the bucket of a count.
+
+        Args:
+            count (int): The key's count.
+            entry (tuple): (order, key) of the key.
+        """
+        bucket = self.buckets[count]
+        del bucket[bisect_left(bucket, entry)]
+        if not bucket:
+            del self.buckets[count]
+            del self.levels[bisect_left(self.levels, count)]
+
+    def increment(self, key):
+        """
+        Adds one to the count of a key by moving it up one bucket.
+
+        Args:
+            key: The key to count (added with count 1 if new).
+        """
+        if key not in self.count:
+            self.sequence.setdefault(key, len(self.sequence))
+            self.count[key] = 0
+        count = self.count[key]
+        entry = (self.order(key), key)
+        if count:
+            self.remove_entry(count, entry)
+        self.count[key] = count + 1
+        self.add_entry(count + 1, entry)
+
+    def top(self, n):
+        """
+        Returns the n most common keys, reading the buckets from the top.
+
+        Args:
+            n (int): How many entries to return.
+
+        Returns:
+            list: (key, count) pairs, most common first.
+        """
+        result = []
+        for count in reversed(self.levels):
+            if len(result) >= n:
+                break
+            result.extend((key, count) for _, key in self.buckets[count][:n - len(result)])
+        return result
+
+
+def build_transition_index(model):
+    """
+    Ranks all transitions, and each note's next notes, by count.
+
+    Args:
+        model (dict): The model generated by build_bigram_model.
+
+    Returns:
+        dict: 'transitions' ranks (current_note, next_note) pairs,
+            'next_notes' maps each note to the ranking of its next notes and
+            'notes' numbers the notes in the model's order.
+    """
+    notes = {current_note: i for i, current_note in enumerate(model)}
+    next_notes = {
+        current_note: RankedCounts(transitions)
+        for current_note, transitions in model.items()
+    }
+
+    def scan_order(pair):
+        # Ties are listed in the order a scan of the model would meet them
+        current_note, next_note = pair
+        return notes[current_note], next_notes[current_note].sequence[next_note]
+
+    transitions = RankedCounts(
+        (
+            ((current_note, next_note), count)
+            for current_note, transitions in model.items()
+            for next_note, count in transitions.items()
+        ),
+        order=scan_order,
+    )
+    return {'transitions': transitions, 'next_notes': next_notes, 'notes': notes}
+
+
+def record_transition(model, index, current_note, next_note):
+    """
+    Counts one more transition in both the model and its index.
+
+    Args:
+        model (dict): The model generated by build_bigram_model.
+        index (dict): The index from build_transition_index(model).
+        current_note (str): The note played first.
+        next_note (str): The note played next.
+    """
+    transitions = model.setdefault(current_note, {})
+    transitions[next_note] = transitions.get(next_note, 0) + 1
+    index['notes'].setdefault(current_note, len(index['notes']))
+    index['next_notes'].setdefault(current_note, RankedCounts()).increment(next_note)
+    index['transitions'].increment((current_note, next_note))
+
+
+def top_transitions(index, n=5):
+    """
+    Returns the n most common transitions.
+
+    Args:
+        index (dict): The index from build_transition_index.
+        n (int): How many transitions to return.
+
+    Returns:
+        list: ((current_note, next_note), count) pairs, most common first.
+    """
+    return index['transitions'].top(n)
+
+
+def top_next_notes(index, current_note, n=5):
+    """
+    Returns the n most common notes played after a note.
+
+    Args:
+        index (dict): The index from build_transition_index.
+        current_note (str): The note to look up.
+        n (int): How many next notes to return.
+
+    Returns:
+        list: (next_note, count) pairs, most common first.
+    """
+    ranking = index['next_notes'].get(current_note)
+    return ranking.top(n) if ranking else []
+
+
+def find_most_common_transition(model, index=None):
     """
     Finds the most common note transition (pair) in the dataset.
+
+    Args:
+        model (dict): The model generated by build_bigram_model.
+        index (dict): The index from build_transition_index(model); the
+            model is scanned instead if omitted.
+
+    Returns:
+        tuple: ((current_note, next_note), count), or ((None, None), 0) for
+            an empty model.
     """
+    if index is not None:
+        top = top_transitions(index, 1)
+        return top[0] if top else ((None, None), 0)
+
     most_common_pair = (None, None)
     max_count = 0
     
-    # Iterate through every entry in the model
+    # Without an index, one scan of the model is quicker than building one
     for current_note, transitions in model.items():
         for next_note, count in transitions.items():
             if count > max_count:
@@ -216,6 +453,7 @@ def main(seed=42, samples=3, max_length=20):
     bigram_model = build_bigram_model(processed_data)
 
     print_model_readable(bigram_model)
+    compiled = compile_model(bigram_model)
 
     print("--- Generated Melodies ---")
     for i in range(samples):
@@ -223,13 +461,18 @@ def main(seed=42, samples=3, max_length=20):
             bigram_model,
             max_length=max_length,
             forbid_three_repeats=True,
+            compiled=compiled,
         )
         print(f"{i+1}. {new_song}")
     print("-" * 20)
 
-    common_pair, count = find_most_common_transition(bigram_model)
+    index = build_transition_index(bigram_model)
+    common_pair, count = find_most_common_transition(bigram_model, index)
     print("--- Analysis ---")
     print(f"Most common transition: {common_pair[0]} → {common_pair[1]} (Count: {count})")
+    for (current_note, next_note), count in top_transitions(index, 3):
+        print(f"  {current_note} → {next_note}: {count}")
+    print(f"Most common first notes: {top_next_notes(index, '^', 3)}")
 
 
 if __name__ == "__main__":
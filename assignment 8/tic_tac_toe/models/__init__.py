@@ -1,7 +1,7 @@
 """Tic Tac Toe models package."""
 
-from .board import Board
+from .board import Board, BitBoard
 from .player import Player, RandomPlayer
 
-__all__ = ['Board', 'Player', 'RandomPlayer']
+__all__ = ['Board', 'BitBoard', 'Player', 'RandomPlayer']
 
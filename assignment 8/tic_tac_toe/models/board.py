@@ -1,6 +1,9 @@
 """
 Board class for Tic Tac Toe game.
 Handles the game board and logic.
+
+BitBoard is a drop-in replacement for Board that stores each player's
+cells as a 9-bit int (bit row * 3 + col), for simulating many games fast.
 """
 
 
@@ -110,3 +113,120 @@ class Board:
                     empty.append((i, j))
         return empty
 
+
+# Every cell's bit set, and the eight lines (rows, columns, diagonals) that win
+FULL_MASK = 0b111111111
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,
+    0b001001001, 0b010010010, 0b100100100,
+    0b100010001, 0b001010100,
+)
+# (row, col) cells of every 9-bit mask, so empty cells are one table lookup
+_CELLS = [tuple((i // 3, i % 3) for i in range(9) if mask >> i & 1)
+          for mask in range(FULL_MASK + 1)]
+
+
+class BitBoard(Board):
+    """
+    Tic Tac Toe board stored as two 9-bit ints, one per player.
+    
+    For games between 'X' and 'O', moves, winner checks and empty cells
+    give the same results as Board, and the board attribute is a read-only
+    tuple of rows of ' ', 'X' and 'O' for draw_board and existing callers;
+    change the board with make_move. Unlike Board, which stores any symbol,
+    make_move raises ValueError for a symbol other than 'X' or 'O', since
+    there are only two bit masks to put it in.
+    """
+    
+    def __init__(self):
+        """Initialize an empty 3x3 board."""
+        self.x = 0
+        self.o = 0
+    
+    @property
+    def board(self):
+        """The cells as a tuple of rows of ' ', 'X' or 'O', built on each access."""
+        x, o = self.x, self.o
+        return tuple(tuple('X' if x >> (3 * i + j) & 1 else 'O' if o >> (3 * i + j) & 1 else ' '
+                           for j in range(3)) for i in range(3))
+    
+    @property
+    def empty_mask(self):
+        """Bit mask of the empty cells."""
+        return ~(self.x | self.o) & FULL_MASK
+    
+    def is_valid_move(self, row, col):
+        """
+        Check if a move is valid.
+        
+        Args:
+            row: Row index (0-2)
+            col: Column index (0-2)
+            
+        Returns:
+            True if the move is valid, False otherwise
+        """
+        if not (0 <= row < 3 and 0 <= col < 3):
+            return False
+        return not (self.x | self.o) >> (3 * row + col) & 1
+    
+    def make_move(self, row, col, symbol):
+        """
+        Make a move on the board.
+        
+        Args:
+            row: Row index (0-2)
+            col: Column index (0-2)
+            symbol: 'X' or 'O'
+            
+        Returns:
+            True if move was successful, False otherwise
+            
+        Raises:
+            ValueError: If symbol is not 'X' or 'O'
+        """
+        if symbol not in ('X', 'O'):
+            raise ValueError(f"Symbol must be 'X' or 'O', got {symbol!r}")
+        if not self.is_valid_move(row, col):
+            return False
+        if symbol == 'X':
+            self.x |= 1 << (3 * row + col)
+        else:
+            self.o |= 1 << (3 * row + col)
+        return True
+    
+    def check_winner(self):
+        """
+        Check if there is a winner.
+        
+        Returns:
+            'X' if X wins, 'O' if O wins, 'Tie' if board is full with no winner,
+            None if game is still ongoing
+        """
+        x, o = self.x, self.o
+        for mask in WIN_MASKS:
+            if x & mask == mask:
+                return 'X'
+            if o & mask == mask:
+                return 'O'
+        if x | o == FULL_MASK:
+            return 'Tie'
+        return None
+    
+    def is_full(self):
+        """
+        Check if the board is full.
+        
+        Returns:
+            True if board is full, False otherwise
+        """
+        return self.x | self.o == FULL_MASK
+    
+    def get_empty_cells(self):
+        """
+        Get list of empty cell positions.
+        
+        Returns:
+            List of (row, col) tuples for empty cells
+        """
+        return list(_CELLS[~(self.x | self.o) & FULL_MASK])
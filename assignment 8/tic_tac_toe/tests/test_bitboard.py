@@ -0,0 +1,101 @@
+"""
+Unit tests for the BitBoard class, checked against Board.
+"""
+
+import io
+import random
+import sys
+import os
+from contextlib import redirect_stdout
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models.board import BitBoard, Board
+
+
+def test_bitboard_matches_board():
+    """Test that random games give the same state on both boards after every move."""
+    rng = random.Random(0)
+    for _ in range(500):
+        board, bitboard = Board(), BitBoard()
+        symbol = 'X'
+        while board.check_winner() is None:
+            assert bitboard.get_empty_cells() == board.get_empty_cells()
+            row, col = rng.choice(board.get_empty_cells())
+            assert board.make_move(row, col, symbol) and bitboard.make_move(row, col, symbol)
+            assert [list(row) for row in bitboard.board] == board.board
+            assert bitboard.check_winner() == board.check_winner()
+            assert bitboard.is_full() == board.is_full()
+            symbol = 'O' if symbol == 'X' else 'X'
+    print("✓ BitBoard matches Board test passed")
+
+
+def test_bitboard_winner_and_tie():
+    """Test wins and a tie on the bitboard."""
+    bitboard = BitBoard()
+    for row, col in [(0, 2), (1, 1), (2, 0)]:
+        bitboard.make_move(row, col, 'O')
+    assert bitboard.check_winner() == 'O', "O should win with anti-diagonal"
+    
+    bitboard = BitBoard()
+    # X O X
+    # O O X
+    # X X O
+    for row, col, symbol in [(0, 0, 'X'), (0, 1, 'O'), (0, 2, 'X'), (1, 0, 'O'), (1, 1, 'O'),
+                             (1, 2, 'X'), (2, 0, 'X'), (2, 1, 'X'), (2, 2, 'O')]:
+        bitboard.make_move(row, col, symbol)
+    assert bitboard.check_winner() == 'Tie', "Should be a tie"
+    assert bitboard.is_full() and bitboard.get_empty_cells() == []
+    print("✓ BitBoard winner and tie test passed")
+
+
+def test_bitboard_invalid_moves():
+    """Test that occupied and out-of-range cells are rejected."""
+    bitboard = BitBoard()
+    assert bitboard.make_move(1, 1, 'X')
+    assert not bitboard.make_move(1, 1, 'O'), "Occupied cell should be rejected"
+    assert not bitboard.make_move(3, 0, 'O'), "Out-of-range cell should be rejected"
+    assert bitboard.empty_mask == 0b111101111
+    try:
+        bitboard.make_move(0, 0, 'Z')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Unknown symbol should raise ValueError")
+    print("✓ BitBoard invalid move test passed")
+
+
+def test_bitboard_read_only_view():
+    """Test that writing to the board view fails instead of being lost."""
+    bitboard = BitBoard()
+    try:
+        bitboard.board[0][0] = 'X'
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("The board view should be read-only")
+    assert bitboard.x == 0 and bitboard.is_valid_move(0, 0)
+    print("✓ BitBoard read-only view test passed")
+
+
+def test_bitboard_draw_board():
+    """Test that draw_board prints the same grid for both boards."""
+    board, bitboard = Board(), BitBoard()
+    for row, col, symbol in [(0, 0, 'X'), (2, 1, 'O')]:
+        board.make_move(row, col, symbol)
+        bitboard.make_move(row, col, symbol)
+    expected, output = io.StringIO(), io.StringIO()
+    with redirect_stdout(expected):
+        board.draw_board()
+    with redirect_stdout(output):
+        bitboard.draw_board()
+    assert output.getvalue() == expected.getvalue()
+    print("✓ BitBoard draw_board test passed")
+
+
+if __name__ == "__main__":
+    test_bitboard_matches_board()
+    test_bitboard_winner_and_tie()
+    test_bitboard_invalid_moves()
+    test_bitboard_read_only_view()
+    test_bitboard_draw_board()
+    print("\nAll BitBoard tests passed!")
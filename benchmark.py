@@ -0,0 +1,230 @@
+"""
+Benchmarks for the melody pipeline.
+
+Each run builds deterministic synthetic corpora of the requested sizes and
+measures every pipeline stage separately:
+
+    load        load_melodies on the corpus file
+    preprocess  preprocess_melodies
+    build       build_bigram_model
+    generate    generate_melody, called --generate times
+    save        save_melodies of the whole corpus
+
+For every (size, stage) the best wall time of --repeat runs is recorded,
+and the stage is run once more under tracemalloc to record its peak Python
+memory. Results are written as JSON and can be compared with a stored
+baseline; any stage slower (or heavier) than the baseline by more than
+--tolerance makes the run exit with status 1.
+
+    python benchmark.py --sizes 1e3 1e4 1e5 --output results.json
+    python benchmark.py --baseline benchmark_baseline.json
+    python benchmark.py --sizes 1e3 1e4 1e5 --save-baseline benchmark_baseline.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import numpy as np
+
+from models import build_bigram_model, generate_melody, load_melodies, preprocess_melodies, \
+    save_melodies
+from pitch import midi_to_note
+
+STAGES = ('load', 'preprocess', 'build', 'generate', 'save')
+
+
+def write_synthetic_corpus(path: str, n: int, seed: int = 0, chunk_size: int = 100000) -> None:
+    """
+    Write n synthetic melodies to a text file, one per line.
+
+    Melodies are random walks over 48 notes (C3 to B6) with steps of up to
+    a fifth, 4 to 32 notes long, so the corpus has the sparse, local
+    transition structure of real melodies. The same n, seed and chunk_size
+    always give the same file. Melodies are generated chunk_size at a time, so even
+    10 ** 7 melodies are written in bounded memory.
+
+    Parameters:
+    path: str - path to the file to write
+    n: int - number of melodies
+    seed: int - random seed (default: 0)
+    chunk_size: int - melodies generated per batch (default: 100000)
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array([midi_to_note(midi) for midi in range(48, 96)], dtype=object)
+    with open(path, 'w', encoding='utf-8') as f:
+        for first in range(0, n, chunk_size):
+            count = min(chunk_size, n - first)
+            lengths = rng.integers(4, 33, size=count)
+            steps = rng.integers(-7, 8, size=int(lengths.sum()))
+            starts = np.cumsum(lengths) - lengths
+            steps[starts] = rng.integers(0, 48, size=count)
+            # Random walk within each melody, reflected into the 48-note range
+            walk = np.cumsum(steps)
+            walk -= np.repeat(walk[starts] - steps[starts], lengths)
+            walk = np.abs((walk + 47) % 94 - 47)
+            notes = names[walk].tolist()
+            bounds = np.append(starts, len(notes)).tolist()
+            f.writelines(' '.join(notes[bounds[i]:bounds[i + 1]]) + '\n' for i in range(count))
+
+
+def _measure(run: Callable[[], object], repeat: int, memory: bool) -> tuple:
+    """Return (result, best seconds, peak traced bytes or None) of a stage."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def run_benchmarks(sizes: list[int], repeat: int = 3, generate: int = 1000,
+                   memory: bool = True, seed: int = 0,
+                   workdir: Optional[str] = None) -> dict:
+    """
+    Benchmark every pipeline stage on synthetic corpora of the given sizes.
+
+    Parameters:
+    sizes: list[int] - corpus sizes in melodies
+    repeat: int - timed runs per stage; the best is kept (default: 3)
+    generate: int - melodies generated by the generate stage (default: 1000)
+    memory: bool - also record each stage's peak traced memory (default: True)
+    seed: int - seed for the corpora and generation (default: 0)
+    workdir: str - directory for the corpus files (default: a temporary one)
+
+    Returns:
+    dict - {'meta': {...}, 'results': [{'size', 'stage', 'seconds',
+    'peak_bytes', 'per_second'}, ...]}
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        corpus_path = os.path.join(tmp, 'corpus.txt')
+        output_path = os.path.join(tmp, 'saved.txt')
+        for size in sizes:
+            write_synthetic_corpus(corpus_path, size, seed)
+            rng = random.Random(seed)
+            state = {}
+            stages = {
+                'load': lambda: load_melodies(corpus_path),
+                'preprocess': lambda: preprocess_melodies(state['load']),
+                'build': lambda: build_bigram_model(state['preprocess']),
+                'generate': lambda: [generate_melody(state['build'], rng=rng)
+                                     for _ in range(generate)],
+                'save': lambda: save_melodies(state['load'], output_path),
+            }
+            for stage in STAGES:
+                state[stage], seconds, peak = _measure(stages[stage], repeat, memory)
+                items = generate if stage == 'generate' else size
+                results.append({'size': size, 'stage': stage, 'seconds': seconds,
+                                'peak_bytes': peak, 'per_second': items / seconds})
+                print(f"{size:>10} {stage:<11} {seconds:10.4f} s"
+                      + (f" {peak / 2 ** 20:10.1f} MiB" if peak is not None else ''),
+                      file=sys.stderr)
+            state.clear()
+    meta = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'repeat': repeat,
+        'generate': generate,
+        'seed': seed,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return {'meta': meta, 'results': results}
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.5,
+            min_seconds: float = 0.02, min_bytes: int = 1 << 16) -> list[str]:
+    """
+    Compare benchmark results with a baseline.
+
+    Only (size, stage) pairs present in both are compared. A stage regresses
+    when it is more than tolerance slower (or heavier) than the baseline and
+    also more than min_seconds (or min_bytes) worse, so timer noise on
+    millisecond stages does not count.
+
+    Parameters:
+    results: dict - output of run_benchmarks
+    baseline: dict - earlier output of run_benchmarks
+    tolerance: float - allowed relative slowdown or memory growth (default: 0.5)
+    min_seconds: float - smallest slowdown that counts (default: 0.02)
+    min_bytes: int - smallest memory growth that counts (default: 64 KiB)
+
+    Returns:
+    list[str] - one message per regression; empty if there are none
+    """
+    expected = {(row['size'], row['stage']): row for row in baseline['results']}
+    regressions = []
+    for row in results['results']:
+        before = expected.get((row['size'], row['stage']))
+        if before is None:
+            continue
+        for field, unit, slack in (('seconds', 's', min_seconds), ('peak_bytes', 'B', min_bytes)):
+            old, new = before.get(field), row.get(field)
+            if old and new is not None and new > old * (1 + tolerance) and new - old > slack:
+                regressions.append(f"{row['stage']} on {row['size']} melodies: {field} "
+                                   f"{old:.4g}{unit} -> {new:.4g}{unit} "
+                                   f"(+{100 * (new / old - 1):.0f}%)")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the benchmarks from the command line; returns the exit status."""
+    parser = argparse.ArgumentParser(description="Benchmark the melody pipeline.")
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e3, 1e4, 1e5],
+                        help="corpus sizes in melodies, up to 1e7 (default: 1e3 1e4 1e5)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--generate', type=int, default=1000)
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc runs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare with the results in this file")
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--save-baseline', help="write the results as a new baseline file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks([int(size) for size in args.sizes], args.repeat, args.generate,
+                             not args.no_memory, args.seed)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION: {message}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against the baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Cache of seeded generation results.
+
+generate_melodies is deterministic for a given model, seed and set of
+parameters, so repeated requests can be answered from memory. Entries are
+keyed on the model's content hash, so retraining or updating the model
+gives new keys and old results are never served for the new model; the
+stale entries simply age out of the cache.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from constraints import Constraints
+from models import BigramModel, generate_melodies
+
+
+class GenerationCache:
+    """Least-recently-used cache of generated melodies, with optional expiry."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Parameters:
+        max_entries: int - most results kept; the least recently used
+            result is evicted first (default: 1024)
+        ttl: float - seconds a result stays valid; None keeps results until
+            they are evicted (default: None)
+        clock: callable - returns the current time in seconds (default:
+            time.monotonic)
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def key(model: BigramModel, n: int, max_length: int, seed: int,
+            constraints: Optional[Constraints] = None) -> tuple:
+        """
+        Return the cache key of a generation request.
+
+        Parameters:
+        model: BigramModel - the model generated from
+        n: int - number of melodies
+        max_length: int - maximum length of each melody
+        seed: int - the request's seed
+        constraints: Constraints - rules the melodies follow
+
+        Returns:
+        tuple - hashable key for get and put
+        """
+        return (model.content_hash(), n, max_length, seed, constraints)
+
+    def get(self, key: tuple) -> Optional[list[list[str]]]:
+        """
+        Return the cached melodies for a key, or None if absent or expired.
+
+        Parameters:
+        key: tuple - a key from GenerationCache.key
+
+        Returns:
+        list[list[str]] - copies of the cached melodies, or None
+        """
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and entry[0] <= self.clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return [list(melody) for melody in entry[1]]
+
+    def put(self, key: tuple, melodies: list[list[str]]) -> None:
+        """
+        Store the melodies generated for a key, evicting old entries if full.
+
+        Parameters:
+        key: tuple - a key from GenerationCache.key
+        melodies: list[list[str]] - the generated melodies
+        """
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (expires, [list(melody) for melody in melodies])
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def generate(self, model: BigramModel, n: int, max_length: int = 20,
+                 seed: Optional[int] = None,
+                 constraints: Optional[Constraints] = None) -> list[list[str]]:
+        """
+        Return generate_melodies(model, n, max_length, seed, constraints),
+        from the cache when the same request was answered before.
+
+        Requests without a seed are random, so they are never cached.
+
+        Parameters:
+        model: BigramModel - trained Bigram model
+        n: int - number of melodies to generate
+        max_length: int - maximum length of each melody (default: 20)
+        seed: int - seed for NumPy's random generator; None skips the cache
+        constraints: Constraints - rules the melodies must follow (default: none)
+
+        Returns:
+        list[list[str]] - the generated melodies
+        """
+        if seed is None:
+            return generate_melodies(model, n, max_length, None, constraints)
+        key = self.key(model, n, max_length, seed, constraints)
+        melodies = self.get(key)
+        if melodies is None:
+            melodies = generate_melodies(model, n, max_length, seed, constraints)
+            self.put(key, melodies)
+        return melodies
+
+    def clear(self) -> None:
+        """Remove every cached result."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
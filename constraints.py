@@ -0,0 +1,107 @@
+"""
+Constraints on generated melodies.
+
+A Constraints object describes which melodies are acceptable. The sampler
+in models.py turns it into masks over the vocabulary once, and builds
+masked alias tables from them, so generating under constraints costs the
+same per note as generating without them.
+"""
+from typing import Optional
+
+import numpy as np
+
+from pitch import note_to_midi, parse_note, scale_pitch_classes
+
+
+class Constraints:
+    """Rules a generated melody must follow."""
+
+    def __init__(self, max_repeats: Optional[int] = None, low: Optional[str] = None,
+                 high: Optional[str] = None, key: Optional[str] = None,
+                 end_note: Optional[str] = None):
+        """
+        Describe the melodies to generate. Every rule is optional.
+
+        Parameters:
+        max_repeats: int - most times the same note may be played in a row
+            (2 forbids three repeats)
+        low: str - lowest allowed note, with an octave (e.g. 'C4')
+        high: str - highest allowed note, with an octave (e.g. 'G5')
+        key: str - only use notes in this key (e.g. 'C major', 'A minor')
+        end_note: str - the note every melody must end on
+        """
+        if max_repeats is not None and max_repeats < 1:
+            raise ValueError("max_repeats must be at least 1")
+        for bound in (low, high):
+            if bound is not None and note_to_midi(bound) is None:
+                raise ValueError(f"Range bounds need an octave: {bound!r}")
+        self.max_repeats = max_repeats
+        self.low = low
+        self.high = high
+        self.key = key
+        self.end_note = end_note
+        self._pitch_classes = scale_pitch_classes(key) if key is not None else None
+
+    def allows(self, note: str) -> bool:
+        """
+        Check whether a note may appear in a melody at all.
+
+        Notes without an octave are outside any range, and notes that are
+        not note names are outside any key.
+
+        Parameters:
+        note: str - the note to check
+
+        Returns:
+        bool - True if the note passes the range and key rules
+        """
+        if self.low is not None or self.high is not None:
+            midi = note_to_midi(note)
+            if midi is None:
+                return False
+            if self.low is not None and midi < note_to_midi(self.low):
+                return False
+            if self.high is not None and midi > note_to_midi(self.high):
+                return False
+        if self._pitch_classes is not None:
+            parsed = parse_note(note)
+            if parsed is None or parsed[0] not in self._pitch_classes:
+                return False
+        return True
+
+    def mask(self, vocab: list[str]) -> np.ndarray:
+        """
+        Return which notes of a vocabulary may be generated.
+
+        The start token is never generated and the end token is always
+        allowed here; where a melody may end is handled by end_note.
+
+        Parameters:
+        vocab: list[str] - notes in ID order, with '^' and '$' first
+
+        Returns:
+        np.ndarray - boolean array, one entry per note
+        """
+        mask = np.fromiter((self.allows(note) for note in vocab), dtype=bool, count=len(vocab))
+        mask[0] = False
+        mask[1] = True
+        return mask
+
+    def _fields(self) -> tuple:
+        return (self.max_repeats, self.low, self.high, self.key, self.end_note)
+
+    def __eq__(self, other):
+        """Check if two sets of constraints are the same."""
+        if not isinstance(other, Constraints):
+            return False
+        return self._fields() == other._fields()
+
+    def __hash__(self):
+        """Hash constraints so compiled tables can be cached per constraint set."""
+        return hash(self._fields())
+
+    def __repr__(self):
+        fields = ('max_repeats', 'low', 'high', 'key', 'end_note')
+        rules = ', '.join(f"{name}={value!r}" for name, value in zip(fields, self._fields())
+                          if value is not None)
+        return f"Constraints({rules})"
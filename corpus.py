@@ -0,0 +1,276 @@
+"""
+Packed binary melody corpus.
+
+A packed corpus stores every note of every melody as a small integer ID in
+one flat array, plus an offsets array marking where each melody starts:
+
+    tokens[offsets[i]:offsets[i + 1]]   the note IDs of melody i
+    vocab[id]                           the note with that ID
+
+Tokens use the narrowest unsigned type that fits the vocabulary (uint8 for
+up to 256 distinct notes, then uint16, then uint32). A packed file can be
+memory-mapped, so loading it does no parsing at all.
+"""
+import os
+import struct
+from itertools import chain, islice
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from models import BigramModel, iter_melodies
+
+# Packed corpus file layout (all little-endian):
+#   header   magic, format version, token item size in bytes, number of
+#            melodies, number of tokens, vocabulary byte length
+#   vocab    the notes in ID order, UTF-8, separated by newlines
+#   offsets  int64[melodies + 1], starting at the next multiple of 64 bytes
+#   tokens   uint8/uint16/uint32[tokens], starting at a multiple of 64 bytes
+_CORPUS_MAGIC = b'MELODYPK'
+_CORPUS_VERSION = 1
+_CORPUS_HEADER = struct.Struct('<8sIIQQQ')
+_CORPUS_ALIGN = 64
+_TOKEN_TYPES = {1: '<u1', 2: '<u2', 4: '<u4'}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _CORPUS_ALIGN) * _CORPUS_ALIGN
+
+
+def _token_dtype(vocab_size: int) -> np.dtype:
+    for itemsize, dtype in _TOKEN_TYPES.items():
+        if vocab_size <= 1 << (8 * itemsize):
+            return np.dtype(dtype)
+    raise ValueError("Vocabulary is too large for a packed corpus")
+
+
+class PackedCorpus:
+    """
+    Melodies stored as one token ID array plus melody offsets.
+
+    Iterating over a corpus, or indexing it, gives melodies as lists of
+    notes, so it can be used anywhere a list of melodies is expected.
+    """
+
+    def __init__(self, vocab: list[str], tokens: np.ndarray, offsets: np.ndarray):
+        self.vocab = vocab
+        self.tokens = tokens
+        self.offsets = offsets
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """The number of notes in each melody."""
+        return np.diff(self.offsets)
+
+    def ids(self, i: int) -> np.ndarray:
+        """
+        Return the note IDs of one melody without converting them to strings.
+
+        Parameters:
+        i: int - index of the melody
+
+        Returns:
+        np.ndarray - the melody's token IDs
+        """
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> list[str]:
+        if not -len(self) <= i < len(self):
+            raise IndexError("melody index out of range")
+        i %= len(self)
+        return list(map(self.vocab.__getitem__, self.ids(i).tolist()))
+
+    def __iter__(self) -> Iterator[list[str]]:
+        vocab = self.vocab
+        bounds = self.offsets.tolist()
+        # Convert a block of melodies at a time to keep memory flat
+        for first in range(0, len(self), 65536):
+            last = min(first + 65536, len(self))
+            notes = list(map(vocab.__getitem__,
+                             self.tokens[bounds[first]:bounds[last]].tolist()))
+            base = bounds[first]
+            for i in range(first, last):
+                yield notes[bounds[i] - base:bounds[i + 1] - base]
+
+    def __repr__(self) -> str:
+        return (f"PackedCorpus({len(self)} melodies, {len(self.tokens)} notes, "
+                f"{len(self.vocab)} distinct)")
+
+
+def pack_melodies(melodies: Iterable[list[str]], chunk_size: int = 65536) -> PackedCorpus:
+    """
+    Pack melodies into a PackedCorpus.
+
+    Melodies are read chunk_size at a time, so a generator such as
+    iter_melodies(path) can be packed without holding it as lists.
+
+    Parameters:
+    melodies: Iterable[list[str]] - melodies as lists of notes
+    chunk_size: int - number of melodies converted per batch (default: 65536)
+
+    Returns:
+    PackedCorpus - the packed melodies
+    """
+    vocab: list[str] = []
+    index: dict[str, int] = {}
+    token_chunks = []
+    length_chunks = []
+    melodies = iter(melodies)
+    while True:
+        chunk = list(islice(melodies, chunk_size))
+        if not chunk:
+            break
+        notes = list(chain.from_iterable(chunk))
+        for note in dict.fromkeys(notes):
+            if note not in index:
+                index[note] = len(vocab)
+                vocab.append(note)
+        token_chunks.append(np.fromiter(map(index.__getitem__, notes), dtype=np.uint32,
+                                        count=len(notes)))
+        length_chunks.append(np.fromiter(map(len, chunk), dtype=np.int64, count=len(chunk)))
+
+    tokens = np.concatenate(token_chunks) if token_chunks else np.zeros(0, dtype=np.uint32)
+    lengths = np.concatenate(length_chunks) if length_chunks else np.zeros(0, dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return PackedCorpus(vocab, tokens.astype(_token_dtype(len(vocab))), offsets)
+
+
+def save_packed(corpus: PackedCorpus, path: str) -> None:
+    """
+    Write a packed corpus to a binary file that load_packed can map.
+
+    Parameters:
+    corpus: PackedCorpus - the corpus to save
+    path: str - path to the output file
+    """
+    if any('\n' in note for note in corpus.vocab):
+        raise ValueError("Notes containing newlines cannot be saved")
+    vocab = '\n'.join(corpus.vocab).encode('utf-8')
+    dtype = _token_dtype(len(corpus.vocab))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_CORPUS_HEADER.pack(_CORPUS_MAGIC, _CORPUS_VERSION, dtype.itemsize,
+                                    len(corpus), len(corpus.tokens), len(vocab)))
+        f.write(vocab)
+        for array in (np.asarray(corpus.offsets, dtype='<i8'), corpus.tokens.astype(dtype)):
+            f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
+            array.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def load_packed(path: str, mmap: bool = True) -> PackedCorpus:
+    """
+    Load a corpus written by save_packed.
+
+    With mmap=True the offsets and tokens are memory-mapped read-only, so
+    loading takes the same time whatever the corpus size.
+
+    Parameters:
+    path: str - path to the packed corpus file
+    mmap: bool - map the arrays instead of reading them (default: True)
+
+    Returns:
+    PackedCorpus - the loaded corpus
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_CORPUS_HEADER.size)
+        if len(header) < _CORPUS_HEADER.size or not header.startswith(_CORPUS_MAGIC):
+            raise ValueError(f"{path} is not a packed melody corpus")
+        _, version, itemsize, melodies, tokens, vocab_length = _CORPUS_HEADER.unpack(header)
+        if version != _CORPUS_VERSION or itemsize not in _TOKEN_TYPES:
+            raise ValueError(f"{path} has unsupported corpus format version {version}")
+        vocab = f.read(vocab_length).decode('utf-8')
+    vocab = vocab.split('\n') if vocab_length else []
+
+    offset = _aligned(_CORPUS_HEADER.size + vocab_length)
+    arrays = []
+    for dtype, count in (('<i8', melodies + 1), (_TOKEN_TYPES[itemsize], tokens)):
+        if count == 0:
+            arrays.append(np.zeros(0, dtype=dtype))
+        elif mmap:
+            arrays.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,)))
+        else:
+            arrays.append(np.fromfile(path, dtype=dtype, count=count, offset=offset))
+        offset = _aligned(offset + count * np.dtype(dtype).itemsize)
+    return PackedCorpus(vocab, arrays[1], arrays[0])
+
+
+def train_packed(corpus: PackedCorpus, model: Optional[BigramModel] = None,
+                 chunk_size: int = 65536) -> BigramModel:
+    """
+    Train a Bigram model directly on a packed corpus.
+
+    The corpus tokens are mapped to model IDs with one lookup table and
+    counted chunk_size melodies at a time, with the start and end
+    transitions of every melody added from the offsets array. No melody
+    is converted to strings or preprocessed, and a memory-mapped corpus is
+    read straight from the page cache.
+
+    Parameters:
+    corpus: PackedCorpus - melodies without ^ and $ tokens
+    model: BigramModel - model to update in place (default: a new model)
+    chunk_size: int - number of melodies counted per batch (default: 65536)
+
+    Returns:
+    BigramModel - the trained model
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if model is None:
+        model = BigramModel()
+    model_ids = model.intern_many(corpus.vocab)
+    offsets = np.asarray(corpus.offsets)
+    for first in range(0, len(corpus), chunk_size):
+        last = min(first + chunk_size, len(corpus))
+        tokens = corpus.tokens[offsets[first]:offsets[last]]
+        model.add_melody_ids(model_ids[tokens], np.diff(offsets[first:last + 1]))
+    return model
+
+
+def text_to_packed(text_path: str, packed_path: str, on_error=None) -> PackedCorpus:
+    """
+    Convert a text melody file into a packed corpus file.
+
+    The text is streamed with iter_melodies, so malformed lines raise
+    MelodyFormatError unless on_error is given.
+
+    Parameters:
+    text_path: str - path to the text melody file
+    packed_path: str - path to the packed corpus file to write
+    on_error: callable - see iter_melodies
+
+    Returns:
+    PackedCorpus - the packed melodies
+    """
+    corpus = pack_melodies(iter_melodies(text_path, on_error=on_error))
+    save_packed(corpus, packed_path)
+    return corpus
+
+
+def packed_to_text(packed_path: str, text_path: str) -> None:
+    """
+    Convert a packed corpus file back into a text melody file.
+
+    Notes are written space-separated, one melody per line, in the format
+    save_melodies uses. The text format has no way to write an empty
+    melody (a blank line is skipped when read), so a corpus holding one is
+    rejected before anything is written rather than converted with loss.
+
+    Parameters:
+    packed_path: str - path to the packed corpus file
+    text_path: str - path to the text file to write
+
+    Raises:
+    ValueError - if the corpus holds an empty melody
+    """
+    corpus = load_packed(packed_path)
+    empty = np.flatnonzero(corpus.lengths == 0)
+    if len(empty):
+        raise ValueError(f"Melody {empty[0]} of {packed_path} is empty, "
+                         f"and text melody files cannot hold empty melodies")
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.writelines(' '.join(melody) + '\n' for melody in corpus)
@@ -0,0 +1,108 @@
+"""
+Deterministic decoding of the most probable melodies from a Bigram model.
+
+Random sampling gives a different melody every time. For previews that
+must be reproducible, top_k_melodies runs a beam search over the model's
+log-probabilities instead and returns the same melodies on every call.
+"""
+from typing import Optional
+
+import numpy as np
+
+from models import BigramModel
+from smoothing import smooth_model
+
+
+def log_probabilities(model: BigramModel, *, smoothing: str = 'none', alpha: float = 1.0,
+                      discount: float = 0.75) -> np.ndarray:
+    """
+    Return the V x V matrix of log transition probabilities of a model.
+
+    Row i holds log P(next note | vocab[i]). Without smoothing, transitions
+    never seen in training, and rows of notes with no outgoing transitions,
+    are -inf. The matrix is computed once by smooth_model and shared
+    read-only until the model changes.
+
+    Parameters:
+    model: BigramModel - trained Bigram model
+    smoothing: str - a method from smoothing.METHODS (default: 'none')
+    alpha: float - pseudo-count of 'add-k' smoothing (default: 1.0)
+    discount: float - discount of 'absolute' and 'kneser-ney' smoothing (default: 0.75)
+
+    Returns:
+    np.ndarray - float64 matrix of log-probabilities
+    """
+    return smooth_model(model, smoothing, alpha, discount).log_probabilities
+
+
+def top_k_melodies(model: BigramModel, k: int = 5, max_length: int = 20,
+                   beam_width: Optional[int] = None, smoothing: str = 'none',
+                   alpha: float = 1.0, discount: float = 0.75) -> list[tuple[list[str], float]]:
+    """
+    Find the k most probable complete melodies of at most max_length notes.
+
+    A beam search keeps the beam_width best partial melodies at every step,
+    extending all of them at once with one (beam x V) array of scores. Every
+    time a partial melody can end ($), the finished melody is recorded.
+    Because log-probabilities never increase as a melody grows, the search
+    stops as soon as k finished melodies beat every partial one. With a
+    beam as wide as the number of partial melodies the result is exact;
+    narrower beams trade accuracy for speed. Ties are broken by note ID,
+    so the result is always the same.
+
+    Parameters:
+    model: BigramModel - trained Bigram model
+    k: int - number of melodies to return (default: 5)
+    max_length: int - maximum number of notes per melody (default: 20)
+    beam_width: int - partial melodies kept per step (default: max(k, 16))
+    smoothing: str - a method from smoothing.METHODS (default: 'none')
+    alpha: float - pseudo-count of 'add-k' smoothing (default: 1.0)
+    discount: float - discount of 'absolute' and 'kneser-ney' smoothing (default: 0.75)
+
+    Returns:
+    list[tuple[list[str], float]] - (melody, log-probability) pairs, most
+    probable first; fewer than k if the model cannot produce k melodies
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    beam_width = beam_width or max(k, 16)
+    logp = log_probabilities(model, smoothing=smoothing, alpha=alpha, discount=discount)
+    size = len(model.vocab)
+    end = BigramModel.END_ID
+
+    states = np.array([BigramModel.START_ID])
+    scores = np.zeros(1)
+    history = []   # (parents, states) for every step taken
+    finished = []  # (log-probability, step, beam index) of complete melodies
+    for step in range(max_length + 1):
+        candidates = scores[:, None] + logp[states]
+        ending = candidates[:, end]
+        for index in np.argsort(-ending, kind='stable')[:k]:
+            if np.isfinite(ending[index]):
+                finished.append((float(ending[index]), step, int(index)))
+        finished.sort(key=lambda item: -item[0])
+        del finished[k:]
+
+        candidates[:, end] = -np.inf
+        candidates[:, BigramModel.START_ID] = -np.inf
+        if step == max_length:
+            break
+        flat = candidates.ravel()
+        best = np.argsort(-flat, kind='stable')[:beam_width]
+        best = best[np.isfinite(flat[best])]
+        if best.size == 0:
+            break
+        parents, states = np.divmod(best, size)
+        scores = flat[best]
+        history.append((parents, states))
+        if len(finished) == k and finished[-1][0] >= scores[0]:
+            break
+
+    results = []
+    for log_prob, step, index in finished:
+        ids = []
+        for parents, tokens in reversed(history[:step]):
+            ids.append(int(tokens[index]))
+            index = parents[index]
+        results.append(([model.vocab[i] for i in reversed(ids)], log_prob))
+    return results
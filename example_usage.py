@@ -1,21 +1,28 @@
 """
 Example usage of the Melody Generator with Bigram model.
+
+Run with --profile PATH to write per-stage timings and counters as JSON,
+and add --memory to record each stage's allocations as well.
 """
+import argparse
+
+from instrumentation import DISABLED, Instrumentation
 from models import (
     load_melodies,
     save_melodies,
-    preprocess_melodies,
+    iter_preprocessed,
     build_bigram_model,
-    generate_melody
+    generate_melodies
 )
 
 
-def main():
+def main(instrumentation: Instrumentation = DISABLED):
     """Main function demonstrating melody generation workflow."""
     # Step 1: Load melodies from file
     print("--- Step 1: Loading Data ---")
     input_path = 'data/melodies.txt'
-    melodies = load_melodies(input_path)
+    with instrumentation.stage('load'):
+        melodies = load_melodies(input_path)
     
     if not melodies:
         print("No melodies found. Exiting.")
@@ -25,30 +32,51 @@ def main():
     
     # Step 2: Preprocess (Add ^ and $ tokens)
     print("\n--- Step 2: Preprocessing ---")
-    processed_data = preprocess_melodies(melodies)
+    # Lazy: the tokens are added while training, so this work is timed in 'train'
+    processed_data = iter_preprocessed(melodies)
+    instrumentation.count('melodies', len(melodies))
+    if instrumentation.enabled:
+        instrumentation.count('tokens', sum(map(len, melodies)) + 2 * len(melodies))
     print("Added start (^) and end ($) tokens to melodies.")
     
     # Step 3: Train the Bigram Model
     print("\n--- Step 3: Training Model ---")
-    model = build_bigram_model(processed_data)
+    with instrumentation.stage('train'):
+        model = build_bigram_model(processed_data)
     print(f"Model trained. Learned {len(model)} unique notes/states.")
+    if instrumentation.enabled:
+        instrumentation.record('states', len(model))
+        instrumentation.record('transitions', int(model.counts.sum()))
     
     # Step 4: Generate New Melodies
     print("\n--- Step 4: Generating Music ---")
-    new_melodies = []
     num_generated = 5
-    for i in range(num_generated):
-        new_song = generate_melody(model)
-        new_melodies.append(new_song)
+    with instrumentation.stage('generate'):
+        new_melodies = generate_melodies(model, num_generated)
+    for i, new_song in enumerate(new_melodies):
         print(f"Generated {i+1}: {' '.join(new_song)}")
+    instrumentation.count('generated', len(new_melodies))
+    if instrumentation.enabled:
+        instrumentation.record('average_chain_length',
+                               sum(map(len, new_melodies)) / max(len(new_melodies), 1))
     
     # Step 5: Save Results
     print("\n--- Step 5: Saving Results ---")
     output_path = 'data/generated_melodies.txt'
-    save_melodies(new_melodies, output_path)
+    with instrumentation.stage('save'):
+        save_melodies(new_melodies, output_path)
     print(f"Saved {len(new_melodies)} generated melodies to {output_path}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the melody generation example.")
+    parser.add_argument('--profile', help="write stage timings and counters as JSON to this file")
+    parser.add_argument('--memory', action='store_true',
+                        help="with --profile, also track allocations with tracemalloc")
+    args = parser.parse_args()
+    instrumentation = Instrumentation(memory=args.memory) if args.profile else DISABLED
+    main(instrumentation)
+    if args.profile:
+        instrumentation.save(args.profile)
+        print(f"Wrote profile to {args.profile}")
 
@@ -0,0 +1,153 @@
+"""
+Opt-in instrumentation of pipeline stages.
+
+An Instrumentation object times named stages, keeps counters, and can
+track allocations with tracemalloc:
+
+    instrumentation = Instrumentation(memory=True)
+    with instrumentation.stage('load'):
+        melodies = load_melodies(path)
+    instrumentation.count('melodies', len(melodies))
+    instrumentation.save('profile.json')
+
+Code that is instrumented takes an Instrumentation and defaults to
+DISABLED, whose stage and count do nothing, so uninstrumented runs only
+pay for a few method calls. Work done only to compute a counter should be
+guarded with `if instrumentation.enabled:`.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, Optional
+
+
+class Instrumentation:
+    """Per-stage timers, counters and optional allocation tracking."""
+
+    enabled = True
+
+    def __init__(self, memory: bool = False):
+        """
+        Parameters:
+        memory: bool - also record each stage's allocations with tracemalloc;
+            this slows the stages down considerably (default: False)
+        """
+        self.memory = memory
+        self.stages: dict[str, dict] = {}
+        self.counters: dict[str, float] = {}
+        # Highest traced memory seen so far by each open stage, innermost last
+        self._peaks: list[int] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time the code run inside a with block as one call of a stage.
+
+        Stages entered more than once accumulate their time and keep their
+        largest peak allocation. Stages may be nested; an enclosing stage's
+        peak includes the peaks of the stages inside it.
+
+        Parameters:
+        name: str - the stage's name, e.g. 'load'
+        """
+        started_tracing = self.memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.memory:
+            # reset_peak forgets the enclosing stage's peak, so save it first
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            self._peaks.append(0)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            record = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            record['calls'] += 1
+            record['seconds'] += seconds
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, self._peaks.pop())
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                record['peak_bytes'] = max(record.get('peak_bytes', 0), peak - before)
+                record['allocated_bytes'] = record.get('allocated_bytes', 0) + current - before
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def count(self, name: str, value: float = 1) -> None:
+        """
+        Add to a counter, starting it at 0 if it is new.
+
+        Parameters:
+        name: str - the counter's name, e.g. 'tokens'
+        value: float - amount to add (default: 1)
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name: str, value: float) -> None:
+        """
+        Set a counter to a value, e.g. an average worked out after a stage.
+
+        Parameters:
+        name: str - the counter's name, e.g. 'average_chain_length'
+        value: float - its value
+        """
+        self.counters[name] = value
+
+    def to_dict(self) -> dict:
+        """
+        Return everything recorded so far.
+
+        Returns:
+        dict - {'stages': {name: {'calls', 'seconds'[, 'peak_bytes',
+        'allocated_bytes']}}, 'counters': {name: value}}
+        """
+        return {'stages': {name: dict(record) for name, record in self.stages.items()},
+                'counters': dict(self.counters)}
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """Return to_dict() as a JSON string."""
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def save(self, path: str) -> None:
+        """
+        Write to_dict() to a JSON file.
+
+        Parameters:
+        path: str - path to the file to write
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json() + '\n')
+
+    def reset(self) -> None:
+        """Forget every recorded stage and counter."""
+        self.stages.clear()
+        self.counters.clear()
+
+
+class _DisabledInstrumentation(Instrumentation):
+    """Instrumentation that records nothing."""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+        self._context = nullcontext()
+
+    def stage(self, name: str):
+        return self._context
+
+    def count(self, name: str, value: float = 1) -> None:
+        pass
+
+    def record(self, name: str, value: float) -> None:
+        pass
+
+
+# Shared default for instrumented code that is not being profiled
+DISABLED = _DisabledInstrumentation()
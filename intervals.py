@@ -0,0 +1,214 @@
+"""
+Transposition-invariant encodings of melodies.
+
+A Bigram model trained on absolute notes learns the same melody in twelve
+keys as twelve unrelated sets of transitions. Encoding melodies relative to
+their key first makes all twelve identical, so the model has far fewer
+states and its counts are pooled:
+
+    'degree'    every note as its distance in semitones from the tonic,
+                e.g. C4 E4 G4 C5 in C -> '0' '4' '7' '12'
+    'interval'  the first note's scale degree, then the step to each next
+                note, e.g. C4 E4 G4 C5 -> '@0' '+4' '+3' '+5'
+
+Keys are normalised to their relative major (A minor is encoded like
+C major), so a model can be decoded into any key, major or minor.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+from models import BigramModel, build_bigram_model, generate_melodies, iter_preprocessed
+from pitch import SCALES, midi_to_note, parse_key, parse_note
+
+MODES = ('degree', 'interval')
+
+# Scales whose tonic sits three semitones above their relative major's tonic
+_MINOR_SCALES = {'minor', 'harmonic minor', 'minor pentatonic'}
+_MAJOR = np.zeros((12, 12))
+for _tonic in range(12):
+    _MAJOR[_tonic, [(_tonic + step) % 12 for step in SCALES['major']]] = 1
+
+
+def reference_tonic(key: str) -> int:
+    """
+    Return the pitch class melodies in a key are normalised to.
+
+    This is the tonic of the key, or of its relative major for minor keys.
+
+    Parameters:
+    key: str - a key as read by pitch.parse_key, e.g. 'A minor'
+
+    Returns:
+    int - pitch class 0-11
+    """
+    tonic, scale = parse_key(key)
+    return (tonic + (3 if scale in _MINOR_SCALES else 0)) % 12
+
+
+def estimate_tonic(pitch_classes: list[int]) -> int:
+    """
+    Guess the major key of a melody from its pitch classes.
+
+    The key whose scale contains the most notes wins; ties go to the key
+    whose tonic the melody ends on, then starts on, then the first key
+    whose tonic is at or above the first note.
+
+    Parameters:
+    pitch_classes: list[int] - the melody's pitch classes, 0-11
+
+    Returns:
+    int - pitch class of the estimated (relative major) tonic
+    """
+    if not pitch_classes:
+        return 0
+    histogram = np.bincount(pitch_classes, minlength=12)
+    scores = _MAJOR @ histogram * 4
+    scores[pitch_classes[-1]] += 2
+    scores[pitch_classes[0]] += 1
+    # Break remaining ties relative to the melody, so that transposing a
+    # melody always transposes its estimated key with it
+    tied = np.flatnonzero(scores == scores.max())
+    return int(min(tied, key=lambda tonic: (tonic - pitch_classes[0]) % 12))
+
+
+def _pitches(melody: list[str]) -> list[int]:
+    """Return semitone heights of notes, chaining by the nearest step when octaves are missing."""
+    parsed = []
+    for note in melody:
+        value = parse_note(note)
+        if value is None:
+            raise ValueError(f"Not a note name: {note!r}")
+        parsed.append(value)
+    if all(octave is not None for _, octave in parsed):
+        return [12 * (octave + 1) + pitch_class for pitch_class, octave in parsed]
+    pitches = []
+    for pitch_class, _ in parsed:
+        if not pitches:
+            pitches.append(pitch_class)
+        else:
+            step = (pitch_class - pitches[-1]) % 12
+            pitches.append(pitches[-1] + (step - 12 if step > 6 else step))
+    return pitches
+
+
+def encode_melody(melody: list[str], mode: str = 'interval',
+                  key: Optional[str] = None) -> list[str]:
+    """
+    Encode a melody relative to its key.
+
+    Notes without an octave are joined by the smallest step between them.
+
+    Parameters:
+    melody: list[str] - note names such as 'C4' or 'F#'
+    mode: str - 'interval' or 'degree' (default: 'interval')
+    key: str - the melody's key, e.g. 'G major'; estimated if omitted
+
+    Returns:
+    list[str] - the encoded tokens, one per note
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    pitches = _pitches(melody)
+    if not pitches:
+        return []
+    if key is None:
+        tonic = estimate_tonic([pitch % 12 for pitch in pitches])
+    else:
+        tonic = reference_tonic(key)
+    first = (pitches[0] - tonic) % 12
+    if mode == 'interval':
+        steps = np.diff(pitches).tolist()
+        return [f"@{first}"] + [f"{step:+d}" for step in steps]
+    base = pitches[0] - first
+    return [str(pitch - base) for pitch in pitches]
+
+
+def decode_melody(tokens: list[str], key: str = 'C major', octave: int = 4,
+                  mode: str = 'interval') -> list[str]:
+    """
+    Turn encoded tokens back into notes in a key.
+
+    Parameters:
+    tokens: list[str] - tokens from encode_melody or a model trained on them
+    key: str - the key to decode into, e.g. 'D minor' (default: 'C major')
+    octave: int - octave of the (relative major) tonic (default: 4)
+    mode: str - the encoding of the tokens (default: 'interval')
+
+    Returns:
+    list[str] - note names with octaves
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    base = 12 * (octave + 1) + reference_tonic(key)
+    if mode == 'degree':
+        return [midi_to_note(base + int(token)) for token in tokens]
+    notes = []
+    pitch = base
+    for i, token in enumerate(tokens):
+        if token.startswith('@'):
+            pitch = base + int(token[1:])
+        elif i == 0:
+            raise ValueError("An interval melody must start with a degree token such as '@0'")
+        else:
+            pitch += int(token)
+        notes.append(midi_to_note(pitch))
+    return notes
+
+
+def encode_melodies(melodies: Iterable[list[str]], mode: str = 'interval',
+                    keys: Optional[Iterable[Optional[str]]] = None) -> Iterable[list[str]]:
+    """
+    Lazily encode many melodies relative to their keys.
+
+    Parameters:
+    melodies: Iterable[list[str]] - melodies, e.g. from load_melodies
+    mode: str - 'interval' or 'degree' (default: 'interval')
+    keys: Iterable[str] - each melody's key, or None to estimate it (default:
+        estimate every key)
+
+    Returns:
+    Iterable[list[str]] - the encoded melodies
+    """
+    if keys is None:
+        return (encode_melody(melody, mode) for melody in melodies)
+    return (encode_melody(melody, mode, key) for melody, key in zip(melodies, keys))
+
+
+def build_interval_model(melodies: Iterable[list[str]], mode: str = 'interval',
+                         keys: Optional[Iterable[Optional[str]]] = None) -> BigramModel:
+    """
+    Train a Bigram model on key-normalised melodies.
+
+    Parameters:
+    melodies: Iterable[list[str]] - melodies of absolute notes, without ^ and $
+    mode: str - 'interval' or 'degree' (default: 'interval')
+    keys: Iterable[str] - each melody's key (default: estimate every key)
+
+    Returns:
+    BigramModel - model over encoded tokens; decode what it generates with
+    decode_melody or generate_in_key
+    """
+    return build_bigram_model(iter_preprocessed(encode_melodies(melodies, mode, keys)))
+
+
+def generate_in_key(model: BigramModel, key: str, n: int = 1, max_length: int = 20,
+                    seed: Optional[int] = None, mode: str = 'interval',
+                    octave: int = 4) -> list[list[str]]:
+    """
+    Generate melodies from a key-normalised model and decode them into a key.
+
+    Parameters:
+    model: BigramModel - model from build_interval_model
+    key: str - the key to generate in, e.g. 'E minor'
+    n: int - number of melodies (default: 1)
+    max_length: int - maximum length of each melody (default: 20)
+    seed: int - seed for reproducible melodies (default: None)
+    mode: str - the model's encoding (default: 'interval')
+    octave: int - octave of the (relative major) tonic (default: 4)
+
+    Returns:
+    list[list[str]] - the generated melodies as note names
+    """
+    return [decode_melody(tokens, key, octave, mode)
+            for tokens in generate_melodies(model, n, max_length, seed)]
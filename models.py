@@ -1,4 +1,75 @@
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+import queue
 import random
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from constraints import Constraints
+
+
+class MelodyFormatError(ValueError):
+    """
+    Raised when a line in a melody file cannot be parsed into notes.
+    
+    line_number is None when the line was read from a byte range that does
+    not start at the beginning of the file; offset (the byte position of
+    the line) is always set.
+    """
+
+    def __init__(self, path: str, line_number: Optional[int], line: str, reason: str,
+                 offset: Optional[int] = None):
+        self.path = path
+        self.line_number = line_number
+        self.line = line
+        self.reason = reason
+        self.offset = offset
+        location = f"{path}:{line_number}" if line_number is not None else f"{path} (byte {offset})"
+        super().__init__(f"{location}: {reason}: {line!r}")
+
+
+def _parse_line(line: str) -> list[str]:
+    """
+    Split one stripped, non-empty line into notes.
+    
+    Parameters:
+    line: str - a single line from a melody file (already stripped)
+    
+    Returns:
+    list[str] - the notes on the line
+    """
+    # Try comma first, then space
+    if ',' in line:
+        return [note.strip() for note in line.split(',')]
+    return line.split()
+
+
+def _check_notes(notes: list[str]) -> Optional[str]:
+    """
+    Return the reason a parsed line is malformed, or None if it is valid.
+    
+    Parameters:
+    notes: list[str] - notes returned by _parse_line
+    
+    Returns:
+    Optional[str] - description of the problem, or None
+    """
+    for note in notes:
+        if not note:
+            return "empty note"
+        if any(ch.isspace() for ch in note):
+            return f"note {note!r} contains whitespace"
+    return None
 
 
 def load_melodies(path: str) -> list[list[str]]:
@@ -17,13 +88,7 @@ def load_melodies(path: str) -> list[list[str]]:
             for line in f:
                 line = line.strip()
                 if line:  # Skip empty lines
-                    # Split the line into notes (assuming space or comma separated)
-                    # Try comma first, then space
-                    if ',' in line:
-                        notes = [note.strip() for note in line.split(',')]
-                    else:
-                        notes = line.split()
-                    melodies.append(notes)
+                    melodies.append(_parse_line(line))
         return melodies
     except FileNotFoundError:
         print(f"File not found: {path}")
@@ -34,27 +99,583 @@ def load_melodies(path: str) -> list[list[str]]:
         return []
 
 
-def save_melodies(melodies: list[list[str]], path: str) -> None:
+def iter_melodies(path: str,
+                  on_error: Optional[Callable[[MelodyFormatError], None]] = None,
+                  start: int = 0, end: Optional[int] = None) -> Iterator[list[str]]:
     """
-    Save a list of generated melodies to a file, one melody per line.
+    Lazily yield melodies from a file, one at a time.
+    
+    Unlike load_melodies, this never holds more than one line in memory
+    and does not hide problems: a missing file raises FileNotFoundError,
+    and a malformed line (an empty note such as "C,,D", a comma-separated
+    note containing spaces, or undecodable bytes) raises MelodyFormatError
+    with the line number. Pass on_error to report malformed lines and keep
+    going instead.
+    
+    start and end restrict reading to the lines that begin inside the byte
+    range [start, end), so a file split into consecutive ranges yields every
+    melody exactly once across the ranges.
     
     Parameters:
-    melodies: list[list[str]] - list of melodies to save
+    path: str - path to the file containing melodies
+    on_error: callable - called with each MelodyFormatError; the line is skipped
+    start: int - byte offset where the range starts (default: 0)
+    end: int - byte offset where the range ends (default: end of file)
+    
+    Returns:
+    Iterator[list[str]] - melodies, where each melody is a list of notes
+    """
+    with open(path, 'rb') as f:
+        offset = start
+        if start > 0:
+            # The line that straddles start belongs to the previous range
+            f.seek(start - 1)
+            offset += len(f.readline()) - 1
+        line_number = 1 if start == 0 else None
+        for raw in f:
+            if end is not None and offset >= end:
+                break
+            line_offset = offset
+            offset += len(raw)
+            try:
+                line = raw.decode('utf-8').strip()
+            except UnicodeDecodeError as e:
+                error = MelodyFormatError(path, line_number, repr(raw), f"invalid UTF-8 ({e.reason})",
+                                          line_offset)
+            else:
+                error = None
+                if line:  # Skip empty lines
+                    notes = _parse_line(line)
+                    # Whitespace-separated notes are always well formed
+                    reason = _check_notes(notes) if ',' in line else None
+                    if reason is None:
+                        yield notes
+                    else:
+                        error = MelodyFormatError(path, line_number, line, reason, line_offset)
+            if line_number is not None:
+                line_number += 1
+            if error is None:
+                continue
+            if on_error is None:
+                raise error
+            on_error(error)
+
+
+def iter_melody_chunks(path: str, chunk_size: int = 10000,
+                       on_error: Optional[Callable[[MelodyFormatError], None]] = None
+                       ) -> Iterator[list[list[str]]]:
+    """
+    Lazily yield melodies from a file in lists of at most chunk_size.
+    
+    Parameters:
+    path: str - path to the file containing melodies
+    chunk_size: int - maximum number of melodies per chunk (default: 10000)
+    on_error: callable - see iter_melodies
+    
+    Returns:
+    Iterator[list[list[str]]] - chunks of melodies
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    chunk = []
+    for melody in iter_melodies(path, on_error=on_error):
+        chunk.append(melody)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def save_melodies(melodies: Iterable[list[str]], path: str) -> None:
+    """
+    Save melodies to a file, one melody per line.
+    
+    Melodies are written with write_melodies, so a generator can be saved
+    without holding it in memory, and a path ending in .gz, .bz2 or .xz is
+    compressed.
+    
+    Parameters:
+    melodies: Iterable[list[str]] - melodies to save
+    path: str - path to the output file
+    
+    Raises:
+    OSError - if the file cannot be written
+    """
+    write_melodies(melodies, path)
+
+
+# Compressed output formats from the standard library, by name and file suffix
+_COMPRESSION = {'gzip': gzip.open, 'bz2': bz2.open, 'lzma': lzma.open}
+_COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma'}
+
+
+def _resolve_compression(path: str, compression: Optional[str]) -> Optional[str]:
+    """Return the compressor to use for path, taken from its suffix by default."""
+    if compression is None:
+        return _COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1])
+    if compression == 'none':
+        return None
+    if compression not in _COMPRESSION:
+        raise ValueError(f"Unknown compression {compression!r}; "
+                         f"use one of {sorted(_COMPRESSION)} or 'none'")
+    return compression
+
+
+def _open_output(path: str, compression: Optional[str], level: Optional[int],
+                 buffer_size: int):
+    if compression is None:
+        return open(path, 'wb', buffering=buffer_size)
+    if level is None:
+        return _COMPRESSION[compression](path, 'wb')
+    if compression == 'lzma':
+        return lzma.open(path, 'wb', preset=level)
+    return _COMPRESSION[compression](path, 'wb', compresslevel=level)
+
+
+def _encode_chunk(chunk: list[list[str]]) -> bytes:
+    return ('\n'.join(map(' '.join, chunk)) + '\n').encode('utf-8')
+
+
+def _remove_files(paths: Iterable[str]) -> None:
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_melodies(melodies: Iterable[list[str]], path: str,
+                   compression: Optional[str] = None, level: Optional[int] = None,
+                   chunk_size: int = 128, buffer_size: int = 1 << 14) -> int:
+    """
+    Stream melodies to a text file, one melody per line, in block writes.
+    
+    Melodies are taken chunk_size at a time from any iterable, and each
+    chunk is joined and encoded into one block and written at once. The
+    defaults keep only a few KiB of text in memory at a time; larger
+    chunks barely write faster, but each is held as a list, a str and
+    bytes at once, so memory grows with chunk_size. The
+    file is written under a temporary name and renamed when complete, so a
+    failed write never leaves a truncated file behind; errors are raised.
+    
+    Parameters:
+    melodies: Iterable[list[str]] - melodies to write, e.g. a generator
     path: str - path to the output file
+    compression: str - 'gzip', 'bz2', 'lzma' or 'none'; by default taken
+        from the suffix of path (.gz, .bz2, .xz)
+    level: int - compression level (default: the compressor's default)
+    chunk_size: int - melodies joined per write (default: 128)
+    buffer_size: int - file buffer size in bytes (default: 16 KiB)
+    
+    Returns:
+    int - the number of melodies written
     """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    compression = _resolve_compression(path, compression)
+    tmp_path = f"{path}.tmp"
+    written = 0
+    melodies = iter(melodies)
     try:
-        with open(path, 'w', encoding='utf-8') as f:
-            for melody in melodies:
-                # Join notes with space (or comma if preferred)
-                line = ' '.join(melody)
-                f.write(line + '\n')
-    except Exception as e:
-        print(f"Error saving file: {e}")
+        with _open_output(tmp_path, compression, level, buffer_size) as f:
+            while chunk := list(islice(melodies, chunk_size)):
+                f.write(_encode_chunk(chunk))
+                written += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_files([tmp_path])
+        raise
+    return written
+
+
+def write_sharded(melodies: Iterable[list[str]], path: str, shards: int,
+                  compression: Optional[str] = None, level: Optional[int] = None,
+                  chunk_size: int = 65536, buffer_size: int = 1 << 20) -> list[str]:
+    """
+    Stream melodies into several files at once, one writer thread per shard.
+    
+    path must contain a {shard} field, e.g. 'out/melodies-{shard:03d}.txt.gz'.
+    Chunks of chunk_size melodies are dealt to the shards in turn (chunk i
+    goes to shard i % shards), and each shard's thread encodes, compresses
+    and writes its chunks while the main thread reads the next ones. The
+    compressors release the GIL, so compressed shards are written in
+    parallel. Shards are written under temporary names and renamed only
+    once every shard succeeds; otherwise the first error is raised.
+    
+    Parameters:
+    melodies: Iterable[list[str]] - melodies to write, e.g. a generator
+    path: str - output path pattern with a {shard} field
+    shards: int - number of output files
+    compression: str - see write_melodies
+    level: int - compression level (default: the compressor's default)
+    chunk_size: int - melodies per chunk (default: 65536)
+    buffer_size: int - file buffer size in bytes (default: 1 MiB)
+    
+    Returns:
+    list[str] - the paths of the shard files, in shard order
+    """
+    if shards < 1:
+        raise ValueError("shards must be at least 1")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    paths = [path.format(shard=shard) for shard in range(shards)]
+    if len(set(paths)) != shards:
+        raise ValueError("path must contain a {shard} field")
+    compression = _resolve_compression(paths[0], compression)
+    tmp_paths = [f"{shard_path}.tmp" for shard_path in paths]
+    errors = []
+    
+    def write_shard(f, chunks: queue.Queue) -> None:
+        # Keep taking chunks after an error so the main thread never blocks
+        while (chunk := chunks.get()) is not None:
+            if not errors:
+                try:
+                    f.write(_encode_chunk(chunk))
+                except Exception as error:
+                    errors.append(error)
+        try:
+            f.close()
+        except Exception as error:
+            errors.append(error)
+    
+    files = []
+    try:
+        for tmp_path in tmp_paths:
+            files.append(_open_output(tmp_path, compression, level, buffer_size))
+        # At most two chunks wait per shard, which bounds memory
+        queues = [queue.Queue(maxsize=2) for _ in range(shards)]
+        threads = [threading.Thread(target=write_shard, args=(f, chunks))
+                   for f, chunks in zip(files, queues)]
+        for thread in threads:
+            thread.start()
+        try:
+            melodies = iter(melodies)
+            shard = 0
+            while not errors and (chunk := list(islice(melodies, chunk_size))):
+                queues[shard].put(chunk)
+                shard = (shard + 1) % shards
+        finally:
+            for chunks in queues:
+                chunks.put(None)
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+        for tmp_path, shard_path in zip(tmp_paths, paths):
+            os.replace(tmp_path, shard_path)
+    except BaseException:
+        for f in files:
+            f.close()
+        _remove_files(tmp_paths)
+        raise
+    return paths
 
 
 # --- Bigram Model Functions ---
 
 
+# Batches are counted with one bincount over the whole V * V matrix only
+# when the matrix is at most this large and the batch has at least one
+# pair per _BINCOUNT_CELLS_PER_PAIR cells; smaller batches (such as a
+# single-melody update) and bigger vocabularies scatter-add into the
+# affected cells instead.
+_BINCOUNT_MAX_CELLS = 1 << 22
+_BINCOUNT_CELLS_PER_PAIR = 8
+
+
+class _TransitionRow(Mapping):
+    """Read-only dict view of one row of a BigramModel: next note -> count."""
+
+    def __init__(self, model: 'BigramModel', state: int):
+        self._model = model
+        self._state = state
+
+    def _ids(self) -> np.ndarray:
+        return np.flatnonzero(self._model.counts[self._state])
+
+    def __getitem__(self, note: str) -> int:
+        next_id = self._model.index.get(note)
+        if next_id is None:
+            raise KeyError(note)
+        count = int(self._model.counts[self._state, next_id])
+        if count == 0:
+            raise KeyError(note)
+        return count
+
+    def __iter__(self) -> Iterator[str]:
+        vocab = self._model.vocab
+        return (vocab[i] for i in self._ids())
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._model.counts[self._state]))
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class BigramModel(Mapping):
+    """
+    Bigram transition counts stored in a dense NumPy matrix.
+    
+    Notes are interned to small integer IDs (^ is always 0 and $ is
+    always 1) and counts[i, j] holds the number of vocab[i] -> vocab[j]
+    transitions. The model also behaves like the nested dict returned by
+    earlier versions of build_bigram_model, so model[note1][note2] is the
+    count of note1 -> note2 transitions and `note in model` is True for
+    every note that has at least one outgoing transition.
+    
+    Dense storage costs 8 bytes per cell of the count matrix, and a compiled
+    sampler adds 16 * V * V bytes: about 100 MB in all at V = 2,000. The
+    matrix grows to exactly the vocabulary size when notes are interned in
+    batches (intern_many), and by an eighth when they are interned one at a
+    time. Beyond a couple of thousand notes, e.g. joint pitch/duration
+    tokens, use NGramModel(2) from ngram.py, which stores only the
+    transitions that occur.
+    """
+
+    START_ID = 0
+    END_ID = 1
+
+    def __init__(self, capacity: int = 16):
+        self.vocab: list[str] = []
+        self.index: dict[str, int] = {}
+        self._counts = np.zeros((capacity, capacity), dtype=np.int64)
+        self._sampler = None
+        self._constrained = OrderedDict()
+        self._smoothed = {}
+        self._hash = None
+        self.intern('^')
+        self.intern('$')
+
+    @property
+    def counts(self) -> np.ndarray:
+        """The V x V count matrix, where V is the vocabulary size."""
+        size = len(self.vocab)
+        return self._counts[:size, :size]
+
+    def intern(self, note: str) -> int:
+        """
+        Return the integer ID of a note, adding it to the vocabulary if new.
+        
+        Parameters:
+        note: str - the note to look up
+        
+        Returns:
+        int - the note's ID
+        """
+        note_id = self.index.get(note)
+        if note_id is None:
+            note_id = self._append(note)
+            # A larger vocabulary makes every compiled table the wrong size
+            self._invalidate([])
+        return note_id
+
+    def _append(self, note: str) -> int:
+        note_id = len(self.vocab)
+        if note_id == self._counts.shape[0]:
+            self._grow(note_id + max(16, note_id // 8))
+        self.vocab.append(note)
+        self.index[note] = note_id
+        return note_id
+
+    def _grow(self, capacity: int) -> None:
+        size = len(self.vocab)
+        counts = np.zeros((capacity, capacity), dtype=np.int64)
+        counts[:size, :size] = self._counts[:size, :size]
+        self._counts = counts
+
+    def add_transition(self, current_note: str, next_note: str, count: int = 1) -> None:
+        """
+        Add count to the current_note -> next_note transition.
+        
+        Parameters:
+        current_note: str - the note the transition starts from
+        next_note: str - the note the transition goes to
+        count: int - how many transitions to add (default: 1)
+        """
+        current_id = self.intern(current_note)
+        next_id = self.intern(next_note)
+        self._counts[current_id, next_id] += count
+        self._invalidate([current_id])
+
+    def intern_many(self, notes: list[str]) -> np.ndarray:
+        """
+        Return the IDs of many notes at once, adding new notes to the vocabulary.
+        
+        Parameters:
+        notes: list[str] - the notes to look up
+        
+        Returns:
+        np.ndarray - int64 array of IDs, one per note
+        """
+        index = self.index
+        # Distinct notes in order of first appearance, so IDs do not depend on string hashing
+        new_notes = [note for note in dict.fromkeys(notes) if note not in index]
+        if new_notes:
+            # Grow the matrix once, to exactly the new vocabulary size
+            if len(self.vocab) + len(new_notes) > self._counts.shape[0]:
+                self._grow(len(self.vocab) + len(new_notes))
+            for note in new_notes:
+                self._append(note)
+            self._invalidate([])
+        return np.fromiter(map(index.__getitem__, notes), dtype=np.int64, count=len(notes))
+
+    def add_sequences(self, sequences: list[list[str]]) -> None:
+        """
+        Count every transition in a batch of sequences in one vectorized pass.
+        
+        The sequences are interned into one concatenated ID array and the
+        (previous, next) pairs that would cross from the end of one sequence
+        into the start of the next are masked out before counting.
+        
+        Parameters:
+        sequences: list[list[str]] - preprocessed melodies with ^ and $ tokens
+        """
+        ids = self.intern_many(list(chain.from_iterable(sequences)))
+        lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        self._add_pairs(ids, lengths, 1)
+
+    def add_melodies(self, melodies: list[list[str]]) -> None:
+        """
+        Count every transition in a batch of melodies without ^ and $ tokens.
+        
+        The start and end transitions are counted as if each melody had been
+        preprocessed, but no preprocessed copy of any melody is built.
+        
+        Parameters:
+        melodies: list[list[str]] - melodies as lists of notes
+        """
+        ids = self.intern_many(list(chain.from_iterable(melodies)))
+        lengths = np.fromiter(map(len, melodies), dtype=np.int64, count=len(melodies))
+        self.add_melody_ids(ids, lengths)
+
+    def add_melody_ids(self, ids: np.ndarray, lengths: np.ndarray) -> None:
+        """
+        Count the transitions of melodies given as concatenated note IDs.
+        
+        This is add_melodies for melodies that are already interned, such as
+        the tokens of a packed corpus mapped to this model's IDs.
+        
+        Parameters:
+        ids: np.ndarray - note IDs of all melodies, one after another,
+            without start and end tokens
+        lengths: np.ndarray - number of notes in each melody
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        sizes = lengths + 2
+        starts = np.cumsum(sizes) - sizes
+        bounded = np.empty(int(sizes.sum()), dtype=np.int64)
+        notes = np.ones(len(bounded), dtype=bool)
+        notes[starts] = notes[starts + lengths + 1] = False
+        bounded[starts] = self.START_ID
+        bounded[starts + lengths + 1] = self.END_ID
+        bounded[notes] = ids
+        self._add_pairs(bounded, sizes, 1)
+
+    def remove_sequences(self, sequences: list[list[str]]) -> None:
+        """
+        Subtract every transition in a batch of sequences from the counts.
+        
+        The batch is checked before anything changes: if it contains a note
+        or a transition the model has not counted often enough, ValueError
+        is raised and the model is left as it was.
+        
+        Parameters:
+        sequences: list[list[str]] - preprocessed melodies with ^ and $ tokens
+        """
+        notes = list(chain.from_iterable(sequences))
+        unseen = set(notes).difference(self.index)
+        if unseen:
+            raise ValueError(f"Cannot forget unseen notes: {sorted(unseen)}")
+        ids = self.intern_many(notes)
+        lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        self._add_pairs(ids, lengths, -1)
+
+    def _add_pairs(self, ids: np.ndarray, lengths: np.ndarray, sign: int) -> None:
+        if len(ids) < 2:
+            return
+        keep = np.ones(len(ids) - 1, dtype=bool)
+        ends = np.cumsum(lengths) - 1
+        keep[ends[(ends >= 0) & (ends < len(keep))]] = False
+        prev = ids[:-1][keep]
+        nxt = ids[1:][keep]
+        size = len(self.vocab)
+        cells = size * size
+        if cells <= _BINCOUNT_MAX_CELLS and len(prev) * _BINCOUNT_CELLS_PER_PAIR >= cells:
+            delta = np.bincount(prev * size + nxt, minlength=cells).reshape(size, size)
+            counts = self._counts[:size, :size]
+            if sign < 0 and (counts < delta).any():
+                raise ValueError("Cannot forget transitions that were never counted")
+            counts += sign * delta
+            states = np.flatnonzero(delta.any(axis=1))
+        else:
+            keys, delta = np.unique(prev * size + nxt, return_counts=True)
+            rows, columns = np.divmod(keys, size)
+            if sign < 0 and (self._counts[rows, columns] < delta).any():
+                raise ValueError("Cannot forget transitions that were never counted")
+            self._counts[rows, columns] += sign * delta
+            states = np.unique(rows)
+        self._invalidate(states)
+
+    def content_hash(self) -> str:
+        """
+        Return a hash of the vocabulary and counts.
+        
+        Two models with the same notes and counts have the same hash, and
+        any change to the counts or vocabulary gives a new one. The hash is
+        cached until the model changes.
+        
+        Returns:
+        str - hex digest identifying the model's contents
+        """
+        size = len(self.vocab)
+        if self._hash is None or self._hash[0] != size:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update('\n'.join(self.vocab).encode('utf-8'))
+            digest.update(np.ascontiguousarray(self.counts, dtype='<i8').tobytes())
+            self._hash = (size, digest.hexdigest())
+        return self._hash[1]
+
+    def _invalidate(self, states) -> None:
+        self._hash = None
+        self._smoothed.clear()
+        # Only the sampling tables of the states whose counts changed go stale
+        states = list(states)
+        if self._sampler is not None:
+            self._sampler.invalidate(states)
+        for sampler in self._constrained.values():
+            sampler.invalidate(states)
+
+    def __getstate__(self) -> dict:
+        # Pickle only the used part of the matrix and never the sampler
+        state = self.__dict__.copy()
+        state['_counts'] = self.counts.copy()
+        state['_sampler'] = None
+        state['_constrained'] = OrderedDict()
+        state['_smoothed'] = {}
+        state['_hash'] = None
+        return state
+
+    def to_dict(self) -> dict:
+        """Return the model as a plain nested dict of counts."""
+        return {note: dict(transitions) for note, transitions in self.items()}
+
+    def __getitem__(self, note: str) -> _TransitionRow:
+        state = self.index.get(note)
+        if state is None or not self.counts[state].any():
+            raise KeyError(note)
+        return _TransitionRow(self, state)
+
+    def __iter__(self) -> Iterator[str]:
+        vocab = self.vocab
+        return (vocab[i] for i in np.flatnonzero(self.counts.any(axis=1)))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.counts.any(axis=1)))
+
+    def __repr__(self) -> str:
+        return f"BigramModel({len(self.vocab)} notes, {int(self.counts.sum())} transitions)"
+
+
 def preprocess_melodies(melodies: list[list[str]]) -> list[list[str]]:
     """
     Add start (^) and end ($) tokens to melodies for training.
@@ -71,44 +692,626 @@ def preprocess_melodies(melodies: list[list[str]]) -> list[list[str]]:
     return processed
 
 
-def build_bigram_model(melodies: list[list[str]]) -> dict:
+class Preprocessed(Iterator):
+    """
+    Iterator over melodies with start (^) and end ($) tokens added lazily.
+    
+    Iterating gives ['^'] + melody + ['$'] one melody at a time, like any
+    preprocessed melodies. Training (build_bigram_model, update_model)
+    recognises it and reads the underlying melodies directly, adding the
+    boundary transitions in ID space, so no copy of any melody is made.
+    """
+
+    def __init__(self, melodies: Iterable[list[str]]):
+        self.melodies = iter(melodies)
+
+    def __next__(self) -> list[str]:
+        return ['^'] + next(self.melodies) + ['$']
+
+
+def iter_preprocessed(melodies: Iterable[list[str]]) -> Preprocessed:
+    """
+    Lazily add start (^) and end ($) tokens to melodies.
+    
+    Use this instead of preprocess_melodies when training, so the corpus
+    is never copied: build_bigram_model(iter_preprocessed(melodies)) counts
+    the boundary transitions without building ['^'] + melody + ['$'] lists,
+    and with iter_melodies(path) the corpus is never held in memory at once.
+    
+    Parameters:
+    melodies: Iterable[list[str]] - melodies to preprocess
+    
+    Returns:
+    Preprocessed - iterator over melodies with start and end tokens added
+    """
+    return Preprocessed(melodies)
+
+
+def build_bigram_model(melodies: Iterable[list[str]], chunk_size: int = 65536) -> BigramModel:
     """
     Build a Bigram model from melodies.
     The model stores transition counts between consecutive notes.
+    Melodies are counted chunk_size at a time in a single vectorized pass
+    per chunk, so a generator such as iter_preprocessed(iter_melodies(path))
+    trains in memory bounded by the chunk size. Melodies from
+    iter_preprocessed are counted without copying them.
     
     Parameters:
-    melodies: list[list[str]] - preprocessed melodies with ^ and $ tokens
+    melodies: Iterable[list[str]] - preprocessed melodies with ^ and $ tokens
+    chunk_size: int - number of melodies counted per batch (default: 65536)
     
     Returns:
-    dict - Bigram model where model[note1][note2] = count of note1->note2 transitions
+    BigramModel - Bigram model where model[note1][note2] = count of note1->note2 transitions
     """
-    model = {}
-    for melody in melodies:
-        for i in range(len(melody) - 1):
-            current_note = melody[i]
-            next_note = melody[i + 1]
-            
-            if current_note not in model:
-                model[current_note] = {}
-            
-            if next_note not in model[current_note]:
-                model[current_note][next_note] = 0
-            
-            model[current_note][next_note] += 1
+    return update_model(BigramModel(), melodies, chunk_size)
+
+
+def update_model(model: BigramModel, melodies: Iterable[list[str]],
+                 chunk_size: int = 65536) -> BigramModel:
+    """
+    Add the transitions of new melodies to an already trained model.
+    
+    Only the counts of the transitions in the new melodies change, and
+    only the sampling tables of the affected states are rebuilt, the next
+    time they are used.
+    
+    Parameters:
+    model: BigramModel - the model to update in place
+    melodies: Iterable[list[str]] - preprocessed melodies with ^ and $ tokens
+    chunk_size: int - number of melodies counted per batch (default: 65536)
+    
+    Returns:
+    BigramModel - the updated model
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if isinstance(melodies, Preprocessed):
+        # The start and end tokens are added in ID space instead
+        add, melodies = model.add_melodies, melodies.melodies
+    else:
+        add, melodies = model.add_sequences, iter(melodies)
+    while True:
+        chunk = list(islice(melodies, chunk_size))
+        if not chunk:
+            return model
+        add(chunk)
+
+
+def forget_melodies(model: BigramModel, melodies: Iterable[list[str]]) -> BigramModel:
+    """
+    Remove the transitions of previously trained melodies from a model.
+    
+    This is the inverse of update_model. If any transition would drop below
+    zero (the melodies were not all part of the training data), ValueError
+    is raised and the model is not changed.
+    
+    Parameters:
+    model: BigramModel - the model to update in place
+    melodies: Iterable[list[str]] - preprocessed melodies with ^ and $ tokens
+    
+    Returns:
+    BigramModel - the updated model
+    """
+    model.remove_sequences(list(melodies))
+    return model
+
+
+def merge_models(*models: BigramModel) -> BigramModel:
+    """
+    Combine Bigram models trained on different data into one model.
+    
+    Each model's vocabulary is mapped onto the merged vocabulary and its
+    counts are added in, so merging is associative and the result is the
+    model that training on all of the data at once would produce. The
+    inputs are not modified.
+    
+    Parameters:
+    models: BigramModel - the models to merge
+    
+    Returns:
+    BigramModel - a new model holding the summed counts
+    """
+    merged = BigramModel()
+    for model in models:
+        ids = merged.intern_many(model.vocab)
+        merged._counts[np.ix_(ids, ids)] += model.counts
+    return merged
+
+
+def _shard_ranges(path: str, shards: int) -> list[tuple[int, int]]:
+    """
+    Split a file into at most `shards` consecutive byte ranges of similar size.
+    
+    Parameters:
+    path: str - path to the file to split
+    shards: int - number of ranges wanted
+    
+    Returns:
+    list[tuple[int, int]] - (start, end) byte ranges covering the whole file
+    """
+    size = os.path.getsize(path)
+    shards = max(1, min(shards, size))
+    bounds = [size * i // shards for i in range(shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _train_shard(path: str, start: int, end: int, chunk_size: int) -> BigramModel:
+    """Train a model on the melodies whose lines start in [start, end)."""
+    melodies = iter_melodies(path, start=start, end=end)
+    return build_bigram_model(iter_preprocessed(melodies), chunk_size)
+
+
+def train_parallel(path: str, workers: Optional[int] = None,
+                   chunk_size: int = 65536) -> BigramModel:
+    """
+    Train a Bigram model on a melody file using a pool of processes.
+    
+    The file is split into one byte range per worker; each worker streams
+    its range through iter_melodies, iter_preprocessed and
+    build_bigram_model, and the partial models are combined with
+    merge_models. Malformed lines raise MelodyFormatError as in
+    iter_melodies.
+    
+    Parameters:
+    path: str - path to the file containing melodies
+    workers: int - number of worker processes (default: os.cpu_count())
+    chunk_size: int - number of melodies counted per batch in each worker
+    
+    Returns:
+    BigramModel - the model trained on the whole file
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = _shard_ranges(path, workers)
+    if len(ranges) == 1:
+        return _train_shard(path, *ranges[0], chunk_size)
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(_train_shard, path, start, end, chunk_size)
+                   for start, end in ranges]
+        return merge_models(*(future.result() for future in futures))
+
+
+def _alias_table(weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build a Vose alias table for sampling an index in proportion to weights.
+    
+    To sample, pick a column j uniformly and keep it with probability
+    prob[j], otherwise take alias[j]. Zero-weight columns get prob 0, so
+    they are never returned.
+    
+    Parameters:
+    weights: np.ndarray - non-negative weights with a positive sum
+    
+    Returns:
+    tuple[np.ndarray, np.ndarray] - the prob and alias arrays
+    """
+    size = len(weights)
+    scaled = (weights * (size / weights.sum())).tolist()
+    prob = [0.0] * size
+    alias = list(range(size))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        if scaled[l] < 1.0:
+            small.append(l)
+        else:
+            large.append(l)
+    # Whatever is left over only differs from 1.0 by rounding error
+    fallback = int(np.argmax(weights))
+    for i in small + large:
+        if weights[i] > 0:
+            prob[i] = 1.0
+        else:
+            alias[i] = fallback
+    return np.array(prob), np.array(alias, dtype=np.int64)
+
+
+class CompiledSampler:
+    """
+    Alias tables for sampling the next note from every state of a BigramModel.
+    
+    prob[i] and alias[i] form the alias table over all V notes for state i,
+    so drawing the next note is one uniform draw and one table lookup
+    however many successors a state has. has_next[i] is False for states
+    with no outgoing transitions. Tables are built lazily, one state at a
+    time, and the model marks a state stale again when its counts change.
+    Build one with compile_model.
+    """
+
+    # Set by ConstrainedSampler; an unconstrained sampler never ends early
+    repeat_sampler = None
+    max_repeats = None
+    end_id = None
+
+    def __init__(self, model: BigramModel, tables: Optional[tuple] = None):
+        self._model = model
+        self.vocab = model.vocab
+        self._reset()
+        if tables is not None:
+            # Tables saved with the model (see load_model) are already current
+            self.has_next, self.prob, self.alias = tables
+            self._outdated.clear()
+
+    def _reset(self) -> None:
+        size = len(self.vocab)
+        self._size = size
+        self.has_next = np.zeros(size, dtype=bool)
+        self.prob = np.zeros((size, size))
+        self.alias = np.zeros((size, size), dtype=np.int64)
+        # Plain lists are much faster than NumPy scalars for one draw at a time,
+        # so each state's table is also copied to lists the first time it is used
+        self._has_next = [False] * size
+        self._prob_rows = [None] * size
+        self._alias_rows = [None] * size
+        # States whose NumPy tables must be recomputed from the counts
+        self._outdated = set(range(size))
+        # States whose list copies are missing or out of date
+        self._stale = set(range(size))
+
+    def invalidate(self, states) -> None:
+        """
+        Mark the tables of some states as out of date.
+        
+        If the model's vocabulary has grown, every table is rebuilt, since
+        each one spans the whole vocabulary.
+        
+        Parameters:
+        states: iterable of int - IDs of the states whose counts changed
+        """
+        if len(self.vocab) != self._size:
+            self._reset()
+        else:
+            states = [int(state) for state in states]
+            self._outdated.update(states)
+            self._stale.update(states)
+
+    def _weights(self, state: int) -> np.ndarray:
+        return self._model.counts[state]
+
+    def _rebuild(self, state: int) -> None:
+        if state in self._outdated:
+            weights = self._weights(state)
+            has_next = bool(weights.any())
+            if has_next:
+                self.prob[state], self.alias[state] = _alias_table(weights)
+            else:
+                self.prob[state] = 0.0
+                self.alias[state] = 0
+            self.has_next[state] = has_next
+            self._outdated.discard(state)
+        self._has_next[state] = bool(self.has_next[state])
+        self._prob_rows[state] = self.prob[state].tolist()
+        self._alias_rows[state] = self.alias[state].tolist()
+        self._stale.discard(state)
+
+    def refresh(self) -> None:
+        """Rebuild every out-of-date table, so the NumPy arrays are all current."""
+        for state in sorted(self._outdated):
+            self._rebuild(state)
+
+    def next_id(self, state: int, rng=random) -> int:
+        """
+        Draw the ID of the note that follows state.
+        
+        Parameters:
+        state: int - ID of the current note; must have outgoing transitions
+        rng: random.Random - source of randomness (default: the random module)
+        
+        Returns:
+        int - ID of the next note
+        """
+        if state in self._stale:
+            self._rebuild(state)
+        u = rng.random() * self._size
+        column = int(u)
+        if u - column < self._prob_rows[state][column]:
+            return column
+        return self._alias_rows[state][column]
+
+    def sample(self, max_length: int = 20, rng=random) -> list[str]:
+        """
+        Generate one melody by walking the chain from ^ until $ or max_length.
+        
+        Parameters:
+        max_length: int - maximum length of generated melody (default: 20)
+        rng: random.Random - source of randomness (default: the random module)
+        
+        Returns:
+        list[str] - generated melody as a list of notes
+        """
+        vocab = self.vocab
+        size = self._size
+        stale = self._stale
+        melody = []
+        state = BigramModel.START_ID
+        for _ in range(max_length):
+            if state in stale:
+                self._rebuild(state)
+            if not self._has_next[state]:
+                break
+            u = rng.random() * size
+            column = int(u)
+            if u - column < self._prob_rows[state][column]:
+                state = column
+            else:
+                state = self._alias_rows[state][column]
+            if state == BigramModel.END_ID:
+                break
+            melody.append(vocab[state])
+        return melody
+
+
+class ConstrainedSampler(CompiledSampler):
+    """
+    Alias tables over the counts of a BigramModel masked by Constraints.
+    
+    Notes outside the allowed range or key are masked out of every row,
+    and if an end note is required, $ is only reachable from that note.
+    When max_repeats is set, repeat_sampler holds a second set of tables
+    that also masks out each state's own note; it is used once a note has
+    been repeated max_repeats times. Build one with compile_model, which
+    raises ValueError if the end note is not in the model's vocabulary or
+    is ruled out by the other constraints.
+    """
+
+    def __init__(self, model: BigramModel, constraints: Constraints,
+                 exclude_self: bool = False):
+        self.constraints = constraints
+        self._exclude_self = exclude_self
+        super().__init__(model)
+        self.max_repeats = constraints.max_repeats
+        if constraints.max_repeats is not None and not exclude_self:
+            self.repeat_sampler = ConstrainedSampler(model, constraints, exclude_self=True)
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._mask = self.constraints.mask(self.vocab)
+        end_note = self.constraints.end_note
+        self.end_id = self._model.index.get(end_note) if end_note is not None else None
+        if end_note is not None and (self.end_id is None or not self._mask[self.end_id]):
+            raise ValueError(f"end_note {end_note!r} is not a note the model can generate "
+                             f"under these constraints")
+
+    def invalidate(self, states) -> None:
+        states = list(states)
+        super().invalidate(states)
+        if self.repeat_sampler is not None:
+            self.repeat_sampler.invalidate(states)
+
+    def refresh(self) -> None:
+        super().refresh()
+        if self.repeat_sampler is not None:
+            self.repeat_sampler.refresh()
+
+    def _weights(self, state: int) -> np.ndarray:
+        weights = self._model.counts[state] * self._mask
+        if self.constraints.end_note is not None and state != self.end_id:
+            weights[BigramModel.END_ID] = 0
+        if self._exclude_self:
+            weights[state] = 0
+        return weights
+
+    def sample(self, max_length: int = 20, rng=random) -> list[str]:
+        """
+        Generate one melody that follows the constraints.
+        
+        If the melody has to stop before reaching $ (max_length, or no
+        allowed next note) and an end note is required, it is cut back to
+        the last time the end note was played.
+        
+        Parameters:
+        max_length: int - maximum length of generated melody (default: 20)
+        rng: random.Random - source of randomness (default: the random module)
+        
+        Returns:
+        list[str] - generated melody as a list of notes
+        """
+        ids = []
+        state = BigramModel.START_ID
+        run = 0
+        for _ in range(max_length):
+            table = self
+            if self.repeat_sampler is not None and run >= self.max_repeats:
+                table = self.repeat_sampler
+            if state in table._stale:
+                table._rebuild(state)
+            if not table._has_next[state]:
+                break
+            u = rng.random() * self._size
+            column = int(u)
+            if u - column < table._prob_rows[state][column]:
+                next_state = column
+            else:
+                next_state = table._alias_rows[state][column]
+            if next_state == BigramModel.END_ID:
+                return [self.vocab[i] for i in ids]
+            run = run + 1 if next_state == state else 1
+            ids.append(next_state)
+            state = next_state
+        return [self.vocab[i] for i in _cut_to_end(ids, self.end_id)]
+
+
+def _cut_to_end(ids: list[int], end_id: Optional[int]) -> list[int]:
+    """Cut an unfinished melody back to its last end note, if one is required."""
+    if end_id is None:
+        return ids
+    while ids and ids[-1] != end_id:
+        ids.pop()
+    return ids
+
+
+# Constrained samplers kept per model; the least recently used is dropped
+# first, so clients sending ever-different constraints cannot grow memory
+_MAX_CONSTRAINED_SAMPLERS = 8
+
+
+def compile_model(model: BigramModel,
+                  constraints: Optional[Constraints] = None) -> CompiledSampler:
+    """
+    Return the compiled sampler for a trained model, building it only once.
+    
+    The sampler is cached on the model, one per set of constraints; only
+    the _MAX_CONSTRAINED_SAMPLERS most recently used constrained samplers
+    are kept, since each holds its own V * V tables. When
+    the model's counts change (update_model, forget_melodies), only the
+    tables of the affected states are rebuilt, the next time they are used.
+    
+    Parameters:
+    model: BigramModel - trained Bigram model
+    constraints: Constraints - rules the generated melodies must follow
+    
+    Returns:
+    CompiledSampler - alias tables for every state of the model
+    """
+    if constraints is not None:
+        sampler = model._constrained.get(constraints)
+        if sampler is None:
+            sampler = model._constrained[constraints] = ConstrainedSampler(model, constraints)
+            while len(model._constrained) > _MAX_CONSTRAINED_SAMPLERS:
+                model._constrained.popitem(last=False)
+        model._constrained.move_to_end(constraints)
+        return sampler
+    if model._sampler is None:
+        model._sampler = CompiledSampler(model)
+    return model._sampler
+
+
+# Binary model file layout (all little-endian):
+#   header  magic, format version, vocabulary size V, vocabulary byte length,
+#           flags (bit 0: sampling tables included)
+#   vocab   the notes in ID order, UTF-8, separated by newlines
+#   counts  int64[V, V], starting at the next multiple of 64 bytes
+#   tables  optional bool[V] has_next, float64[V, V] prob, int64[V, V] alias,
+#           each starting at a multiple of 64 bytes
+_MODEL_MAGIC = b'MELODYBG'
+_MODEL_VERSION = 1
+_MODEL_HEADER = struct.Struct('<8sIIQI4x')
+_MODEL_ALIGN = 64
+_HAS_TABLES = 1
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _MODEL_ALIGN) * _MODEL_ALIGN
+
+
+def save_model(model: BigramModel, path: str, tables: bool = True) -> None:
+    """
+    Save a trained model to a versioned binary file that load_model can map.
+    
+    The file is written next to path and then renamed over it, so processes
+    that have the old file mapped keep a consistent view.
+    
+    Parameters:
+    model: BigramModel - the model to save
+    path: str - path to the output file
+    tables: bool - also save the compiled sampling tables (default: True)
+    """
+    if any('\n' in note for note in model.vocab):
+        raise ValueError("Notes containing newlines cannot be saved")
+    vocab = '\n'.join(model.vocab).encode('utf-8')
+    size = len(model.vocab)
+    arrays = [np.ascontiguousarray(model.counts, dtype='<i8')]
+    if tables:
+        sampler = compile_model(model)
+        sampler.refresh()
+        arrays += [sampler.has_next.astype(np.bool_),
+                   sampler.prob.astype('<f8'),
+                   sampler.alias.astype('<i8')]
+    flags = _HAS_TABLES if tables else 0
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_MODEL_HEADER.pack(_MODEL_MAGIC, _MODEL_VERSION, size, len(vocab), flags))
+        f.write(vocab)
+        for array in arrays:
+            f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
+            array.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def load_model(path: str, mmap: bool = True) -> BigramModel:
+    """
+    Load a model written by save_model.
+    
+    With mmap=True the count matrix and sampling tables are memory-mapped
+    copy-on-write instead of read, so loading is instant and every process
+    that loads the same file shares one page-cached copy. The model can
+    still be updated; changed pages become private to the process and the
+    file is never modified.
+    
+    Parameters:
+    path: str - path to the model file
+    mmap: bool - map the arrays instead of reading them (default: True)
+    
+    Returns:
+    BigramModel - the loaded model
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_MODEL_HEADER.size)
+        if len(header) < _MODEL_HEADER.size or not header.startswith(_MODEL_MAGIC):
+            raise ValueError(f"{path} is not a melody model file")
+        _, version, size, vocab_length, flags = _MODEL_HEADER.unpack(header)
+        if version != _MODEL_VERSION:
+            raise ValueError(f"{path} has unsupported model format version {version}")
+        vocab = f.read(vocab_length).decode('utf-8').split('\n')
+    
+    offset = _MODEL_HEADER.size + vocab_length
+    
+    def next_array(dtype: str, shape: tuple) -> np.ndarray:
+        nonlocal offset
+        offset = _aligned(offset)
+        if mmap:
+            array = np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape)
+        else:
+            array = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=offset)
+            array = array.reshape(shape)
+        offset += array.nbytes
+        return array
+    
+    model = BigramModel.__new__(BigramModel)
+    model.vocab = vocab
+    model.index = {note: i for i, note in enumerate(vocab)}
+    model._counts = next_array('<i8', (size, size))
+    model._sampler = None
+    model._constrained = OrderedDict()
+    model._smoothed = {}
+    model._hash = None
+    if flags & _HAS_TABLES:
+        tables = (next_array('?', (size,)),
+                  next_array('<f8', (size, size)),
+                  next_array('<i8', (size, size)))
+        model._sampler = CompiledSampler(model, tables)
     return model
 
 
-def generate_melody(model: dict, max_length: int = 20) -> list[str]:
+def generate_melody(model: Mapping, max_length: int = 20, rng=random,
+                    constraints: Optional[Constraints] = None) -> list[str]:
     """
     Generate a new melody using the trained Bigram model.
     
+    A BigramModel is sampled through its compiled alias tables (see
+    compile_model), so each note costs one table lookup, with or without
+    constraints. A plain nested dict of counts is still accepted and
+    sampled directly, without constraints.
+    
     Parameters:
-    model: dict - trained Bigram model
+    model: Mapping - trained Bigram model (a BigramModel or a nested dict of counts)
     max_length: int - maximum length of generated melody (default: 20)
+    rng: random.Random - source of randomness (default: the random module)
+    constraints: Constraints - rules the melody must follow (default: none)
     
     Returns:
     list[str] - generated melody as a list of notes
     """
+    if isinstance(model, BigramModel):
+        return compile_model(model, constraints).sample(max_length, rng)
+    if constraints is not None:
+        raise TypeError("Constraints need a BigramModel")
+    
     if '^' not in model:
         return []
     
@@ -124,7 +1327,7 @@ def generate_melody(model: dict, max_length: int = 20) -> list[str]:
         weights = list(transitions.values())
         
         # Weighted random selection based on transition frequencies
-        next_note = random.choices(next_notes, weights=weights, k=1)[0]
+        next_note = rng.choices(next_notes, weights=weights, k=1)[0]
         
         if next_note == '$':
             break
@@ -134,3 +1337,131 @@ def generate_melody(model: dict, max_length: int = 20) -> list[str]:
     
     return melody
 
+
+def generate_melodies(model: BigramModel, n: int, max_length: int = 20,
+                      seed: Optional[int] = None,
+                      constraints: Optional[Constraints] = None) -> list[list[str]]:
+    """
+    Generate n independent melodies at once.
+    
+    All n chains are advanced together: each step draws the next note for
+    every chain that is still running with one vectorized lookup into the
+    compiled alias tables, and chains drop out as they reach $ or a note
+    with no outgoing transitions. A batch therefore costs a small multiple
+    of generating one melody rather than n separate Python loops.
+    
+    Parameters:
+    model: BigramModel - trained Bigram model
+    n: int - number of melodies to generate
+    max_length: int - maximum length of each generated melody (default: 20)
+    seed: int - seed for NumPy's random generator; None for fresh entropy
+    constraints: Constraints - rules the melodies must follow (default: none)
+    
+    Returns:
+    list[list[str]] - n generated melodies, each a list of notes
+    """
+    if n < 0:
+        raise ValueError("n must not be negative")
+    sampler = compile_model(model, constraints)
+    return _sample_chains(sampler, np.full(n, max(max_length, 0), dtype=np.int64),
+                          np.zeros(n, dtype=np.int64), [np.random.default_rng(seed)])
+
+
+def generate_melody_batches(model: BigramModel, jobs: list[tuple[int, int, np.random.Generator]],
+                            constraints: Optional[Constraints] = None) -> list[list[list[str]]]:
+    """
+    Generate melodies for several independent requests in one vectorized pass.
+    
+    Every job is (n, max_length, rng). The chains of all jobs advance
+    together as in generate_melodies, but each job draws only from its own
+    generator, so a job's melodies do not depend on the other jobs in the
+    batch: (n, max_length, np.random.default_rng(seed)) gives exactly
+    generate_melodies(model, n, max_length, seed, constraints).
+    
+    Parameters:
+    model: BigramModel - trained Bigram model
+    jobs: list[tuple[int, int, np.random.Generator]] - (n, max_length, rng) per request
+    constraints: Constraints - rules the melodies must follow (default: none)
+    
+    Returns:
+    list[list[list[str]]] - the melodies of each job, in job order
+    """
+    counts = [n for n, _, _ in jobs]
+    if any(n < 0 for n in counts):
+        raise ValueError("n must not be negative")
+    sampler = compile_model(model, constraints)
+    max_lengths = np.repeat([max(max_length, 0) for _, max_length, _ in jobs], counts)
+    owners = np.repeat(np.arange(len(jobs)), counts)
+    melodies = _sample_chains(sampler, max_lengths.astype(np.int64), owners,
+                              [rng for _, _, rng in jobs])
+    ends = np.cumsum(counts).tolist()
+    return [melodies[end - n:end] for end, n in zip(ends, counts)]
+
+
+def _sample_chains(sampler: CompiledSampler, max_lengths: np.ndarray, owners: np.ndarray,
+                   rngs: list[np.random.Generator]) -> list[list[str]]:
+    """
+    Advance one chain per entry of max_lengths in lockstep.
+    
+    Chain i draws its uniforms from rngs[owners[i]]; owners must be sorted,
+    so the running chains of each generator stay contiguous.
+    """
+    sampler.refresh()
+    repeat = sampler.repeat_sampler
+    n = len(max_lengths)
+    size = len(sampler.vocab)
+    notes = np.zeros((n, int(max_lengths.max()) if n else 0), dtype=np.int32)
+    lengths = np.zeros(n, dtype=np.int64)
+    finished = np.zeros(n, dtype=bool)
+    
+    # Indices of the chains still running, the state each one is in,
+    # and how many times in a row it has played that state's note
+    chains = np.arange(n)
+    states = np.full(n, BigramModel.START_ID, dtype=np.int64)
+    runs = np.zeros(n, dtype=np.int64)
+    # The loop already stops at the longest max_length
+    ragged = n > 0 and max_lengths.min() < notes.shape[1]
+    for step in range(notes.shape[1]):
+        if repeat is None:
+            running = sampler.has_next[states]
+        else:
+            capped = runs >= sampler.max_repeats
+            running = np.where(capped, repeat.has_next[states], sampler.has_next[states])
+        if ragged:
+            running &= max_lengths[chains] > step
+        if repeat is not None:
+            capped = capped[running]
+        chains, states, runs = chains[running], states[running], runs[running]
+        if chains.size == 0:
+            break
+        if len(rngs) == 1:
+            u = rngs[0].random(chains.size)
+        else:
+            draws = np.bincount(owners[chains], minlength=len(rngs)).tolist()
+            u = np.concatenate([rng.random(count) for rng, count in zip(rngs, draws)])
+        u *= size
+        columns = u.astype(np.int64)
+        if repeat is None:
+            prob = sampler.prob[states, columns]
+            alias = sampler.alias[states, columns]
+        else:
+            prob = np.where(capped, repeat.prob[states, columns], sampler.prob[states, columns])
+            alias = np.where(capped, repeat.alias[states, columns], sampler.alias[states, columns])
+        next_states = np.where((u - columns) < prob, columns, alias)
+        runs = np.where(next_states == states, runs + 1, 1)
+        running = next_states != BigramModel.END_ID
+        finished[chains[~running]] = True
+        chains, states, runs = chains[running], next_states[running], runs[running]
+        notes[chains, step] = states
+        lengths[chains] = step + 1
+    
+    if sampler.end_id is not None:
+        for chain in np.flatnonzero(~finished):
+            ids = _cut_to_end(notes[chain, :lengths[chain]].tolist(), sampler.end_id)
+            lengths[chain] = len(ids)
+    
+    # Gather only the generated notes (row by row), then cut them into melodies
+    flat = notes[np.arange(notes.shape[1]) < lengths[:, None]].tolist()
+    flat = list(map(sampler.vocab.__getitem__, flat))
+    ends = np.cumsum(lengths).tolist()
+    return [flat[end - length:end] for end, length in zip(ends, lengths.tolist())]
@@ -0,0 +1,282 @@
+"""
+Order-N Markov melody model with backoff.
+
+The bigram model in models.py keeps one row of counts per note. Longer
+contexts make a dense table impossible (V ** (N - 1) rows), so this model
+stores only the contexts that actually occur. Each context of k notes is
+packed into one 64-bit key (16 bits per note ID, most recent note lowest)
+and every context length k has its own table in CSR layout:
+
+    keys[r]                       sorted context keys
+    next_ids[offsets[r]:offsets[r + 1]]    the notes seen after context r
+    cumulative[...]               running total of their counts
+
+Looking up a context is a binary search over keys, and sampling the next
+note is a binary search over the context's cumulative counts.
+"""
+import random
+from itertools import chain, islice
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Note IDs are packed 16 bits at a time into uint64 context keys
+_ID_BITS = 16
+MAX_VOCAB = 1 << _ID_BITS
+MAX_ORDER = 64 // _ID_BITS + 1
+START_ID = 0
+END_ID = 1
+
+
+class NGramModel:
+    """
+    Counts of the notes that follow every context of up to order - 1 notes.
+
+    tables[k] holds the contexts of length k (tables[0] is the single empty
+    context, i.e. plain note frequencies) as a tuple
+    (keys, offsets, next_ids, cumulative) of NumPy arrays.
+    """
+
+    def __init__(self, order: int):
+        if not 1 <= order <= MAX_ORDER:
+            raise ValueError(f"order must be between 1 and {MAX_ORDER}")
+        self.order = order
+        self.vocab: list[str] = ['^', '$']
+        self.index: dict[str, int] = {'^': 0, '$': 1}
+        self.tables = [_empty_table() for _ in range(order)]
+        # Reduced (keys, next_ids, counts) batches not yet folded into tables
+        self._pending = [[] for _ in range(order)]
+        # (context length, key) -> successor span (or None) for contexts looked up so far
+        self._spans = {}
+
+    def intern_many(self, notes: list[str]) -> np.ndarray:
+        """
+        Return the IDs of many notes at once, adding new notes to the vocabulary.
+
+        Parameters:
+        notes: list[str] - the notes to look up
+
+        Returns:
+        np.ndarray - uint64 array of IDs, one per note
+        """
+        index = self.index
+        # Distinct notes in order of first appearance, so IDs do not depend on string hashing
+        for note in dict.fromkeys(notes):
+            if note in index:
+                continue
+            if len(self.vocab) == MAX_VOCAB:
+                raise ValueError(f"NGramModel supports at most {MAX_VOCAB} distinct notes")
+            index[note] = len(self.vocab)
+            self.vocab.append(note)
+        return np.fromiter(map(index.__getitem__, notes), dtype=np.uint64, count=len(notes))
+
+    def add_sequences(self, sequences: list[list[str]]) -> None:
+        """
+        Count every (context, next note) pair in a batch of sequences.
+
+        Parameters:
+        sequences: list[list[str]] - preprocessed melodies with ^ and $ tokens
+        """
+        # Give every sequence order - 1 start tokens so the first notes have full contexts
+        padding = ['^'] * (self.order - 1)
+        padded = [padding + sequence[1:] for sequence in sequences if sequence]
+        if not padded:
+            return
+        ids = self.intern_many(list(chain.from_iterable(padded)))
+        lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+        starts = np.cumsum(lengths) - lengths
+        position = np.arange(len(ids)) - np.repeat(starts, lengths)
+        targets = np.flatnonzero(position >= self.order - 1)
+        next_ids = ids[targets]
+
+        keys = np.zeros(len(targets), dtype=np.uint64)
+        for k in range(self.order):
+            if k > 0:
+                keys |= ids[targets - k] << np.uint64(_ID_BITS * (k - 1))
+            self._pending[k].append(_reduce(keys, next_ids, np.ones(len(targets), dtype=np.int64)))
+            self._compact(k, force=False)
+
+    def _compact(self, k: int, force: bool = True) -> None:
+        """Fold pending batches for context length k into its table."""
+        pending = self._pending[k]
+        if not pending:
+            return
+        table_size = len(self.tables[k][2])
+        if not force and sum(len(batch[0]) for batch in pending) < table_size:
+            return
+        keys, offsets, next_ids, cumulative = self.tables[k]
+        counts = np.diff(cumulative, prepend=0)
+        row_keys = np.repeat(keys, np.diff(offsets))
+        batches = [(row_keys, next_ids, counts)] + pending
+        merged = _reduce(*(np.concatenate(column) for column in zip(*batches)))
+        self.tables[k] = _to_table(*merged)
+        self._pending[k] = []
+        self._spans.clear()
+
+    def finalize(self) -> 'NGramModel':
+        """Fold every pending batch into the lookup tables and return the model."""
+        for k in range(self.order):
+            self._compact(k)
+        return self
+
+    def context_key(self, context: list[int]) -> int:
+        """
+        Pack a context of note IDs (oldest first) into its table key.
+
+        Parameters:
+        context: list[int] - note IDs, oldest first
+
+        Returns:
+        int - the packed key
+        """
+        key = 0
+        for note_id in context:
+            key = (key << _ID_BITS) | note_id
+        return key
+
+    def find(self, context: list[int]) -> Optional[tuple[int, int]]:
+        """
+        Locate a context's successors in its table.
+
+        Parameters:
+        context: list[int] - note IDs, oldest first, at most order - 1 of them
+
+        Returns:
+        tuple[int, int] - (start, end) of the successors, or None if never seen
+        """
+        key = self.context_key(context)
+        cached = self._spans.get((len(context), key), False)
+        if cached is not False:
+            return cached
+        keys, offsets, _, _ = self.tables[len(context)]
+        row = int(np.searchsorted(keys, np.uint64(key)))
+        if row == len(keys) or keys[row] != key:
+            span = None
+        else:
+            span = int(offsets[row]), int(offsets[row + 1])
+        self._spans[len(context), key] = span
+        return span
+
+    def successors(self, context: list[str]) -> dict:
+        """
+        Return the counts of the notes seen after a context of notes.
+
+        Parameters:
+        context: list[str] - notes, oldest first, at most order - 1 of them
+
+        Returns:
+        dict - next note -> count; empty if the context was never seen
+        """
+        if any(note not in self.index for note in context):
+            return {}
+        span = self.find([self.index[note] for note in context])
+        if span is None:
+            return {}
+        _, _, next_ids, cumulative = self.tables[len(context)]
+        start, end = span
+        base = cumulative[start - 1] if start else 0
+        counts = np.diff(cumulative[start:end], prepend=base)
+        return {self.vocab[int(i)]: int(c) for i, c in zip(next_ids[start:end], counts)}
+
+    def __repr__(self) -> str:
+        contexts = sum(len(table[0]) for table in self.tables)
+        return f"NGramModel(order={self.order}, {len(self.vocab)} notes, {contexts} contexts)"
+
+
+def _empty_table() -> tuple:
+    return (np.zeros(0, dtype=np.uint64), np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=np.uint16), np.zeros(0, dtype=np.int64))
+
+
+def _reduce(keys: np.ndarray, next_ids: np.ndarray, counts: np.ndarray) -> tuple:
+    """
+    Sum the counts of repeated (key, next_id) pairs.
+
+    Returns:
+    tuple - (keys, next_ids, counts) sorted by key, then next_id
+    """
+    next_ids = next_ids.astype(np.uint64)
+    if len(keys) and int(keys.max()) < 1 << (64 - _ID_BITS):
+        # Short contexts leave room to sort (key, next_id) as one integer
+        order = np.argsort((keys << np.uint64(_ID_BITS)) | next_ids)
+    else:
+        order = np.lexsort((next_ids, keys))
+    keys, next_ids, counts = keys[order], next_ids[order], counts[order]
+    if len(keys) == 0:
+        return keys, next_ids.astype(np.uint16), counts
+    new_pair = np.ones(len(keys), dtype=bool)
+    new_pair[1:] = (keys[1:] != keys[:-1]) | (next_ids[1:] != next_ids[:-1])
+    starts = np.flatnonzero(new_pair)
+    return keys[starts], next_ids[starts].astype(np.uint16), np.add.reduceat(counts, starts)
+
+
+def _to_table(keys: np.ndarray, next_ids: np.ndarray, counts: np.ndarray) -> tuple:
+    """Turn reduced (key, next_id, count) rows into a CSR lookup table."""
+    new_key = np.ones(len(keys), dtype=bool)
+    new_key[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new_key)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+    return keys[starts], offsets, next_ids, np.cumsum(counts)
+
+
+def build_ngram_model(melodies: Iterable[list[str]], order: int = 3,
+                      chunk_size: int = 65536) -> NGramModel:
+    """
+    Build an order-N Markov model from melodies.
+
+    With order=2 this learns the same transitions as build_bigram_model.
+
+    Parameters:
+    melodies: Iterable[list[str]] - preprocessed melodies with ^ and $ tokens
+    order: int - number of notes in each n-gram, context included (default: 3)
+    chunk_size: int - number of melodies counted per batch (default: 65536)
+
+    Returns:
+    NGramModel - the trained model
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    model = NGramModel(order)
+    melodies = iter(melodies)
+    while True:
+        chunk = list(islice(melodies, chunk_size))
+        if not chunk:
+            return model.finalize()
+        model.add_sequences(chunk)
+
+
+def generate_ngram_melody(model: NGramModel, max_length: int = 20, rng=random) -> list[str]:
+    """
+    Generate a new melody, backing off to shorter contexts when needed.
+
+    Each note is drawn from the notes that followed the longest context
+    (up to order - 1 previous notes) that occurs in the training data.
+
+    Parameters:
+    model: NGramModel - trained model
+    max_length: int - maximum length of generated melody (default: 20)
+    rng: random.Random - source of randomness (default: the random module)
+
+    Returns:
+    list[str] - generated melody as a list of notes
+    """
+    history = [START_ID] * (model.order - 1)
+    melody = []
+    for _ in range(max_length):
+        for k in range(model.order - 1, -1, -1):
+            span = model.find(history[len(history) - k:] if k else [])
+            if span is not None:
+                break
+        else:
+            break
+        start, end = span
+        _, _, next_ids, cumulative = model.tables[k]
+        base = int(cumulative[start - 1]) if start else 0
+        target = base + int(rng.random() * (int(cumulative[end - 1]) - base))
+        choice = start + int(np.searchsorted(cumulative[start:end], np.int64(target), side='right'))
+        note_id = int(next_ids[choice])
+        if note_id == END_ID:
+            break
+        melody.append(model.vocab[note_id])
+        history = history[1:] + [note_id] if history else history
+    return melody
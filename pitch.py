@@ -0,0 +1,110 @@
+"""
+Helpers for reading note names such as 'C4', 'F#3' or 'Bb'.
+
+A note name is a letter A-G, any number of sharps (#) or flats (b), and an
+optional octave number. Notes without an octave still have a pitch class
+but no MIDI number.
+"""
+import re
+from typing import Optional
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+SCALES = {
+    'major': (0, 2, 4, 5, 7, 9, 11),
+    'minor': (0, 2, 3, 5, 7, 8, 10),
+    'harmonic minor': (0, 2, 3, 5, 7, 8, 11),
+    'major pentatonic': (0, 2, 4, 7, 9),
+    'minor pentatonic': (0, 3, 5, 7, 10),
+    'chromatic': tuple(range(12)),
+}
+
+_LETTERS = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+_NOTE_PATTERN = re.compile(r'([A-Ga-g])([#b]*)(-?\d+)?')
+
+
+def parse_note(note: str) -> Optional[tuple[int, Optional[int]]]:
+    """
+    Split a note name into its pitch class and octave.
+
+    Parameters:
+    note: str - a note name such as 'C4', 'F#3' or 'Bb'
+
+    Returns:
+    tuple[int, Optional[int]] - (pitch class 0-11, octave or None),
+    or None if the note is not a note name
+    """
+    match = _NOTE_PATTERN.fullmatch(note)
+    if match is None:
+        return None
+    letter, accidentals, octave = match.groups()
+    semitones = _LETTERS[letter.upper()] + accidentals.count('#') - accidentals.count('b')
+    octave = int(octave) if octave is not None else None
+    if octave is None:
+        return semitones % 12, None
+    # Accidentals can cross an octave boundary (B#3 is C4, Cb4 is B3)
+    return semitones % 12, octave + semitones // 12
+
+
+def note_to_midi(note: str) -> Optional[int]:
+    """
+    Return the MIDI number of a note with an octave (C4 is 60).
+
+    Parameters:
+    note: str - a note name such as 'C4'
+
+    Returns:
+    Optional[int] - the MIDI number, or None if the note has no octave
+    """
+    parsed = parse_note(note)
+    if parsed is None or parsed[1] is None:
+        return None
+    pitch_class, octave = parsed
+    return 12 * (octave + 1) + pitch_class
+
+
+def midi_to_note(midi: int) -> str:
+    """
+    Return the name of a MIDI note number, spelled with sharps.
+
+    Parameters:
+    midi: int - the MIDI number (60 is C4)
+
+    Returns:
+    str - the note name
+    """
+    return f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}"
+
+
+def parse_key(key: str) -> tuple[int, str]:
+    """
+    Split a key such as 'C major' or 'F# minor' into its tonic and scale.
+
+    A key given without a scale ('G') is major.
+
+    Parameters:
+    key: str - tonic note name, optionally followed by a scale name from SCALES
+
+    Returns:
+    tuple[int, str] - (pitch class 0-11 of the tonic, scale name in SCALES)
+    """
+    tonic, _, scale = key.strip().partition(' ')
+    parsed = parse_note(tonic)
+    scale = scale.strip().lower() or 'major'
+    if parsed is None or parsed[1] is not None or scale not in SCALES:
+        raise ValueError(f"Unknown key: {key!r}")
+    return parsed[0], scale
+
+
+def scale_pitch_classes(key: str) -> frozenset:
+    """
+    Return the pitch classes of a key such as 'C major' or 'F# minor'.
+
+    Parameters:
+    key: str - a key as read by parse_key
+
+    Returns:
+    frozenset - pitch classes 0-11 in the key
+    """
+    tonic, scale = parse_key(key)
+    return frozenset((tonic + step) % 12 for step in SCALES[scale])
@@ -0,0 +1,295 @@
+"""
+Asyncio melody generation server.
+
+The server loads a model once and answers requests over a Unix socket or a
+TCP port with newline-delimited JSON. Each request line looks like
+
+    {"id": 7, "n": 3, "max_length": 16, "seed": 42, "constraints": {"key": "C major"}}
+
+(every field is optional) and the server streams back one line per melody,
+
+    {"id": 7, "melody": ["C4", "E4", "G4"]}
+
+followed by {"id": 7, "done": true}, or a single {"id": 7, "error": "..."}.
+
+Requests that arrive close together are coalesced into micro-batches and
+generated with one call to generate_melody_batches in a worker thread, so
+the event loop keeps serving connections while a batch is sampled. Every
+request draws from its own generator seeded with its seed, so a seeded
+request of at most max_batch melodies returns the same melodies as
+generate_melodies(model, n, max_length, seed) however it was batched.
+"""
+import argparse
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+import numpy as np
+
+from cache import GenerationCache
+from constraints import Constraints
+from models import BigramModel, generate_melody_batches, load_model
+
+
+class _Job:
+    """One part of a request, waiting in the queue for a batch."""
+
+    def __init__(self, n: int, max_length: int, rng: np.random.Generator,
+                 constraints: Optional[Constraints], future: asyncio.Future):
+        self.n = n
+        self.max_length = max_length
+        self.rng = rng
+        self.constraints = constraints
+        self.future = future
+
+
+class MelodyServer:
+    """Serve melodies from one model, batching concurrent requests."""
+
+    def __init__(self, model: BigramModel, max_batch: int = 1024, max_delay: float = 0.002,
+                 max_pending: int = 256, cache: Optional[GenerationCache] = None,
+                 max_length_limit: int = 1024, max_in_flight: int = 16):
+        """
+        Parameters:
+        model: BigramModel - the model to generate from
+        max_batch: int - most melodies generated in one batch; larger
+            requests are streamed back in parts of this size (default: 1024)
+        max_delay: float - seconds to wait for more requests before
+            generating a batch (default: 0.002)
+        max_pending: int - most request parts queued at once; further
+            requests wait for room, which slows down their clients (default: 256)
+        cache: GenerationCache - answer repeated seeded requests from this
+            cache (default: no caching)
+        max_length_limit: int - largest max_length a request may ask for; a
+            batch holds max_batch * max_length_limit note IDs at most
+            (default: 1024)
+        max_in_flight: int - most requests of one connection handled at
+            once; the connection is not read further until one finishes
+            (default: 16)
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        if max_length_limit < 0:
+            raise ValueError("max_length_limit must not be negative")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.cache = cache
+        self.max_length_limit = max_length_limit
+        self.max_in_flight = max_in_flight
+        self.batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start the batching task; called by serve_unix and serve_tcp."""
+        if self._batcher is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._batcher = asyncio.create_task(self._run_batches())
+
+    async def close(self) -> None:
+        """Stop the batching task."""
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+
+    async def generate(self, n: int = 1, max_length: int = 20, seed: Optional[int] = None,
+                       constraints: Optional[Constraints] = None) -> AsyncIterator[list[str]]:
+        """
+        Generate melodies, yielding them as their batches finish.
+
+        Parameters:
+        n: int - number of melodies (default: 1)
+        max_length: int - maximum length of each melody (default: 20)
+        seed: int - seed for this request's generator; None for fresh entropy
+        constraints: Constraints - rules the melodies must follow (default: none)
+
+        Returns:
+        AsyncIterator[list[str]] - the generated melodies
+        """
+        if n < 0:
+            raise ValueError("n must not be negative")
+        # Requests in a batch are sampled to the batch's longest max_length
+        if max_length > self.max_length_limit:
+            raise ValueError(f"max_length must be at most {self.max_length_limit}")
+        # Seeded requests that fit in one batch match generate_melodies, so they can be cached
+        key = None
+        if self.cache is not None and seed is not None and n <= self.max_batch:
+            key = self.cache.key(self.model, n, max_length, seed, constraints)
+            cached = self.cache.get(key)
+            if cached is not None:
+                for melody in cached:
+                    yield melody
+                return
+        await self.start()
+        loop = asyncio.get_running_loop()
+        rng = np.random.default_rng(seed)
+        for start in range(0, n, self.max_batch):
+            job = _Job(min(self.max_batch, n - start), max_length, rng, constraints,
+                       loop.create_future())
+            # Waits while the queue is full, so clients cannot outrun the sampler
+            await self._queue.put(job)
+            melodies = await job.future
+            if key is not None:
+                self.cache.put(key, melodies)
+            for melody in melodies:
+                yield melody
+
+    async def _run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = batch[0].n
+            deadline = loop.time() + self.max_delay
+            while size < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        job = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(job)
+                size += job.n
+            results = await loop.run_in_executor(None, self._generate_batch, batch)
+            self.batches += 1
+            for job, result in zip(batch, results):
+                if job.future.done():
+                    continue
+                if isinstance(result, Exception):
+                    job.future.set_exception(result)
+                else:
+                    job.future.set_result(result)
+
+    def _generate_batch(self, batch: list[_Job]) -> list:
+        """Generate every job of a batch, one call per set of constraints."""
+        results = [None] * len(batch)
+        groups: dict = {}
+        for i, job in enumerate(batch):
+            groups.setdefault(job.constraints, []).append(i)
+        for constraints, members in groups.items():
+            jobs = [(batch[i].n, batch[i].max_length, batch[i].rng) for i in members]
+            try:
+                melodies = generate_melody_batches(self.model, jobs, constraints)
+            except Exception as error:
+                melodies = [error] * len(members)
+            for i, result in zip(members, melodies):
+                results[i] = result
+        return results
+
+    async def _handle_request(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+            request_id = request.get('id')
+            constraints = request.get('constraints')
+            melodies = self.generate(
+                n=int(request.get('n', 1)),
+                max_length=int(request.get('max_length', 20)),
+                seed=request.get('seed'),
+                constraints=Constraints(**constraints) if constraints else None,
+            )
+            async for melody in melodies:
+                writer.write(_encode({'id': request_id, 'melody': melody}))
+                await writer.drain()
+            writer.write(_encode({'id': request_id, 'done': True}))
+        except Exception as error:
+            # Any failure, e.g. a MemoryError from the batch, still ends the request
+            message = str(error) if isinstance(error, (ValueError, TypeError)) else repr(error)
+            writer.write(_encode({'id': request_id, 'error': message}))
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        tasks = set()
+        # Stop reading while max_in_flight requests are running, so a client
+        # that pipelines requests is slowed down by the socket
+        slots = asyncio.Semaphore(self.max_in_flight)
+
+        def finished(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            slots.release()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    await slots.acquire()
+                    task = asyncio.create_task(self._handle_request(line, writer))
+                    tasks.add(task)
+                    task.add_done_callback(finished)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        """
+        Listen for requests on a Unix socket.
+
+        Parameters:
+        path: str - path of the socket file
+
+        Returns:
+        asyncio.AbstractServer - the running server
+        """
+        await self.start()
+        return await asyncio.start_unix_server(self._handle_connection, path)
+
+    async def serve_tcp(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        """
+        Listen for requests on a TCP port.
+
+        Parameters:
+        host: str - address to bind (default: localhost only)
+        port: int - port to bind; 0 picks a free port (default: 0)
+
+        Returns:
+        asyncio.AbstractServer - the running server
+        """
+        await self.start()
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message).encode('utf-8') + b'\n'
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = MelodyServer(load_model(args.model), max_batch=args.max_batch)
+    if args.socket:
+        listener = await server.serve_unix(args.socket)
+    else:
+        listener = await server.serve_tcp(args.host, args.port)
+    print(f"Serving {args.model} on {args.socket or listener.sockets[0].getsockname()}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main() -> None:
+    """Run the server from the command line."""
+    parser = argparse.ArgumentParser(description="Serve melodies from a saved model.")
+    parser.add_argument('model', help="model file written by save_model")
+    parser.add_argument('--socket', help="Unix socket path (default: use TCP)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=1024)
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Near-duplicate detection for melody corpora.
+
+Every melody is reduced to its set of shingles (runs of shingle_size
+consecutive notes) and summarised by a MinHash signature: for each of
+num_perm hash functions, the smallest hash of any of its shingles. The
+fraction of equal signature entries of two melodies estimates the Jaccard
+similarity of their shingle sets.
+
+Signatures are split into bands, and melodies whose signatures agree on
+all rows of at least one band land in the same bucket (locality-sensitive
+hashing). A query only compares the melody with the members of its
+buckets, found by binary search in each band's sorted keys, so finding
+near-duplicates never compares all pairs of melodies. With bands b of r
+rows, melodies of similarity s share a bucket with probability
+1 - (1 - s ** r) ** b; the default 32 bands of 4 rows find nearly all
+pairs above 0.6 and few below 0.3.
+"""
+import hashlib
+from itertools import islice
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+from corpus import PackedCorpus, pack_melodies
+
+_EMPTY = np.iinfo(np.uint32).max
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """Scramble 64-bit integers (the splitmix64 finaliser)."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+class MelodyIndex:
+    """MinHash signatures of melodies, bucketed for fast similarity queries."""
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, shingle_size: int = 3,
+                 seed: int = 0, chunk_size: int = 2048):
+        """
+        Parameters:
+        num_perm: int - hash functions per signature (default: 128)
+        bands: int - LSH bands; must divide num_perm (default: 32)
+        shingle_size: int - notes per shingle; shorter melodies form one
+            shingle of all their notes (default: 3)
+        seed: int - seed of the hash functions; only indexes with the same
+            seed and sizes give comparable signatures (default: 0)
+        chunk_size: int - melodies hashed per batch; memory use grows with
+            chunk_size * num_perm (default: 2048)
+        """
+        if num_perm < 1 or bands < 1 or num_perm % bands:
+            raise ValueError("bands must be a positive divisor of num_perm")
+        if shingle_size < 1:
+            raise ValueError("shingle_size must be at least 1")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.chunk_size = chunk_size
+        rng = np.random.default_rng(seed)
+        self._multipliers = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._increments = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64)
+        self._note_keys: dict[str, int] = {}
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._band_keys = np.zeros((0, bands), dtype=np.uint64)
+        self._pending: list[tuple[np.ndarray, np.ndarray]] = []
+        self._sorted: Optional[tuple[np.ndarray, np.ndarray]] = None
+
+    def _keys_of(self, vocab: list[str]) -> np.ndarray:
+        """Return a stable 64-bit key for every note, independent of vocab order."""
+        keys = self._note_keys
+        for note in vocab:
+            if note not in keys:
+                digest = hashlib.blake2b(note.encode('utf-8'), digest_size=8).digest()
+                keys[note] = int.from_bytes(digest, 'little')
+        return np.fromiter((keys[note] for note in vocab), dtype=np.uint64, count=len(vocab))
+
+    def _packed_signatures(self, vocab: list[str], tokens: np.ndarray,
+                           offsets: np.ndarray) -> np.ndarray:
+        """Return the signatures of the melodies tokens[offsets[i]:offsets[i + 1]]."""
+        note_keys = self._keys_of(vocab)[tokens]
+        lengths = np.diff(offsets)
+        counts = np.where(lengths > 0, np.maximum(lengths - self.shingle_size + 1, 1), 0)
+        owners = np.repeat(np.arange(len(lengths)), counts)
+        shingle_offsets = np.cumsum(counts) - counts
+        starts = offsets[:-1][owners] + np.arange(counts.sum()) - shingle_offsets[owners]
+        widths = np.minimum(lengths[owners], self.shingle_size)
+        # Hash each shingle's notes in order, so the same notes reordered differ
+        shingles = np.zeros(len(starts), dtype=np.uint64)
+        for k in range(self.shingle_size if len(starts) else 0):
+            positions = np.minimum(starts + k, len(note_keys) - 1)
+            shingles = np.where(k < widths, _mix(shingles ^ note_keys[positions]), shingles)
+        signatures = np.full((len(lengths), self.num_perm), _EMPTY, dtype=np.uint32)
+        filled = counts > 0
+        if filled.any():
+            # Multiply-shift hashing of the already scrambled shingles: the
+            # upper bits of a * x + b for random odd a
+            hashes = self._multipliers[:, None] * shingles + self._increments[:, None]
+            minima = np.minimum.reduceat(hashes, shingle_offsets[filled], axis=1)
+            signatures[filled] = (minima >> np.uint64(32)).astype(np.uint32).T
+        return signatures
+
+    def signatures(self, melodies: Union[PackedCorpus, Iterable[list[str]]]) -> np.ndarray:
+        """
+        Compute MinHash signatures without adding the melodies to the index.
+
+        Parameters:
+        melodies: PackedCorpus or Iterable[list[str]] - melodies as lists of notes
+
+        Returns:
+        np.ndarray - uint32 array of shape (melodies, num_perm)
+        """
+        if isinstance(melodies, PackedCorpus):
+            chunks = []
+            for first in range(0, len(melodies), self.chunk_size):
+                offsets = melodies.offsets[first:first + self.chunk_size + 1]
+                tokens = melodies.tokens[offsets[0]:offsets[-1]]
+                chunks.append(self._packed_signatures(melodies.vocab, tokens,
+                                                      offsets - offsets[0]))
+        else:
+            melodies = iter(melodies)
+            chunks = []
+            while chunk := list(islice(melodies, self.chunk_size)):
+                packed = pack_melodies(chunk, self.chunk_size)
+                chunks.append(self._packed_signatures(packed.vocab, packed.tokens, packed.offsets))
+        return np.concatenate([np.zeros((0, self.num_perm), dtype=np.uint32), *chunks])
+
+    def _band_keys_of(self, signatures: np.ndarray) -> np.ndarray:
+        rows = signatures.reshape(len(signatures), self.bands, -1).astype(np.uint64)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for r in range(rows.shape[2]):
+            keys = _mix(keys ^ rows[:, :, r])
+        return keys
+
+    def add(self, melodies: Union[PackedCorpus, Iterable[list[str]]]) -> np.ndarray:
+        """
+        Add melodies to the index.
+
+        Parameters:
+        melodies: PackedCorpus or Iterable[list[str]] - melodies as lists of notes
+
+        Returns:
+        np.ndarray - the IDs given to the melodies, counting up from len(index)
+        """
+        signatures = self.signatures(melodies)
+        start = len(self)
+        self._pending.append((signatures, self._band_keys_of(signatures)))
+        self._sorted = None
+        return np.arange(start, start + len(signatures))
+
+    def _flush(self) -> None:
+        """Merge pending additions and sort each band's keys for binary search."""
+        if self._pending:
+            self._signatures = np.concatenate([self._signatures]
+                                              + [sig for sig, _ in self._pending])
+            self._band_keys = np.concatenate([self._band_keys]
+                                             + [keys for _, keys in self._pending])
+            self._pending = []
+        if self._sorted is None:
+            order = np.argsort(self._band_keys, axis=0, kind='stable').T
+            keys = np.take_along_axis(self._band_keys.T, order, axis=1)
+            self._sorted = (keys, order)
+
+    def query(self, melody: list[str], threshold: float = 0.5,
+              limit: Optional[int] = None) -> list[tuple[int, float]]:
+        """
+        Find indexed melodies similar to a melody.
+
+        Parameters:
+        melody: list[str] - the melody to look up
+        threshold: float - smallest estimated Jaccard similarity reported (default: 0.5)
+        limit: int - most results returned (default: all)
+
+        Returns:
+        list[tuple[int, float]] - (melody ID, estimated similarity) pairs,
+        most similar first
+        """
+        self._flush()
+        signature = self.signatures([melody])
+        band_keys = self._band_keys_of(signature)[0]
+        keys, order = self._sorted
+        found = []
+        for band in range(self.bands):
+            lo = np.searchsorted(keys[band], band_keys[band], side='left')
+            hi = np.searchsorted(keys[band], band_keys[band], side='right')
+            found.append(order[band, lo:hi])
+        candidates = np.unique(np.concatenate(found))
+        similarities = (self._signatures[candidates] == signature).mean(axis=1)
+        keep = similarities >= threshold
+        candidates, similarities = candidates[keep], similarities[keep]
+        ranked = np.lexsort((candidates, -similarities))[:limit]
+        return [(int(candidates[i]), float(similarities[i])) for i in ranked]
+
+    def similarity(self, i: int, j: int) -> float:
+        """
+        Return the estimated Jaccard similarity of two indexed melodies.
+
+        Parameters:
+        i: int - ID of the first melody
+        j: int - ID of the second melody
+
+        Returns:
+        float - fraction of equal signature entries, between 0 and 1
+        """
+        self._flush()
+        return float((self._signatures[i] == self._signatures[j]).mean())
+
+    def duplicate_groups(self, threshold: float = 0.5) -> np.ndarray:
+        """
+        Group the indexed melodies into clusters of near-duplicates.
+
+        In every band, each member of a bucket is checked against the
+        bucket's first member, and melodies at least threshold similar are
+        joined. Groups are the connected components of these links, so a
+        chain of near-duplicates forms one group.
+
+        Parameters:
+        threshold: float - smallest estimated similarity that links two
+            melodies (default: 0.5)
+
+        Returns:
+        np.ndarray - for every melody, the smallest ID in its group (its own
+        ID if it has no near-duplicates)
+        """
+        self._flush()
+        keys, order = self._sorted
+        sources, targets = [], []
+        for band in range(self.bands):
+            new_bucket = np.ones(len(self), dtype=bool)
+            new_bucket[1:] = keys[band, 1:] != keys[band, :-1]
+            leaders = order[band][np.maximum.accumulate(np.where(new_bucket,
+                                                                 np.arange(len(self)), 0))]
+            members = order[band][~new_bucket]
+            leaders = leaders[~new_bucket]
+            for first in range(0, len(members), self.chunk_size):
+                a = members[first:first + self.chunk_size]
+                b = leaders[first:first + self.chunk_size]
+                close = (self._signatures[a] == self._signatures[b]).mean(axis=1) >= threshold
+                sources.append(a[close])
+                targets.append(b[close])
+        labels = np.arange(len(self))
+        if sources:
+            a, b = np.concatenate(sources), np.concatenate(targets)
+            while True:
+                updated = labels.copy()
+                np.minimum.at(updated, a, labels[b])
+                np.minimum.at(updated, b, labels[a])
+                updated = updated[updated]
+                if np.array_equal(updated, labels):
+                    break
+                labels = updated
+        return labels
+
+    def __len__(self) -> int:
+        return len(self._signatures) + sum(len(sig) for sig, _ in self._pending)
+
+    def __repr__(self) -> str:
+        return (f"MelodyIndex({len(self)} melodies, {self.num_perm} hashes in "
+                f"{self.bands} bands, shingles of {self.shingle_size})")
+
+
+def deduplicate(melodies: Iterable[list[str]], threshold: float = 0.5,
+                **index_options) -> list[list[str]]:
+    """
+    Drop near-duplicate melodies, keeping the first melody of each group.
+
+    Parameters:
+    melodies: Iterable[list[str]] - melodies as lists of notes
+    threshold: float - smallest estimated similarity counted as a duplicate
+        (default: 0.5)
+    **index_options - passed on to MelodyIndex
+
+    Returns:
+    list[list[str]] - the melodies without near-duplicates, in their original order
+    """
+    melodies = list(melodies)
+    index = MelodyIndex(**index_options)
+    index.add(melodies)
+    labels = index.duplicate_groups(threshold)
+    return [melodies[i] for i in np.flatnonzero(labels == np.arange(len(labels))).tolist()]
@@ -0,0 +1,178 @@
+"""
+Smoothed, normalised transition probabilities of a Bigram model.
+
+A BigramModel stores raw counts. smooth_model turns them into one matrix
+of next-note probabilities per smoothing method, computes it once and
+caches it on the model, so generation, scoring and decoding all read the
+same float arrays instead of renormalising counts on every call:
+
+    'none'        maximum likelihood, count / row total
+    'add-k'       every possible transition gets alpha extra counts
+    'absolute'    discount subtracted from every seen count, and the freed
+                  mass spread over the notes in proportion to how often
+                  they occur
+    'kneser-ney'  as 'absolute', but the freed mass is spread in proportion
+                  to how many different notes each note follows
+
+The lower-order distributions of 'absolute' and 'kneser-ney' get one
+pseudo-count per note, so no transition has probability zero. Rows are
+distributions over the notes a melody can move to: '$' and every note,
+never '^'.
+"""
+from typing import Optional
+
+import numpy as np
+
+from models import BigramModel, CompiledSampler, _sample_chains
+
+METHODS = ('none', 'add-k', 'absolute', 'kneser-ney')
+
+
+class _SmoothedSampler(CompiledSampler):
+    """
+    Alias tables over smoothed probabilities instead of raw counts.
+
+    The sampler keeps the vocabulary the probabilities were computed for,
+    so it is never invalidated by the model and notes added to the model
+    later are not sampled.
+    """
+
+    def __init__(self, model: BigramModel, vocab: list[str], probabilities: np.ndarray):
+        self._model = model
+        self._probabilities = probabilities
+        self.vocab = vocab
+        self._reset()
+
+    def _weights(self, state: int) -> np.ndarray:
+        return self._probabilities[state, :self._size]
+
+
+class SmoothedModel:
+    """
+    Normalised transition probabilities of a BigramModel.
+
+    probabilities[i, j] is P(vocab[j] | vocab[i]) and log_probabilities its
+    natural log, and vocab the notes of the rows and columns. With
+    unknown=True both matrices have one extra row and column, last, for
+    notes the model has never seen. The arrays and vocab are a read-only
+    snapshot of the model; after it changes, call smooth_model again for
+    current ones.
+    """
+
+    def __init__(self, model: BigramModel, method: str = 'add-k', alpha: float = 1.0,
+                 discount: float = 0.75, unknown: bool = False):
+        """
+        Parameters:
+        model: BigramModel - trained Bigram model
+        method: str - one of METHODS (default: 'add-k')
+        alpha: float - pseudo-count of 'add-k' smoothing (default: 1.0)
+        discount: float - count subtracted by 'absolute' and 'kneser-ney',
+            between 0 and 1 (default: 0.75)
+        unknown: bool - add a row and column for unseen notes (default: False)
+        """
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}")
+        if alpha < 0:
+            raise ValueError("alpha must not be negative")
+        if not 0 <= discount <= 1:
+            raise ValueError("discount must be between 0 and 1")
+        self.model = model
+        self.vocab = list(model.vocab)
+        self.method = method
+        self.alpha = alpha
+        self.discount = discount
+        self.unknown = unknown
+        self.probabilities = self._normalise()
+        self.probabilities.flags.writeable = False
+        self._log_probabilities: Optional[np.ndarray] = None
+        self._sampler: Optional[_SmoothedSampler] = None
+
+    def _normalise(self) -> np.ndarray:
+        size = len(self.vocab)
+        slots = size + 1 if self.unknown else size
+        counts = np.zeros((slots, slots))
+        counts[:size, :size] = self.model.counts[:size, :size]
+        allowed = np.ones(slots, dtype=bool)
+        allowed[BigramModel.START_ID] = False
+        totals = counts.sum(axis=1, keepdims=True)
+        if self.method in ('none', 'add-k'):
+            alpha = self.alpha if self.method == 'add-k' else 0.0
+            weights = (counts + alpha) * allowed
+            totals = totals + alpha * allowed.sum()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(totals > 0, weights / totals, 0.0)
+        if self.method == 'absolute':
+            lower = counts.sum(axis=0)
+        else:
+            # Continuation counts: how many different notes each note follows
+            lower = np.count_nonzero(counts, axis=0).astype(np.float64)
+        lower = (lower + 1) * allowed
+        lower /= lower.sum()
+        seen = np.count_nonzero(counts, axis=1)[:, None]
+        empty = totals == 0
+        totals = np.where(empty, 1.0, totals)
+        kept = np.maximum(counts - self.discount, 0) / totals
+        freed = np.where(empty, 1.0, self.discount * seen / totals)
+        return kept + freed * lower
+
+    @property
+    def log_probabilities(self) -> np.ndarray:
+        """Natural log of probabilities; impossible transitions are -inf."""
+        if self._log_probabilities is None:
+            with np.errstate(divide='ignore'):
+                self._log_probabilities = np.log(self.probabilities)
+            self._log_probabilities.flags.writeable = False
+        return self._log_probabilities
+
+    def generate(self, n: int, max_length: int = 20,
+                 seed: Optional[int] = None) -> list[list[str]]:
+        """
+        Generate n melodies from the smoothed probabilities.
+
+        Unlike generate_melodies on the raw counts, smoothed models can make
+        transitions never seen in training. The unknown note is never generated.
+
+        Parameters:
+        n: int - number of melodies to generate
+        max_length: int - maximum length of each melody (default: 20)
+        seed: int - seed for NumPy's random generator; None for fresh entropy
+
+        Returns:
+        list[list[str]] - n generated melodies, each a list of notes
+        """
+        if n < 0:
+            raise ValueError("n must not be negative")
+        if self._sampler is None:
+            self._sampler = _SmoothedSampler(self.model, self.vocab, self.probabilities)
+        return _sample_chains(self._sampler, np.full(n, max(max_length, 0), dtype=np.int64),
+                              np.zeros(n, dtype=np.int64), [np.random.default_rng(seed)])
+
+    def __repr__(self) -> str:
+        return (f"SmoothedModel({self.method!r}, {len(self.vocab)} notes"
+                f"{', with unknown note' if self.unknown else ''})")
+
+
+def smooth_model(model: BigramModel, method: str = 'add-k', alpha: float = 1.0,
+                 discount: float = 0.75, unknown: bool = False) -> SmoothedModel:
+    """
+    Return the smoothed probabilities of a model, computing them only once.
+
+    Results are cached on the model, one per set of arguments, and the
+    cache is cleared whenever the model's counts change.
+
+    Parameters:
+    model: BigramModel - trained Bigram model
+    method: str - one of METHODS (default: 'add-k')
+    alpha: float - pseudo-count of 'add-k' smoothing (default: 1.0)
+    discount: float - count subtracted by 'absolute' and 'kneser-ney' (default: 0.75)
+    unknown: bool - add a row and column for unseen notes (default: False)
+
+    Returns:
+    SmoothedModel - the cached probabilities
+    """
+    # Interning a note grows the vocabulary without changing any counts
+    key = (len(model.vocab), method, alpha, discount, unknown)
+    smoothed = model._smoothed.get(key)
+    if smoothed is None:
+        smoothed = model._smoothed[key] = SmoothedModel(model, method, alpha, discount, unknown)
+    return smoothed
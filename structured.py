@@ -0,0 +1,203 @@
+"""
+Melodies with durations, velocities and rests, stored column-wise.
+
+A StructuredCorpus keeps one typed NumPy array per attribute instead of a
+list of note objects or dicts:
+
+    pitches[offsets[i]:offsets[i + 1]]      pitch IDs of melody i (vocab[id])
+    durations[offsets[i]:offsets[i + 1]]    float32 lengths in beats
+    velocities[offsets[i]:offsets[i + 1]]   uint8 MIDI velocities
+
+A rest is the pitch REST with velocity 0. The pitch column is a packed
+corpus on its own, and pairing it with the duration column gives joint
+(pitch, duration) tokens such as 'C4/0.5' that a Bigram model can be
+trained on, so generated melodies carry their rhythm.
+"""
+from itertools import chain
+from typing import Optional
+
+import numpy as np
+
+from corpus import PackedCorpus, pack_melodies
+from models import BigramModel
+
+REST = 'R'
+DEFAULT_DURATION = 1.0
+DEFAULT_VELOCITY = 64
+
+
+class StructuredCorpus:
+    """Melodies as parallel pitch, duration and velocity arrays plus offsets."""
+
+    def __init__(self, vocab: list[str], pitches: np.ndarray, durations: np.ndarray,
+                 velocities: np.ndarray, offsets: np.ndarray):
+        if not len(pitches) == len(durations) == len(velocities) == offsets[-1]:
+            raise ValueError("pitches, durations and velocities must have one entry per note")
+        self.vocab = vocab
+        self.pitches = pitches
+        self.durations = durations
+        self.velocities = velocities
+        self.offsets = offsets
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """The number of notes (and rests) in each melody."""
+        return np.diff(self.offsets)
+
+    @property
+    def is_rest(self) -> np.ndarray:
+        """Boolean mask over all notes, True where the note is a rest."""
+        if REST not in self.vocab:
+            return np.zeros(len(self.pitches), dtype=bool)
+        return self.pitches == self.vocab.index(REST)
+
+    def total_durations(self) -> np.ndarray:
+        """
+        Return the length of every melody in beats, rests included.
+
+        Returns:
+        np.ndarray - float64 array, one entry per melody
+        """
+        owner = np.repeat(np.arange(len(self)), self.lengths)
+        return np.bincount(owner, weights=self.durations, minlength=len(self)).astype(np.float64)
+
+    def pitch_corpus(self) -> PackedCorpus:
+        """
+        Return the pitch column as a PackedCorpus, without copying it.
+
+        Returns:
+        PackedCorpus - the melodies' notes, ignoring rhythm
+        """
+        return PackedCorpus(self.vocab, self.pitches, self.offsets)
+
+    def joint_tokens(self) -> tuple[list[str], np.ndarray]:
+        """
+        Pair every note's pitch and duration into one token.
+
+        Returns:
+        tuple[list[str], np.ndarray] - (joint vocabulary such as ['C4/1',
+        'C4/0.5', ...], joint token ID of every note)
+        """
+        if len(self.pitches) == 0:
+            return [], np.zeros(0, dtype=np.int64)
+        values, duration_ids = np.unique(self.durations, return_inverse=True)
+        joint = self.pitches.astype(np.int64) * len(values) + duration_ids.reshape(-1)
+        keys, joint_ids = np.unique(joint, return_inverse=True)
+        pitch_ids, value_ids = np.divmod(keys, len(values))
+        vocab = [joint_token(self.vocab[pitch], float(values[value]))
+                 for pitch, value in zip(pitch_ids.tolist(), value_ids.tolist())]
+        return vocab, joint_ids.reshape(-1)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> tuple[list[str], list[float], list[int]]:
+        """Return melody i as (notes, durations, velocities) lists."""
+        if not -len(self) <= i < len(self):
+            raise IndexError("melody index out of range")
+        i %= len(self)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        notes = [self.vocab[pitch] for pitch in self.pitches[start:end].tolist()]
+        return notes, self.durations[start:end].tolist(), self.velocities[start:end].tolist()
+
+    def __repr__(self) -> str:
+        return (f"StructuredCorpus({len(self)} melodies, {len(self.pitches)} notes, "
+                f"{len(self.vocab)} distinct pitches)")
+
+
+def structure_melodies(notes: list[list[str]], durations: Optional[list[list[float]]] = None,
+                       velocities: Optional[list[list[int]]] = None) -> StructuredCorpus:
+    """
+    Build a StructuredCorpus from per-melody lists of notes, durations and velocities.
+
+    Use REST ('R') as the note of a rest; its velocity defaults to 0.
+
+    Parameters:
+    notes: list[list[str]] - the notes of each melody
+    durations: list[list[float]] - each note's length in beats (default: 1.0 each)
+    velocities: list[list[int]] - each note's MIDI velocity, 0-127 (default: 64,
+        or 0 for rests)
+
+    Returns:
+    StructuredCorpus - the melodies in column form
+    """
+    packed = pack_melodies(notes)
+    total = len(packed.tokens)
+    lengths = packed.lengths.tolist()
+
+    def column(values, dtype):
+        if any(len(melody) != length for melody, length in zip(values, lengths)) \
+                or len(values) != len(lengths):
+            raise ValueError("Every melody needs one duration and velocity per note")
+        return np.fromiter(chain.from_iterable(values), dtype=dtype, count=total)
+
+    if durations is None:
+        duration_column = np.full(total, DEFAULT_DURATION, dtype=np.float32)
+    else:
+        duration_column = column(durations, np.float32)
+    if (duration_column <= 0).any():
+        raise ValueError("Durations must be positive")
+    if velocities is None:
+        velocity_column = np.full(total, DEFAULT_VELOCITY, dtype=np.uint8)
+        if REST in packed.vocab:
+            velocity_column[packed.tokens == packed.vocab.index(REST)] = 0
+    else:
+        velocity_column = column(velocities, np.int64)
+        if ((velocity_column < 0) | (velocity_column > 127)).any():
+            raise ValueError("Velocities must be between 0 and 127")
+        velocity_column = velocity_column.astype(np.uint8)
+    return StructuredCorpus(packed.vocab, packed.tokens, duration_column, velocity_column,
+                            packed.offsets)
+
+
+def joint_token(note: str, duration: float) -> str:
+    """
+    Return the joint token of a note and its duration, e.g. 'C4/0.5'.
+
+    Parameters:
+    note: str - the note (or REST)
+    duration: float - its length in beats
+
+    Returns:
+    str - the joint token
+    """
+    return f"{note}/{duration:g}"
+
+
+def split_token(token: str) -> tuple[str, float]:
+    """
+    Split a joint token back into its note and duration.
+
+    Parameters:
+    token: str - a token made by joint_token
+
+    Returns:
+    tuple[str, float] - (note, duration in beats)
+    """
+    note, _, duration = token.rpartition('/')
+    if not note:
+        raise ValueError(f"Not a joint (pitch, duration) token: {token!r}")
+    return note, float(duration)
+
+
+def build_joint_model(corpus: StructuredCorpus,
+                      model: Optional[BigramModel] = None) -> BigramModel:
+    """
+    Train a Bigram model on joint (pitch, duration) tokens.
+
+    Tokens are formed and counted with array operations on the columns, so
+    no per-note string is built. Generate from the model as usual and turn
+    the tokens back into notes and durations with split_token.
+
+    Parameters:
+    corpus: StructuredCorpus - the melodies to learn from
+    model: BigramModel - model to update in place (default: a new model)
+
+    Returns:
+    BigramModel - model whose notes are joint tokens such as 'C4/0.5'
+    """
+    if model is None:
+        model = BigramModel()
+    vocab, joint_ids = corpus.joint_tokens()
+    model.add_melody_ids(model.intern_many(vocab)[joint_ids], corpus.lengths)
+    return model
@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import load_melodies
+from benchmark import compare, run_benchmarks, write_synthetic_corpus, STAGES
+
+
+class TestBenchmark(unittest.TestCase):
+    
+    def setUp(self):
+        self.corpus_path = 'tests/test_benchmark_corpus.txt'
+    
+    def tearDown(self):
+        """Remove the corpus file."""
+        if os.path.exists(self.corpus_path):
+            os.remove(self.corpus_path)
+    
+    def test_synthetic_corpus_is_reproducible(self):
+        """Test that the same size and seed give the same melodies."""
+        write_synthetic_corpus(self.corpus_path, 50, seed=3, chunk_size=7)
+        melodies = load_melodies(self.corpus_path)
+        write_synthetic_corpus(self.corpus_path, 50, seed=3, chunk_size=7)
+        self.assertEqual(load_melodies(self.corpus_path), melodies)
+        self.assertEqual(len(melodies), 50)
+        self.assertTrue(all(4 <= len(melody) <= 32 for melody in melodies))
+    
+    def test_results_cover_every_stage(self):
+        """Test that a small run reports every stage of every size."""
+        results = run_benchmarks([20, 40], repeat=1, generate=5, workdir='tests')
+        self.assertEqual([(row['size'], row['stage']) for row in results['results']],
+                         [(size, stage) for size in (20, 40) for stage in STAGES])
+        self.assertTrue(all(row['peak_bytes'] is not None for row in results['results']))
+    
+    def test_compare_reports_regressions(self):
+        """Test that only large enough slowdowns count as regressions."""
+        baseline = {'results': [{'size': 10, 'stage': 'build', 'seconds': 1.0, 'peak_bytes': None},
+                                {'size': 10, 'stage': 'load', 'seconds': 0.001, 'peak_bytes': None}]}
+        results = {'results': [{'size': 10, 'stage': 'build', 'seconds': 2.0, 'peak_bytes': 5},
+                               {'size': 10, 'stage': 'load', 'seconds': 0.003, 'peak_bytes': 5},
+                               {'size': 99, 'stage': 'load', 'seconds': 9.0, 'peak_bytes': 5}]}
+        regressions = compare(results, baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('build on 10 melodies', regressions[0])
+        self.assertEqual(compare(results, baseline, tolerance=1.5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
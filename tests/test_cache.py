@@ -0,0 +1,68 @@
+import unittest
+import os
+import pickle
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, generate_melodies, preprocess_melodies, update_model
+from constraints import Constraints
+from cache import GenerationCache
+
+
+class TestGenerationCache(unittest.TestCase):
+    
+    def setUp(self):
+        """Build a small model and a cache with a controllable clock."""
+        self.model = build_bigram_model(preprocess_melodies([
+            ['C4', 'D4', 'E4', 'C4'],
+            ['E4', 'D4', 'C4', 'G4'],
+        ]))
+        self.now = 0.0
+        self.cache = GenerationCache(max_entries=2, ttl=10, clock=lambda: self.now)
+    
+    def test_hits_match_generation(self):
+        """Test that repeated seeded requests are served from the cache."""
+        first = self.cache.generate(self.model, 4, seed=1)
+        self.assertEqual(first, generate_melodies(self.model, 4, seed=1))
+        first[0].append('X')
+        self.assertEqual(self.cache.generate(self.model, 4, seed=1),
+                         generate_melodies(self.model, 4, seed=1))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        # Unseeded requests are never cached
+        self.cache.generate(self.model, 4)
+        self.assertEqual(len(self.cache), 1)
+    
+    def test_key_includes_parameters(self):
+        """Test that different parameters are cached separately."""
+        self.cache.generate(self.model, 4, seed=1)
+        self.cache.generate(self.model, 4, seed=1, constraints=Constraints(max_repeats=1))
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(len(self.cache), 2)
+    
+    def test_lru_eviction_and_ttl(self):
+        """Test that the least recently used entry is evicted and entries expire."""
+        for seed in (1, 2):
+            self.cache.generate(self.model, 1, seed=seed)
+        self.cache.generate(self.model, 1, seed=1)
+        self.cache.generate(self.model, 1, seed=3)
+        self.assertIsNone(self.cache.get(GenerationCache.key(self.model, 1, 20, 2)))
+        self.assertIsNotNone(self.cache.get(GenerationCache.key(self.model, 1, 20, 1)))
+        self.now = 11.0
+        self.assertIsNone(self.cache.get(GenerationCache.key(self.model, 1, 20, 1)))
+    
+    def test_update_invalidates(self):
+        """Test that updating the model changes its hash and misses the cache."""
+        before = self.model.content_hash()
+        self.cache.generate(self.model, 4, seed=1)
+        update_model(self.model, preprocess_melodies([['G4', 'G4', 'A4']]))
+        self.assertNotEqual(self.model.content_hash(), before)
+        self.assertEqual(self.cache.generate(self.model, 4, seed=1),
+                         generate_melodies(self.model, 4, seed=1))
+        self.assertEqual(self.cache.hits, 0)
+        # Same contents, same hash
+        self.assertEqual(pickle.loads(pickle.dumps(self.model)).content_hash(),
+                         self.model.content_hash())
+
+if __name__ == '__main__':
+    unittest.main()
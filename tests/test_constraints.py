@@ -0,0 +1,134 @@
+import unittest
+import os
+import random
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import (
+    build_bigram_model,
+    preprocess_melodies,
+    generate_melody,
+    generate_melodies,
+    update_model,
+    _MAX_CONSTRAINED_SAMPLERS,
+)
+from constraints import Constraints
+from pitch import note_to_midi, midi_to_note, parse_key, parse_note, scale_pitch_classes
+
+
+def longest_run(melody):
+    """Return the most times a note is repeated in a row."""
+    best = run = 0
+    previous = None
+    for note in melody:
+        run = run + 1 if note == previous else 1
+        best = max(best, run)
+        previous = note
+    return best
+
+
+class TestPitch(unittest.TestCase):
+    
+    def test_parse_note_names(self):
+        """Test pitch classes, octaves and MIDI numbers of note names."""
+        self.assertEqual(parse_note('F#4'), (6, 4))
+        self.assertEqual(parse_note('Bb'), (10, None))
+        self.assertEqual(note_to_midi('C4'), 60)
+        self.assertEqual(note_to_midi('B#3'), 60)
+        self.assertIsNone(note_to_midi('C'))
+        self.assertIsNone(parse_note('rest'))
+        self.assertEqual(midi_to_note(61), 'C#4')
+    
+    def test_scales(self):
+        """Test that keys give the right pitch classes."""
+        self.assertEqual(scale_pitch_classes('C major'), {0, 2, 4, 5, 7, 9, 11})
+        self.assertEqual(scale_pitch_classes('A minor'), scale_pitch_classes('C'))
+        with self.assertRaises(ValueError):
+            scale_pitch_classes('H major')
+        self.assertEqual(parse_key(' F# Minor '), (6, 'minor'))
+        self.assertEqual(parse_key('Bb'), (10, 'major'))
+        for key in ('C4 major', 'C dorian', ''):
+            with self.assertRaises(ValueError):
+                parse_key(key)
+
+
+class TestConstrainedGeneration(unittest.TestCase):
+    
+    def setUp(self):
+        """Train a model whose melodies wander out of range and key."""
+        melodies = [
+            ['C4', 'C4', 'C4', 'C4', 'D4', 'E4'],
+            ['E4', 'F#4', 'G4', 'C5', 'C4'],
+            ['G3', 'C4', 'E4', 'E4', 'E4', 'D4'],
+            ['D4', 'E4', 'C4', 'G4', 'A4', 'G4'],
+        ]
+        self.model = build_bigram_model(preprocess_melodies(melodies))
+    
+    def check(self, constraints, melody):
+        """Assert that one melody follows the constraints."""
+        if constraints.max_repeats is not None:
+            self.assertLessEqual(longest_run(melody), constraints.max_repeats)
+        for note in melody:
+            self.assertTrue(constraints.allows(note), note)
+        if constraints.end_note is not None and melody:
+            self.assertEqual(melody[-1], constraints.end_note)
+    
+    def test_constraints_in_generate_melody(self):
+        """Test single-melody generation under every kind of rule."""
+        constraints = Constraints(max_repeats=2, low='C4', high='B4', key='C major',
+                                  end_note='E4')
+        rng = random.Random(1)
+        for _ in range(100):
+            self.check(constraints, generate_melody(self.model, 15, rng, constraints))
+    
+    def test_constraints_in_generate_melodies(self):
+        """Test that batched generation follows the same rules."""
+        for constraints in (Constraints(max_repeats=1),
+                            Constraints(key='C major', end_note='D4'),
+                            Constraints(low='C4', high='G4')):
+            for melody in generate_melodies(self.model, 200, 10, seed=2, constraints=constraints):
+                self.check(constraints, melody)
+    
+    def test_tables_are_cached_and_follow_updates(self):
+        """Test that constrained tables are reused and pick up new counts."""
+        constraints = Constraints(key='C major')
+        generate_melody(self.model, constraints=constraints)
+        sampler = self.model._constrained[constraints]
+        update_model(self.model, preprocess_melodies([['B4', 'A4']]))
+        generate_melodies(self.model, 10, constraints=Constraints(key='C major'))
+        self.assertIs(self.model._constrained[constraints], sampler)
+        self.assertTrue(sampler.has_next[self.model.index['B4']])
+    
+    def test_cached_tables_are_bounded(self):
+        """Test that only the most recently used constrained tables are kept."""
+        favourite = Constraints(key='C major')
+        generate_melody(self.model, constraints=favourite)
+        for repeats in range(1, 30):
+            generate_melody(self.model, constraints=Constraints(max_repeats=repeats))
+            generate_melody(self.model, constraints=favourite)
+        self.assertEqual(len(self.model._constrained), _MAX_CONSTRAINED_SAMPLERS)
+        self.assertIn(favourite, self.model._constrained)
+        self.assertNotIn(Constraints(max_repeats=1), self.model._constrained)
+    
+    def test_invalid_constraints(self):
+        """Test that impossible rule values are rejected."""
+        with self.assertRaises(ValueError):
+            Constraints(max_repeats=0)
+        with self.assertRaises(ValueError):
+            Constraints(low='C')
+
+    def test_unreachable_end_note(self):
+        """Test that an end note the model cannot generate is rejected, not ignored."""
+        for constraints in (Constraints(end_note='A#7'),
+                            Constraints(key='C major', end_note='F#4'),
+                            Constraints(high='D4', end_note='E4')):
+            with self.assertRaises(ValueError):
+                generate_melodies(self.model, 2, 6, seed=0, constraints=constraints)
+            with self.assertRaises(ValueError):
+                generate_melody(self.model, constraints=constraints)
+            self.assertNotIn(constraints, self.model._constrained)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, load_melodies, preprocess_melodies, save_melodies
+from corpus import (
+    pack_melodies,
+    save_packed,
+    load_packed,
+    text_to_packed,
+    packed_to_text,
+    train_packed,
+)
+
+
+class TestPackedCorpus(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.packed_file = 'tests/test_corpus.bin'
+        self.text_file = 'tests/test_corpus.txt'
+        self.melodies = [
+            ['C4', 'D4', 'E4'],
+            ['A4'],
+            ['G4', 'F#4', 'G4', 'C5'],
+        ]
+    
+    def tearDown(self):
+        """Clean up after each test method."""
+        for path in (self.packed_file, self.text_file):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def test_pack_melodies(self):
+        """Test that packing keeps every melody and uses a narrow token type."""
+        corpus = pack_melodies(self.melodies, chunk_size=2)
+        self.assertEqual(len(corpus), 3)
+        self.assertEqual(list(corpus), self.melodies)
+        self.assertEqual(corpus[-1], self.melodies[-1])
+        self.assertEqual(corpus.lengths.tolist(), [3, 1, 4])
+        self.assertEqual(corpus.tokens.dtype.itemsize, 1)
+    
+    def test_save_and_load_packed(self):
+        """Test that a packed corpus survives a round trip, mapped or read."""
+        save_packed(pack_melodies(self.melodies), self.packed_file)
+        for mmap in (True, False):
+            self.assertEqual(list(load_packed(self.packed_file, mmap=mmap)), self.melodies)
+    
+    def test_text_round_trip(self):
+        """Test that text -> packed -> text loses nothing."""
+        save_melodies(self.melodies, self.text_file)
+        text_to_packed(self.text_file, self.packed_file)
+        os.remove(self.text_file)
+        packed_to_text(self.packed_file, self.text_file)
+        self.assertEqual(load_melodies(self.text_file), self.melodies)
+        os.remove(self.text_file)
+        save_packed(pack_melodies([['C', 'D'], [], ['E']]), self.packed_file)
+        with self.assertRaises(ValueError):
+            packed_to_text(self.packed_file, self.text_file)
+        self.assertFalse(os.path.exists(self.text_file))
+    
+    def test_empty_corpus(self):
+        """Test that an empty corpus can be saved and loaded."""
+        save_packed(pack_melodies([]), self.packed_file)
+        corpus = load_packed(self.packed_file)
+        self.assertEqual(len(corpus), 0)
+        self.assertEqual(list(corpus), [])
+    
+    def test_wide_vocabulary(self):
+        """Test that more than 256 distinct notes switch to 16-bit tokens."""
+        melodies = [[f"N{i}" for i in range(300)]]
+        save_packed(pack_melodies(melodies), self.packed_file)
+        corpus = load_packed(self.packed_file)
+        self.assertEqual(corpus.tokens.dtype.itemsize, 2)
+        self.assertEqual(list(corpus), melodies)
+
+    
+    def test_train_packed(self):
+        """Test that training on a packed corpus matches training on lists."""
+        expected = build_bigram_model(preprocess_melodies(self.melodies + [[]]))
+        save_packed(pack_melodies(self.melodies + [[]]), self.packed_file)
+        corpus = load_packed(self.packed_file)
+        for chunk_size in (1, 100):
+            model = train_packed(corpus, chunk_size=chunk_size)
+            self.assertEqual(model.to_dict(), expected.to_dict())
+        model = train_packed(pack_melodies([['C4', 'X']]), model)
+        self.assertEqual(model['C4']['X'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
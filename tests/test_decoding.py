@@ -0,0 +1,66 @@
+import unittest
+import math
+import os
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, preprocess_melodies
+from decoding import log_probabilities, top_k_melodies
+
+
+class TestTopKMelodies(unittest.TestCase):
+    
+    def setUp(self):
+        """Build a model where C -> D is the most likely transition."""
+        self.model = build_bigram_model(preprocess_melodies([
+            ['C', 'D'],
+            ['C', 'D'],
+            ['C', 'E'],
+            ['D'],
+        ]))
+    
+    def test_most_probable_first(self):
+        """Test that melodies come back in order with correct log-probabilities."""
+        results = top_k_melodies(self.model, k=3)
+        melodies = [melody for melody, _ in results]
+        self.assertEqual(melodies, [['C', 'D'], ['D'], ['C', 'E']])
+        # P(C D) = P(C|^) * P(D|C) * P($|D) = 3/4 * 2/3 * 1
+        self.assertAlmostEqual(results[0][1], math.log(0.5))
+        self.assertAlmostEqual(results[1][1], math.log(0.25))
+        self.assertAlmostEqual(results[2][1], math.log(0.25))
+    
+    def test_fewer_melodies_than_k(self):
+        """Test that a model with few possible melodies returns all of them."""
+        self.assertEqual(len(top_k_melodies(self.model, k=10)), 3)
+    
+    def test_respects_max_length(self):
+        """Test that no melody is longer than max_length."""
+        model = build_bigram_model(preprocess_melodies([['A', 'A', 'A', 'B']]))
+        results = top_k_melodies(model, k=5, max_length=3)
+        self.assertTrue(results)
+        for melody, _ in results:
+            self.assertLessEqual(len(melody), 3)
+    
+    def test_deterministic(self):
+        """Test that repeated calls return the same melodies."""
+        model = build_bigram_model(preprocess_melodies([
+            ['C', 'D', 'E', 'C'], ['E', 'D', 'C'], ['C', 'C', 'D'], ['D', 'E'],
+        ]))
+        first = top_k_melodies(model, k=5, max_length=8, beam_width=4)
+        self.assertEqual(first, top_k_melodies(model, k=5, max_length=8, beam_width=4))
+    
+    def test_log_probability_rows(self):
+        """Test that each row of log-probabilities sums to one in probability space."""
+        logp = log_probabilities(self.model)
+        for note in self.model:
+            row = logp[self.model.index[note]]
+            self.assertAlmostEqual(sum(math.exp(x) for x in row), 1.0)
+        smoothed = log_probabilities(self.model, smoothing='add-k', alpha=0.5)
+        self.assertTrue(all(math.isfinite(x) for x in smoothed[self.model.index['C'], 1:]))
+        with self.assertRaises(TypeError):
+            log_probabilities(self.model, 'add-k')
+
+
+if __name__ == '__main__':
+    unittest.main()
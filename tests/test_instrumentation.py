@@ -0,0 +1,98 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from instrumentation import DISABLED, Instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_stages_and_counters(self):
+        """Test that repeated stages accumulate and counters add up."""
+        instrumentation = Instrumentation()
+        for _ in range(3):
+            with instrumentation.stage('generate'):
+                sum(range(1000))
+        instrumentation.count('tokens', 10)
+        instrumentation.count('tokens', 5)
+        instrumentation.record('average_chain_length', 4.5)
+        report = instrumentation.to_dict()
+        self.assertEqual(report['stages']['generate']['calls'], 3)
+        self.assertGreater(report['stages']['generate']['seconds'], 0)
+        self.assertNotIn('peak_bytes', report['stages']['generate'])
+        self.assertEqual(report['counters'], {'tokens': 15, 'average_chain_length': 4.5})
+
+    def test_stage_records_exceptions(self):
+        """Test that a stage that raises is still timed."""
+        instrumentation = Instrumentation()
+        with self.assertRaises(ValueError):
+            with instrumentation.stage('load'):
+                raise ValueError("bad file")
+        self.assertEqual(instrumentation.stages['load']['calls'], 1)
+
+    def test_memory_tracking(self):
+        """Test that allocations are measured and tracemalloc is left as it was."""
+        instrumentation = Instrumentation(memory=True)
+        with instrumentation.stage('build'):
+            data = bytearray(1 << 20)
+        record = instrumentation.stages['build']
+        self.assertGreaterEqual(record['peak_bytes'], 1 << 20)
+        self.assertGreaterEqual(record['allocated_bytes'], 1 << 20)
+        self.assertFalse(tracemalloc.is_tracing())
+        del data
+
+    def test_nested_memory_tracking(self):
+        """Test that a nested stage does not hide the enclosing stage's peak."""
+        instrumentation = Instrumentation(memory=True)
+        with instrumentation.stage('train'):
+            data = bytearray(4 << 20)
+            del data
+            with instrumentation.stage('intern'):
+                data = bytearray(1 << 20)
+                del data
+            with instrumentation.stage('count'):
+                data = bytearray(8 << 20)
+                del data
+        stages = instrumentation.stages
+        self.assertLess(stages['intern']['peak_bytes'], 2 << 20)
+        self.assertGreaterEqual(stages['count']['peak_bytes'], 8 << 20)
+        self.assertGreaterEqual(stages['train']['peak_bytes'], 8 << 20)
+        instrumentation.reset()
+        with instrumentation.stage('train'):
+            data = bytearray(4 << 20)
+            del data
+            with instrumentation.stage('intern'):
+                pass
+        self.assertGreaterEqual(instrumentation.stages['train']['peak_bytes'], 4 << 20)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_json_export(self):
+        """Test that the saved file holds the same report."""
+        instrumentation = Instrumentation()
+        with instrumentation.stage('save'):
+            pass
+        instrumentation.count('melodies', 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profile.json')
+            instrumentation.save(path)
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), instrumentation.to_dict())
+        instrumentation.reset()
+        self.assertEqual(instrumentation.to_dict(), {'stages': {}, 'counters': {}})
+
+    def test_disabled_records_nothing(self):
+        """Test that the disabled default is a no-op."""
+        self.assertFalse(DISABLED.enabled)
+        with DISABLED.stage('load'):
+            DISABLED.count('tokens', 10)
+            DISABLED.record('states', 3)
+        self.assertEqual(DISABLED.to_dict(), {'stages': {}, 'counters': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, preprocess_melodies
+from pitch import midi_to_note, note_to_midi
+from intervals import (
+    build_interval_model,
+    decode_melody,
+    encode_melody,
+    estimate_tonic,
+    generate_in_key,
+    reference_tonic,
+)
+
+
+def transpose(melody, semitones):
+    return [midi_to_note(note_to_midi(note) + semitones) for note in melody]
+
+
+class TestIntervalEncoding(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up melodies in C major."""
+        self.melodies = [
+            ['C4', 'E4', 'G4', 'C5'],
+            ['E4', 'D4', 'C4', 'D4', 'E4', 'E4', 'E4'],
+            ['G4', 'A4', 'G4', 'F4', 'E4', 'D4', 'C4'],
+        ]
+    
+    def test_encodings(self):
+        """Test both encodings of a melody and their decoding."""
+        melody = self.melodies[0]
+        self.assertEqual(encode_melody(melody, 'interval'), ['@0', '+4', '+3', '+5'])
+        self.assertEqual(encode_melody(melody, 'degree'), ['0', '4', '7', '12'])
+        for mode in ('interval', 'degree'):
+            tokens = encode_melody(transpose(melody, 2), mode, key='D major')
+            self.assertEqual(decode_melody(tokens, 'C major', mode=mode), melody)
+            self.assertEqual(decode_melody(tokens, 'A minor', mode=mode), melody)
+            self.assertEqual(decode_melody(tokens, 'G', mode=mode), transpose(melody, 7))
+    
+    def test_notes_without_octaves(self):
+        """Test that octave-less notes are joined by their smallest step."""
+        self.assertEqual(encode_melody(['B', 'C', 'A'], key='C'), ['@11', '+1', '-3'])
+        with self.assertRaises(ValueError):
+            encode_melody(['C4', 'rest'])
+    
+    def test_key_estimation(self):
+        """Test that melodies are assigned their major (or relative major) key."""
+        for melody in (self.melodies[0], self.melodies[2]):
+            self.assertEqual(estimate_tonic([note_to_midi(n) % 12 for n in melody]), 0)
+            self.assertEqual(estimate_tonic([(note_to_midi(n) + 5) % 12 for n in melody]), 5)
+        self.assertEqual(reference_tonic('A minor'), 0)
+        self.assertEqual(reference_tonic('F# major'), 6)
+    
+    def test_transposed_corpus_shares_states(self):
+        """Test that a corpus in twelve keys trains the same small model as one key."""
+        corpus = [transpose(melody, shift) for shift in range(12) for melody in self.melodies]
+        absolute = build_bigram_model(preprocess_melodies(corpus))
+        for mode in ('interval', 'degree'):
+            model = build_interval_model(corpus, mode)
+            single = build_interval_model(self.melodies, mode)
+            self.assertEqual(set(model.vocab), set(single.vocab))
+            self.assertLess(len(model.vocab) * 2, len(absolute.vocab))
+    
+    def test_generate_in_key(self):
+        """Test that generated melodies stay in the requested key."""
+        model = build_interval_model(self.melodies, 'degree')
+        d_major = {2, 4, 6, 7, 9, 11, 1}
+        for melody in generate_in_key(model, 'D major', n=20, seed=3, mode='degree'):
+            for note in melody:
+                self.assertIn(note_to_midi(note) % 12, d_major)
+
+
+if __name__ == '__main__':
+    unittest.main()
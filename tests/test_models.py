@@ -1,10 +1,35 @@
 import unittest
+import bz2
+import gzip
 import os
+import random
+import subprocess
 import sys
 
 # Add parent directory to path to import models
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from models import load_melodies, save_melodies
+from models import (
+    load_melodies,
+    save_melodies,
+    iter_melodies,
+    iter_melody_chunks,
+    iter_preprocessed,
+    build_bigram_model,
+    preprocess_melodies,
+    generate_melody,
+    BigramModel,
+    compile_model,
+    generate_melodies,
+    MelodyFormatError,
+    merge_models,
+    update_model,
+    forget_melodies,
+    save_model,
+    load_model,
+    train_parallel,
+    write_melodies,
+    write_sharded,
+)
 
 
 class TestMelodyFunctions(unittest.TestCase):
@@ -76,6 +101,324 @@ class TestMelodyFunctions(unittest.TestCase):
         # Clean up
         os.remove(empty_file)
 
+    
+    def test_write_melodies_streams_and_compresses(self):
+        """Test bulk writing from a generator, plain and compressed."""
+        melodies = (melody for melody in self.test_melodies * 3)
+        self.assertEqual(write_melodies(melodies, self.test_file, chunk_size=2), 9)
+        self.assertEqual(load_melodies(self.test_file), self.test_melodies * 3)
+        gz_file = self.test_file + '.gz'
+        try:
+            write_melodies(self.test_melodies, gz_file)
+            with gzip.open(gz_file, 'rt', encoding='utf-8') as f:
+                self.assertEqual([line.split() for line in f], self.test_melodies)
+        finally:
+            os.remove(gz_file)
+    
+    def test_write_errors_are_raised(self):
+        """Test that write errors are raised instead of printed, leaving no file."""
+        missing = 'tests/no_such_dir/out.txt'
+        with self.assertRaises(OSError):
+            save_melodies(self.test_melodies, missing)
+        with self.assertRaises(ValueError):
+            write_melodies(self.test_melodies, self.test_file, compression='zip')
+        
+        def failing():
+            yield ['C']
+            raise RuntimeError("generator failed")
+        with self.assertRaises(RuntimeError):
+            write_melodies(failing(), self.test_file, chunk_size=1)
+        self.assertFalse(os.path.exists(self.test_file))
+        self.assertFalse(os.path.exists(self.test_file + '.tmp'))
+    
+    def test_write_sharded(self):
+        """Test that chunks are dealt to shards in turn and every melody is written once."""
+        melodies = [[f"N{i}"] for i in range(11)]
+        pattern = 'tests/test_shard_{shard}.txt.bz2'
+        paths = write_sharded(iter(melodies), pattern, shards=3, chunk_size=2)
+        try:
+            shards = []
+            for path in paths:
+                with bz2.open(path, 'rt', encoding='utf-8') as f:
+                    shards.append([line.split() for line in f])
+            self.assertEqual(shards[0], melodies[0:2] + melodies[6:8])
+            self.assertEqual(sorted(sum(shards, [])), sorted(melodies))
+        finally:
+            for path in paths:
+                os.remove(path)
+        with self.assertRaises(ValueError):
+            write_sharded(melodies, 'tests/no_field.txt', shards=2)
+
+
+class TestStreamingLoader(unittest.TestCase):
+    
+    def setUp(self):
+        """Write a small melody file to stream from."""
+        self.test_file = 'tests/test_stream.txt'
+        with open(self.test_file, 'w', encoding='utf-8') as f:
+            f.write("C D E\n\nA, B, C\nG A\n")
+    
+    def tearDown(self):
+        """Clean up after each test method."""
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_iter_melodies_matches_load_melodies(self):
+        """Test that streaming yields the same melodies as load_melodies."""
+        self.assertEqual(list(iter_melodies(self.test_file)), load_melodies(self.test_file))
+    
+    def test_iter_melody_chunks(self):
+        """Test that chunks are bounded by chunk_size and cover every melody."""
+        chunks = list(iter_melody_chunks(self.test_file, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(chunks[0][1], ['A', 'B', 'C'])
+    
+    def test_malformed_line_is_reported(self):
+        """Test that malformed lines raise with a line number or go to on_error."""
+        with open(self.test_file, 'a', encoding='utf-8') as f:
+            f.write("C,,D\nE F\n")
+        with self.assertRaises(MelodyFormatError) as ctx:
+            list(iter_melodies(self.test_file))
+        self.assertEqual(ctx.exception.line_number, 5)
+        
+        errors = []
+        melodies = list(iter_melodies(self.test_file, on_error=errors.append))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(melodies[-1], ['E', 'F'])
+    
+    def test_missing_file_raises(self):
+        """Test that streaming a missing file raises instead of returning nothing."""
+        with self.assertRaises(FileNotFoundError):
+            list(iter_melodies('tests/nonexistent_file.txt'))
+    
+    def test_streaming_training(self):
+        """Test that a model can be trained straight from the stream."""
+        model = build_bigram_model(iter_preprocessed(iter_melodies(self.test_file)))
+        self.assertEqual(model['^'], {'C': 1, 'A': 1, 'G': 1})
+        self.assertEqual(model['C'], {'D': 1, '$': 1})
+    
+    def test_byte_ranges_cover_every_melody_once(self):
+        """Test that consecutive byte ranges split the file without gaps or overlaps."""
+        size = os.path.getsize(self.test_file)
+        expected = list(iter_melodies(self.test_file))
+        for cut in range(size + 1):
+            melodies = (list(iter_melodies(self.test_file, end=cut))
+                        + list(iter_melodies(self.test_file, start=cut)))
+            self.assertEqual(melodies, expected)
+    
+    def test_train_parallel_matches_serial(self):
+        """Test that sharded training gives the same counts as one pass."""
+        serial = build_bigram_model(iter_preprocessed(iter_melodies(self.test_file)))
+        self.assertEqual(train_parallel(self.test_file, workers=2), serial)
+        self.assertEqual(train_parallel(self.test_file, workers=1), serial)
+
+
+class TestBigramModel(unittest.TestCase):
+    
+    def setUp(self):
+        """Train a model on a few short melodies."""
+        self.melodies = [['C', 'D', 'E'], ['C', 'E'], ['D', 'D']]
+        self.model = build_bigram_model(preprocess_melodies(self.melodies))
+    
+    def test_interned_ids_and_counts(self):
+        """Test that notes are interned and counted in the matrix."""
+        model = self.model
+        self.assertIsInstance(model, BigramModel)
+        self.assertEqual(model.vocab[:2], ['^', '$'])
+        self.assertEqual(model.counts.shape, (len(model.vocab), len(model.vocab)))
+        self.assertEqual(model.counts[model.index['^'], model.index['C']], 2)
+        self.assertEqual(int(model.counts.sum()), 10)
+    
+    def test_count_matrix_grows_to_vocabulary_size(self):
+        """Test that batch training allocates no spare rows or columns."""
+        melodies = [[f"N{i}", f"N{i + 1}"] for i in range(0, 3000, 2)]
+        model = build_bigram_model(preprocess_melodies(melodies))
+        self.assertEqual(len(model.vocab), 3002)
+        self.assertEqual(model._counts.shape, (3002, 3002))
+        model.add_transition('N0', 'new')
+        self.assertLessEqual(model._counts.shape[0], 3002 + 3002 // 8)
+        self.assertEqual(model['N0'], {'N1': 1, 'new': 1})
+    
+    def test_training_is_independent_of_string_hashing(self):
+        """Test that note IDs, hashes and seeded melodies match across hash seeds."""
+        script = ("from models import *\n"
+                  "m = build_bigram_model(preprocess_melodies("
+                  "[['E4', 'C4', 'G4', 'A4'], ['B4', 'D4', 'C4'], ['F4', 'E4']]))\n"
+                  "print(m.vocab, m.content_hash(), generate_melodies(m, 5, seed=1))")
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        outputs = set()
+        for seed in ('1', '2', '3'):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            result = subprocess.run([sys.executable, '-c', script], cwd=root, env=env,
+                                    capture_output=True, text=True, check=True)
+            outputs.add(result.stdout)
+        self.assertEqual(len(outputs), 1)
+    
+    def test_dict_compatible_view(self):
+        """Test that the model still reads like the old nested dict."""
+        expected = {
+            '^': {'C': 2, 'D': 1},
+            'C': {'D': 1, 'E': 1},
+            'D': {'E': 1, 'D': 1, '$': 1},
+            'E': {'$': 2},
+        }
+        self.assertEqual(self.model.to_dict(), expected)
+        self.assertEqual(self.model, expected)
+        self.assertNotIn('$', self.model)
+        self.assertEqual(len(self.model), 4)
+        with self.assertRaises(KeyError):
+            self.model['$']
+    
+    def test_vectorized_training_matches_pairwise_loop(self):
+        """Test that batched counting matches a plain pairwise loop across chunks."""
+        melodies = [['C', 'D'], [], ['E'], ['D', 'C', 'D', 'E'], ['F']]
+        processed = preprocess_melodies(melodies) + [[], ['^']]
+        expected = {}
+        for melody in processed:
+            for current_note, next_note in zip(melody, melody[1:]):
+                expected.setdefault(current_note, {}).setdefault(next_note, 0)
+                expected[current_note][next_note] += 1
+        for chunk_size in (1, 2, 100):
+            model = build_bigram_model(processed, chunk_size=chunk_size)
+            self.assertEqual(model.to_dict(), expected)
+    
+    def test_lazy_preprocessing_matches_preprocess_melodies(self):
+        """Test that training from iter_preprocessed counts the same transitions."""
+        melodies = [['C', 'D'], [], ['E'], ['D', 'C', 'D', 'E'], ['F']]
+        self.assertEqual(list(iter_preprocessed(melodies)), preprocess_melodies(melodies))
+        expected = build_bigram_model(preprocess_melodies(melodies))
+        for chunk_size in (1, 2, 100):
+            model = build_bigram_model(iter_preprocessed(melodies), chunk_size=chunk_size)
+            self.assertEqual(model.vocab, expected.vocab)
+            self.assertEqual(model.to_dict(), expected.to_dict())
+    
+    def test_compiled_sampler(self):
+        """Test that the compiled sampler is cached and follows the counts."""
+        sampler = compile_model(self.model)
+        self.assertIs(compile_model(self.model), sampler)
+        rng = random.Random(0)
+        draws = [sampler.next_id(self.model.index['E'], rng) for _ in range(50)]
+        self.assertEqual(set(draws), {self.model.END_ID})
+        start_draws = {sampler.next_id(self.model.START_ID, rng) for _ in range(200)}
+        self.assertEqual(start_draws, {self.model.index['C'], self.model.index['D']})
+    
+    def test_seeded_generation_is_reproducible(self):
+        """Test that the same seed gives the same melody."""
+        first = generate_melody(self.model, rng=random.Random(42))
+        second = generate_melody(self.model, rng=random.Random(42))
+        self.assertEqual(first, second)
+    
+    def test_retraining_invalidates_sampler(self):
+        """Test that changed counts are picked up by the compiled sampler."""
+        sampler = compile_model(self.model)
+        sampler.refresh()
+        self.model.add_transition('E', 'F')
+        self.assertIn('F', compile_model(self.model).vocab)
+        draws = {compile_model(self.model).next_id(self.model.index['E']) for _ in range(200)}
+        self.assertIn(self.model.index['F'], draws)
+    
+    def test_new_notes_invalidate_sampler(self):
+        """Test that a note added without any transition resizes the compiled tables."""
+        compile_model(self.model).refresh()
+        self.model.add_sequences([['X']])
+        self.model.intern('Y')
+        melodies = generate_melodies(self.model, 50, 10, seed=0)
+        self.assertEqual(len(melodies), 50)
+        self.assertEqual(len(compile_model(self.model).prob), len(self.model.vocab))
+    
+    def test_update_and_forget(self):
+        """Test that updating then forgetting melodies restores the counts."""
+        before = self.model.to_dict()
+        sampler = compile_model(self.model)
+        sampler.refresh()
+        update_model(self.model, preprocess_melodies([['E', 'C']]))
+        self.assertEqual(self.model['E'], {'$': 2, 'C': 1})
+        self.assertIs(compile_model(self.model), sampler)
+        self.assertEqual(sampler._stale, {self.model.index[n] for n in '^EC'})
+        forget_melodies(self.model, preprocess_melodies([['E', 'C']]))
+        self.assertEqual(self.model.to_dict(), before)
+    
+    def test_forget_unseen_melody_raises(self):
+        """Test that forgetting data the model never saw leaves it untouched."""
+        before = self.model.to_dict()
+        with self.assertRaises(ValueError):
+            forget_melodies(self.model, preprocess_melodies([['E', 'D']]))
+        with self.assertRaises(ValueError):
+            forget_melodies(self.model, preprocess_melodies([['Z']]))
+        self.assertEqual(self.model.to_dict(), before)
+    
+    def test_generate_melodies_batch(self):
+        """Test batched generation: shape, vocabulary and seeding."""
+        batch = generate_melodies(self.model, 50, max_length=4, seed=7)
+        self.assertEqual(len(batch), 50)
+        for melody in batch:
+            self.assertLessEqual(len(melody), 4)
+            self.assertTrue(set(melody) <= {'C', 'D', 'E'})
+        self.assertEqual(batch, generate_melodies(self.model, 50, max_length=4, seed=7))
+        self.assertEqual(generate_melodies(self.model, 0), [])
+    
+    def test_generate_melodies_follows_transitions(self):
+        """Test that every generated step is a transition seen in training."""
+        for melody in generate_melodies(self.model, 200, seed=1):
+            path = ['^'] + melody
+            for current_note, next_note in zip(path, path[1:]):
+                self.assertIn(next_note, self.model[current_note])
+    
+    def test_merge_models(self):
+        """Test that merging sums counts across different vocabularies."""
+        other = build_bigram_model(preprocess_melodies([['G', 'C'], ['C', 'D']]))
+        merged = merge_models(self.model, other)
+        expected = build_bigram_model(preprocess_melodies(self.melodies + [['G', 'C'], ['C', 'D']]))
+        self.assertEqual(merged, expected)
+        self.assertEqual(merge_models(other, self.model), expected)
+        self.assertEqual(merge_models(merge_models(self.model, other), other),
+                         merge_models(self.model, merge_models(other, other)))
+    
+    def test_generate_from_compact_model(self):
+        """Test that generate_melody only emits notes seen in training."""
+        for _ in range(20):
+            melody = generate_melody(self.model, max_length=10)
+            self.assertTrue(set(melody) <= {'C', 'D', 'E'})
+            self.assertLessEqual(len(melody), 10)
+
+
+class TestModelPersistence(unittest.TestCase):
+    
+    def setUp(self):
+        """Train a small model and pick a path for its file."""
+        self.model_file = 'tests/test_model.bin'
+        self.model = build_bigram_model(preprocess_melodies([['C', 'D', 'E'], ['C', 'E']]))
+    
+    def tearDown(self):
+        """Clean up after each test method."""
+        if os.path.exists(self.model_file):
+            os.remove(self.model_file)
+    
+    def test_save_and_load_model(self):
+        """Test that a saved model loads back with the same counts and samples."""
+        save_model(self.model, self.model_file)
+        for mmap in (True, False):
+            loaded = load_model(self.model_file, mmap=mmap)
+            self.assertEqual(loaded.vocab, self.model.vocab)
+            self.assertEqual(loaded, self.model)
+            self.assertEqual(generate_melodies(loaded, 20, seed=3),
+                             generate_melodies(self.model, 20, seed=3))
+    
+    def test_loaded_model_can_be_updated_without_touching_file(self):
+        """Test that updating a mapped model leaves the file unchanged."""
+        save_model(self.model, self.model_file, tables=False)
+        loaded = load_model(self.model_file)
+        update_model(loaded, preprocess_melodies([['C', 'D']]))
+        self.assertEqual(loaded['C']['D'], 2)
+        self.assertEqual(load_model(self.model_file)['C']['D'], 1)
+    
+    def test_load_rejects_other_files(self):
+        """Test that a file without the model header is refused."""
+        with open(self.model_file, 'wb') as f:
+            f.write(b'C D E\n')
+        with self.assertRaises(ValueError):
+            load_model(self.model_file)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import random
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, preprocess_melodies
+from ngram import NGramModel, build_ngram_model, generate_ngram_melody
+
+
+class TestNGramModel(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up a few preprocessed melodies."""
+        self.melodies = preprocess_melodies([
+            ['C', 'D', 'E', 'C'],
+            ['C', 'D', 'F'],
+            ['E', 'D', 'E'],
+        ])
+    
+    def test_order_two_matches_bigram_model(self):
+        """Test that an order-2 model learns the bigram transitions."""
+        bigram = build_bigram_model(self.melodies)
+        model = build_ngram_model(self.melodies, order=2, chunk_size=1)
+        for note in bigram:
+            self.assertEqual(model.successors([note]), dict(bigram[note]))
+    
+    def test_longer_contexts(self):
+        """Test that contexts of several notes are counted separately."""
+        model = build_ngram_model(self.melodies, order=3)
+        self.assertEqual(model.successors(['C', 'D']), {'E': 1, 'F': 1})
+        self.assertEqual(model.successors(['E', 'D']), {'E': 1})
+        self.assertEqual(model.successors(['^', '^']), {'C': 2, 'E': 1})
+        self.assertEqual(model.successors(['F', 'F']), {})
+        self.assertEqual(model.successors([]), {'C': 3, 'D': 3, 'E': 3, 'F': 1, '$': 3})
+    
+    def test_generation_backs_off(self):
+        """Test that generated n-grams were seen in training at some order."""
+        model = build_ngram_model(self.melodies, order=4)
+        rng = random.Random(5)
+        for _ in range(30):
+            melody = generate_ngram_melody(model, max_length=12, rng=rng)
+            self.assertLessEqual(len(melody), 12)
+            path = ['^'] + melody
+            for current_note, next_note in zip(path, path[1:]):
+                self.assertIn(next_note, model.successors([current_note]))
+    
+    def test_order_limits(self):
+        """Test that unsupported orders are rejected."""
+        with self.assertRaises(ValueError):
+            NGramModel(0)
+        with self.assertRaises(ValueError):
+            NGramModel(6)
+
+
+if __name__ == '__main__':
+    unittest.main()
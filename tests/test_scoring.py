@@ -0,0 +1,53 @@
+import unittest
+import math
+import os
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, preprocess_melodies
+from scoring import perplexity, score_melodies, smoothed_log_probabilities
+
+
+class TestScoring(unittest.TestCase):
+    
+    def setUp(self):
+        """Build a small model: vocabulary ^, $, C, D."""
+        self.model = build_bigram_model(preprocess_melodies([
+            ['C', 'D'],
+            ['C', 'C'],
+        ]))
+    
+    def test_unsmoothed_scores(self):
+        """Test log-likelihoods against hand-computed probabilities."""
+        scores = score_melodies(self.model, preprocess_melodies([['C', 'D'], ['D']]), alpha=0)
+        # P(C|^) = 1, P(D|C) = 1/3, P($|D) = 1
+        self.assertAlmostEqual(scores[0], math.log(1 / 3))
+        # P(D|^) = 0
+        self.assertEqual(scores[1], -math.inf)
+    
+    def test_smoothing_and_unknown_notes(self):
+        """Test that smoothing gives unseen transitions and notes a finite score."""
+        scores = score_melodies(self.model, preprocess_melodies([['D'], ['X']]), alpha=1)
+        self.assertTrue(all(math.isfinite(score) for score in scores))
+        # P(X|^) = 1 / (2 + 4), P($|X) = 1 / 4 from an unseen row
+        self.assertAlmostEqual(scores[1], math.log(1 / 6) + math.log(1 / 4))
+    
+    def test_rows_are_distributions(self):
+        """Test that every smoothed row sums to one."""
+        logp = smoothed_log_probabilities(self.model, alpha=0.5)
+        for row in logp:
+            self.assertAlmostEqual(sum(math.exp(x) for x in row), 1.0)
+    
+    def test_chunking_and_perplexity(self):
+        """Test that chunk size does not change scores and perplexity matches them."""
+        melodies = preprocess_melodies([['C', 'D'], ['C'], ['D', 'C', 'C'], []])
+        scores = score_melodies(self.model, melodies)
+        self.assertEqual(scores.tolist(), score_melodies(self.model, melodies, chunk_size=1).tolist())
+        transitions = sum(len(melody) - 1 for melody in melodies)
+        self.assertAlmostEqual(perplexity(self.model, melodies, chunk_size=3),
+                               math.exp(-scores.sum() / transitions))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import json
+import os
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, generate_melodies, preprocess_melodies
+from constraints import Constraints
+from cache import GenerationCache
+from server import MelodyServer
+
+
+class TestMelodyServer(unittest.IsolatedAsyncioTestCase):
+    
+    def setUp(self):
+        """Build a small model and a server for it."""
+        self.model = build_bigram_model(preprocess_melodies([
+            ['C4', 'D4', 'E4', 'C4'],
+            ['E4', 'D4', 'C4', 'C4', 'G4'],
+            ['G4', 'A4', 'G4', 'E4'],
+        ]))
+        self.server = MelodyServer(self.model, max_batch=8, max_delay=0.01)
+        self.socket_path = 'tests/test_server.sock'
+    
+    async def asyncTearDown(self):
+        """Stop the server and remove the socket file."""
+        await self.server.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+    
+    async def collect(self, **request):
+        return [melody async for melody in self.server.generate(**request)]
+    
+    async def test_seeded_requests_are_batched_independently(self):
+        """Test that concurrent requests share batches but keep their own seeds."""
+        requests = [dict(n=3, max_length=10, seed=1), dict(n=3, max_length=6, seed=2),
+                    dict(n=2, max_length=10, seed=1, constraints=Constraints(max_repeats=1))]
+        results = await asyncio.gather(*(self.collect(**request) for request in requests))
+        self.assertEqual(self.server.batches, 1)
+        for request, melodies in zip(requests, results):
+            self.assertEqual(melodies, generate_melodies(self.model, **request))
+    
+    async def test_large_requests_are_streamed_in_parts(self):
+        """Test that a request larger than max_batch is split into several batches."""
+        melodies = await self.collect(n=20, seed=3)
+        self.assertEqual(len(melodies), 20)
+        self.assertEqual(self.server.batches, 3)
+        self.assertEqual(melodies, await self.collect(n=20, seed=3))
+    
+    async def test_cached_requests_skip_sampling(self):
+        """Test that a repeated seeded request is answered from the cache."""
+        self.server.cache = GenerationCache()
+        first = await self.collect(n=4, seed=9)
+        self.assertEqual(await self.collect(n=4, seed=9), first)
+        self.assertEqual(self.server.batches, 1)
+        self.assertEqual(self.server.cache.hits, 1)
+    
+    async def test_unix_socket_protocol(self):
+        """Test the newline-delimited JSON protocol over a Unix socket."""
+        listener = await self.server.serve_unix(self.socket_path)
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            writer.write(b'{"id": 1, "n": 2, "seed": 5}\n')
+            writer.write(b'{"id": 2, "constraints": {"bad": 1}}\n')
+            writer.write_eof()
+            replies = [json.loads(line) async for line in reader]
+            writer.close()
+        first = [reply for reply in replies if reply['id'] == 1]
+        self.assertEqual([reply['melody'] for reply in first[:-1]],
+                         generate_melodies(self.model, 2, seed=5))
+        self.assertEqual(first[-1], {'id': 1, 'done': True})
+        errors = [reply for reply in replies if reply['id'] == 2]
+        self.assertEqual(len(errors), 1)
+        self.assertIn('error', errors[0])
+
+    
+    async def test_request_limits(self):
+        """Test that overlong requests and failed batches get an error line."""
+        with self.assertRaises(ValueError):
+            await self.collect(n=1, max_length=10 ** 12)
+        self.server._generate_batch = lambda batch: [MemoryError()] * len(batch)
+        listener = await self.server.serve_unix(self.socket_path)
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            writer.write(b'{"id": 1, "max_length": 1000000000000}\n')
+            writer.write(b'{"id": 2, "n": 2}\n')
+            writer.write_eof()
+            replies = [json.loads(line) async for line in reader]
+            writer.close()
+        self.assertEqual(sorted(reply['id'] for reply in replies), [1, 2])
+        self.assertTrue(all('error' in reply for reply in replies))
+    
+    async def test_connections_are_read_as_requests_finish(self):
+        """Test that a pipelining client has at most max_in_flight requests running."""
+        self.server.max_in_flight = 2
+        running = most = 0
+        handle_request = self.server._handle_request
+        
+        async def counted(line, writer):
+            nonlocal running, most
+            running += 1
+            most = max(most, running)
+            await asyncio.sleep(0.01)
+            await handle_request(line, writer)
+            running -= 1
+        
+        self.server._handle_request = counted
+        listener = await self.server.serve_unix(self.socket_path)
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            writer.write(b''.join(b'{"id": %d, "seed": 1}\n' % i for i in range(10)))
+            writer.write_eof()
+            replies = [json.loads(line) async for line in reader]
+            writer.close()
+        self.assertEqual(sum('done' in reply for reply in replies), 10)
+        self.assertEqual(most, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import os
+import sys
+import random
+
+import numpy as np
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpus import pack_melodies
+from pitch import midi_to_note
+from similarity import MelodyIndex, deduplicate
+
+
+def shingle_jaccard(a, b, size=3):
+    """Exact Jaccard similarity of two melodies' shingle sets."""
+    first = {tuple(a[i:i + size]) for i in range(len(a) - size + 1)}
+    second = {tuple(b[i:i + size]) for i in range(len(b) - size + 1)}
+    return len(first & second) / len(first | second)
+
+
+class TestMelodyIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Set up random melodies and a near-copy of the first one."""
+        rng = random.Random(0)
+        self.melodies = [[midi_to_note(rng.randint(48, 84)) for _ in range(rng.randint(12, 20))]
+                         for _ in range(300)]
+        self.copy = list(self.melodies[0])
+        self.copy[-1] = 'C9'
+        self.index = MelodyIndex()
+        self.index.add(self.melodies)
+
+    def test_query_finds_near_copies(self):
+        """Test that a near-copy finds its source and estimates their similarity."""
+        results = self.index.query(self.copy)
+        self.assertEqual(results[0][0], 0)
+        self.assertAlmostEqual(results[0][1], shingle_jaccard(self.copy, self.melodies[0]),
+                               delta=0.15)
+        self.assertEqual(self.index.query(self.melodies[5])[0], (5, 1.0))
+        self.assertEqual(self.index.query(self.copy, threshold=1.0), [])
+        self.assertEqual(self.index.query(['C4', 'D4', 'E4', 'F4', 'G4']), [])
+
+    def test_signatures_are_stable(self):
+        """Test that packed and list input, and separate indexes, agree."""
+        signatures = self.index.signatures(self.melodies)
+        self.assertEqual(signatures.shape, (300, 128))
+        self.assertEqual(signatures.dtype.name, 'uint32')
+        packed = MelodyIndex(chunk_size=7).signatures(pack_melodies(self.melodies))
+        np.testing.assert_array_equal(signatures, packed)
+        self.assertEqual(self.index.similarity(3, 3), 1.0)
+
+    def test_incremental_add(self):
+        """Test that melodies added later are found and numbered after the others."""
+        ids = self.index.add([self.copy, []])
+        self.assertEqual(ids.tolist(), [300, 301])
+        self.assertEqual(len(self.index), 302)
+        self.assertEqual([i for i, _ in self.index.query(self.melodies[0])], [0, 300])
+
+    def test_duplicate_groups(self):
+        """Test that copies are grouped with their first occurrence."""
+        self.index.add([self.copy, list(self.melodies[7]), self.melodies[7][:-1]])
+        labels = self.index.duplicate_groups()
+        self.assertEqual(labels[300:].tolist(), [0, 7, 7])
+        self.assertEqual(labels[:300].tolist(), list(range(300)))
+        kept = deduplicate(self.melodies + [self.copy])
+        self.assertEqual(kept, self.melodies)
+
+    def test_invalid_options(self):
+        """Test that bands must divide the signature length."""
+        with self.assertRaises(ValueError):
+            MelodyIndex(num_perm=100, bands=32)
+        with self.assertRaises(ValueError):
+            MelodyIndex(shingle_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
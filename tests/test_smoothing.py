@@ -0,0 +1,114 @@
+import unittest
+import math
+import os
+import sys
+
+import numpy as np
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, preprocess_melodies, update_model
+from scoring import perplexity
+from smoothing import METHODS, SmoothedModel, smooth_model
+
+
+class TestSmoothing(unittest.TestCase):
+
+    def setUp(self):
+        """Build a small model: vocabulary ^, $, C, D, E."""
+        self.model = build_bigram_model(preprocess_melodies([
+            ['C', 'D', 'E'],
+            ['C', 'C'],
+            ['E', 'D'],
+        ]))
+        self.c, self.d, self.e = (self.model.index[note] for note in 'CDE')
+
+    def test_rows_are_distributions(self):
+        """Test that every row of every method sums to one and never returns to ^."""
+        for method in METHODS:
+            for unknown in (False, True):
+                probabilities = smooth_model(self.model, method, unknown=unknown).probabilities
+                self.assertTrue((probabilities[:, 0] == 0).all())
+                sums = probabilities.sum(axis=1)
+                if method == 'none':
+                    # Only rows with outgoing transitions are distributions
+                    sums = sums[sums > 0]
+                np.testing.assert_allclose(sums, 1.0)
+
+    def test_maximum_likelihood_and_add_k(self):
+        """Test unsmoothed and add-k probabilities against hand-computed values."""
+        none = smooth_model(self.model, 'none').probabilities
+        # C -> C, C -> D, C -> $ out of 3
+        self.assertAlmostEqual(none[self.c, self.d], 1 / 3)
+        self.assertEqual(none[self.c, self.e], 0)
+        add = smooth_model(self.model, 'add-k', alpha=0.5).probabilities
+        # 4 possible next notes ($, C, D, E), each with 0.5 extra counts
+        self.assertAlmostEqual(add[self.c, self.d], 1.5 / 5)
+        self.assertAlmostEqual(add[self.c, self.e], 0.5 / 5)
+
+    def test_discounting(self):
+        """Test absolute discounting and its Kneser-Ney lower order."""
+        absolute = smooth_model(self.model, 'absolute', discount=0.5).probabilities
+        kneser_ney = smooth_model(self.model, 'kneser-ney', discount=0.5).probabilities
+        # Note occurrences as next notes ($: 3, C: 3, D: 2, E: 2), plus one each
+        lower = np.array([0, 4, 4, 3, 3]) / 14
+        # C was followed by 3 notes, each count 1, so 3 * 0.5 of its 3 counts are freed
+        expected = np.array([0, 0.5, 0.5, 0.5, 0]) / 3 + 0.5 * lower
+        np.testing.assert_allclose(absolute[self.c], expected)
+        # Notes preceding each note ($: C, D, E; C: ^, C; D: C, E; E: ^, D), plus one each
+        lower = np.array([0, 4, 3, 3, 3]) / 13
+        expected = np.array([0, 0.5, 0.5, 0.5, 0]) / 3 + 0.5 * lower
+        np.testing.assert_allclose(kneser_ney[self.c], expected)
+        self.assertGreater(kneser_ney[self.c, self.e], 0)
+
+    def test_cached_until_the_model_changes(self):
+        """Test that arrays are computed once, shared read-only and refreshed on update."""
+        smoothed = smooth_model(self.model, 'kneser-ney')
+        self.assertIs(smooth_model(self.model, 'kneser-ney'), smoothed)
+        self.assertIs(smoothed.log_probabilities, smoothed.log_probabilities)
+        with self.assertRaises(ValueError):
+            smoothed.probabilities[0, 0] = 1
+        update_model(self.model, preprocess_melodies([['E', 'E']]))
+        refreshed = smooth_model(self.model, 'kneser-ney')
+        self.assertIsNot(refreshed, smoothed)
+        self.assertGreater(refreshed.probabilities[self.e, self.e],
+                           smoothed.probabilities[self.e, self.e])
+
+    def test_generate(self):
+        """Test that smoothed generation is reproducible and can leave the training data."""
+        smoothed = smooth_model(self.model, 'add-k', alpha=5)
+        melodies = smoothed.generate(200, max_length=6, seed=1)
+        self.assertEqual(melodies, smoothed.generate(200, max_length=6, seed=1))
+        pairs = {pair for melody in melodies for pair in zip(melody, melody[1:])}
+        self.assertIn(('C', 'E'), pairs)
+        self.assertTrue(all(set(melody) <= {'C', 'D', 'E'} for melody in melodies))
+
+    def test_generate_after_the_model_grows(self):
+        """Test that a smoothed snapshot keeps generating from its own vocabulary."""
+        smoothed = smooth_model(self.model, 'add-k')
+        expected = smoothed.generate(20, max_length=6, seed=4)
+        update_model(self.model, preprocess_melodies([['F', 'G', 'A']]))
+        self.assertEqual(smoothed.generate(20, max_length=6, seed=4), expected)
+        self.assertEqual(len(smoothed.vocab), 5)
+        fresh = smooth_model(self.model, 'add-k')
+        self.assertEqual(fresh.vocab, self.model.vocab)
+        self.assertTrue(fresh.generate(20, max_length=6, seed=4))
+
+    def test_scoring_with_discounting(self):
+        """Test that scoring accepts every smoothing method."""
+        held_out = preprocess_melodies([['C', 'E', 'X']])
+        for method in ('absolute', 'kneser-ney'):
+            self.assertTrue(math.isfinite(perplexity(self.model, held_out, smoothing=method)))
+
+    def test_invalid_arguments(self):
+        """Test that unknown methods and out-of-range parameters raise ValueError."""
+        with self.assertRaises(ValueError):
+            SmoothedModel(self.model, 'witten-bell')
+        with self.assertRaises(ValueError):
+            SmoothedModel(self.model, 'absolute', discount=2)
+        with self.assertRaises(ValueError):
+            SmoothedModel(self.model, 'add-k', alpha=-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
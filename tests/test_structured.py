@@ -0,0 +1,61 @@
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the melody modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import build_bigram_model, generate_melodies, preprocess_melodies
+from structured import REST, build_joint_model, joint_token, split_token, structure_melodies
+
+
+class TestStructuredCorpus(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up two melodies with rhythm and a rest."""
+        self.notes = [['C4', 'D4', REST, 'C4'], ['C4', 'C4']]
+        self.durations = [[1, 0.5, 0.5, 2], [0.5, 1]]
+        self.corpus = structure_melodies(self.notes, self.durations)
+    
+    def test_columns(self):
+        """Test that each attribute is one typed array."""
+        corpus = self.corpus
+        self.assertEqual(len(corpus), 2)
+        self.assertEqual(corpus.lengths.tolist(), [4, 2])
+        self.assertEqual(corpus.durations.dtype.name, 'float32')
+        self.assertEqual(corpus.velocities.dtype.name, 'uint8')
+        self.assertEqual(corpus.is_rest.tolist(), [False, False, True, False, False, False])
+        self.assertEqual(corpus.velocities.tolist(), [64, 64, 0, 64, 64, 64])
+        self.assertEqual(corpus.total_durations().tolist(), [4.0, 1.5])
+        self.assertEqual(corpus[1], (['C4', 'C4'], [0.5, 1.0], [64, 64]))
+        self.assertEqual(list(corpus.pitch_corpus()), self.notes)
+    
+    def test_mismatched_columns_raise(self):
+        """Test that every note needs its own duration and a valid velocity."""
+        with self.assertRaises(ValueError):
+            structure_melodies(self.notes, [[1, 1], [1, 1]])
+        with self.assertRaises(ValueError):
+            structure_melodies([['C4']], velocities=[[200]])
+        with self.assertRaises(ValueError):
+            structure_melodies([['C4']], durations=[[0]])
+    
+    def test_joint_tokens(self):
+        """Test that joint tokens round-trip and separate rhythms."""
+        self.assertEqual(split_token(joint_token('F#4', 0.25)), ('F#4', 0.25))
+        vocab, ids = self.corpus.joint_tokens()
+        tokens = [vocab[i] for i in ids.tolist()]
+        self.assertEqual(tokens, ['C4/1', 'D4/0.5', 'R/0.5', 'C4/2', 'C4/0.5', 'C4/1'])
+    
+    def test_joint_model_matches_string_training(self):
+        """Test that the vectorized joint model equals training on token strings."""
+        model = build_joint_model(self.corpus)
+        melodies = [[joint_token(note, duration) for note, duration in zip(notes, durations)]
+                    for notes, durations in zip(self.notes, self.durations)]
+        expected = build_bigram_model(preprocess_melodies(melodies))
+        self.assertEqual(model.to_dict(), expected.to_dict())
+        for melody in generate_melodies(model, 5, seed=1):
+            for token in melody:
+                self.assertIn(split_token(token)[0], ('C4', 'D4', REST))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import importlib.util
+import os
+import random
+
+# The notebook export has a space in its name, so load it from its path
+SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '03-Melody Generation.py'))
+spec = importlib.util.spec_from_file_location('melody_generation', SCRIPT)
+melody_generation = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(melody_generation)
+
+
+def scan_ranking(model):
+    """Rank transitions by count, ties in the order a scan of the model meets them."""
+    pairs = [((current_note, next_note), count)
+             for current_note, transitions in model.items()
+             for next_note, count in transitions.items()]
+    return sorted(pairs, key=lambda item: -item[1])
+
+
+def scan_most_common(model):
+    """The original full-scan find_most_common_transition."""
+    most_common_pair, max_count = (None, None), 0
+    for current_note, transitions in model.items():
+        for next_note, count in transitions.items():
+            if count > max_count:
+                max_count = count
+                most_common_pair = (current_note, next_note)
+    return most_common_pair, max_count
+
+
+class TestTransitionIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Build the script's model from its own sample dataset."""
+        processed = melody_generation.preprocess_melodies(melody_generation.melody_dataset)
+        self.model = melody_generation.build_bigram_model(processed)
+        self.index = melody_generation.build_transition_index(self.model)
+
+    def test_ranked_counts_increment(self):
+        """Test that increments keep counts and ties in first-counted order."""
+        ranking = melody_generation.RankedCounts()
+        for key in 'abcbcc':
+            ranking.increment(key)
+        self.assertEqual(ranking.count, {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(ranking.top(3), [('c', 3), ('b', 2), ('a', 1)])
+        ranking.increment('a')
+        # a and b are tied on 2; a was counted first
+        self.assertEqual(ranking.top(3), [('c', 3), ('a', 2), ('b', 2)])
+        self.assertEqual(ranking.top(2), [('c', 3), ('a', 2)])
+        self.assertEqual(ranking.top(10), ranking.top(3))
+        self.assertEqual(melody_generation.RankedCounts().top(5), [])
+
+    def test_index_matches_a_scan_of_the_model(self):
+        """Test the built index against rankings computed from the model."""
+        self.assertEqual(melody_generation.top_transitions(self.index, 1000),
+                         scan_ranking(self.model))
+        self.assertEqual(melody_generation.find_most_common_transition(self.model, self.index),
+                         scan_most_common(self.model))
+        self.assertEqual(melody_generation.find_most_common_transition(self.model),
+                         scan_most_common(self.model))
+        ranked = sorted(self.model['^'].items(), key=lambda item: -item[1])
+        self.assertEqual(melody_generation.top_next_notes(self.index, '^', 1000), ranked)
+        self.assertEqual(melody_generation.top_next_notes(self.index, 'X9'), [])
+
+    def test_record_transition_keeps_index_up_to_date(self):
+        """Test that recorded transitions match a rebuilt index, ties included."""
+        rng = random.Random(0)
+        notes = ['C4', 'D4', 'E4', 'G4', 'A4', 'B5']
+        for _ in range(300):
+            current_note, next_note = rng.choice(notes), rng.choice(notes + ['$'])
+            melody_generation.record_transition(self.model, self.index, current_note, next_note)
+            self.assertEqual(self.index['transitions'].count[(current_note, next_note)],
+                             self.model[current_note][next_note])
+            self.assertEqual(melody_generation.find_most_common_transition(self.model, self.index),
+                             scan_most_common(self.model))
+        self.assertEqual(melody_generation.top_transitions(self.index, 1000),
+                         scan_ranking(self.model))
+        for note in notes:
+            ranked = sorted(self.model[note].items(), key=lambda item: -item[1])
+            self.assertEqual(melody_generation.top_next_notes(self.index, note, 1000), ranked)
+            self.assertEqual(melody_generation.top_next_notes(self.index, note, 2), ranked[:2])
+
+    def test_empty_model(self):
+        """Test that an empty model has no most common transition."""
+        self.assertEqual(melody_generation.find_most_common_transition({}), ((None, None), 0))
+        index = melody_generation.build_transition_index({})
+        melody_generation.record_transition({}, index, 'C4', 'D4')
+        self.assertEqual(melody_generation.top_transitions(index), [(('C4', 'D4'), 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()